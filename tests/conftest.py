@@ -0,0 +1,136 @@
+"""Загрузка логики блокнота без окна Tk.
+
+Модуль один и строит окно прямо при импорте, поэтому для тестов без дисплея
+исполняется не весь файл, а:
+  * всё до диспетчера --cli (то же, что работает в режиме командной строки);
+  * после него — только определения: import, def, class и присваивания,
+    которые не создают окно и не вызывают функции приложения (те строят
+    виджеты или читают БД при запуске), плюс подписки хранилища subscribe(...).
+Вместо окна в пространство имён кладётся AfterQueue — очередь app.after.
+"""
+import ast
+import os
+import shutil
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "versio_programm_two.py")
+
+
+class AfterQueue:
+    """Очередь отложенных вызовов вместо app.after / after_idle."""
+
+    def __init__(self):
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, _ms, func=None, *args):
+        self.next_id += 1
+        self.pending[self.next_id] = (func, args)
+        return self.next_id
+
+    def after_idle(self, func, *args):
+        return self.after(0, func, *args)
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run(self, rounds: int = 10):
+        """Выполняет накопленные вызовы (и добавленные ими — до rounds раз)."""
+        for _ in range(rounds):
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            for func, args in batch.values():
+                func(*args)
+
+
+def _calls_outside_lambdas(node):
+    if isinstance(node, ast.Lambda):
+        return
+    if isinstance(node, ast.Call):
+        yield node
+    for child in ast.iter_child_nodes(node):
+        yield from _calls_outside_lambdas(child)
+
+
+def _split_module(tree):
+    """Операторы модуля, которые можно исполнить без окна."""
+    body = tree.body
+    cli_at = next(
+        i for i, node in enumerate(body)
+        if isinstance(node, ast.If) and "--cli" in ast.unparse(node.test)
+    )
+    functions = {node.name for node in body if isinstance(node, ast.FunctionDef)}
+    gui = {"ctk", "app"}  # имена, за которыми виджеты окна
+    keep = list(body[:cli_at])
+    for node in body[cli_at + 1:]:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+            keep.append(node)
+            continue
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            if getattr(node.value.func, "id", None) == "subscribe":
+                keep.append(node)
+            continue
+        if not isinstance(node, (ast.Assign, ast.AnnAssign)) or node.value is None:
+            continue
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        names = {n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)}
+        used = {n.id for n in ast.walk(node.value) if isinstance(n, ast.Name)}
+        called = {getattr(call.func, "id", None) for call in _calls_outside_lambdas(node.value)}
+        if used & gui or called & functions:
+            gui |= names
+            continue
+        keep.append(node)
+    return keep
+
+
+_compiled = {}
+
+
+def load_core(workdir):
+    """Пространство имён модуля без окна; данные — в workdir/data."""
+    script = os.path.join(str(workdir), "versio_programm_two.py")
+    shutil.copy(APP, script)
+    if "code" not in _compiled:
+        with open(APP, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), APP)
+        _compiled["code"] = compile(ast.Module(body=_split_module(tree), type_ignores=[]), APP, "exec")
+    namespace = {"__name__": "versio_programm_two", "__file__": script}
+    exec(_compiled["code"], namespace)
+    namespace["app"] = AfterQueue()
+    return namespace
+
+
+@pytest.fixture
+def core(tmp_path):
+    """Логика блокнота без окна на пустой БД во временной папке."""
+    namespace = load_core(tmp_path)
+    namespace["init_db"]()
+    return namespace
+
+
+class TextStub:
+    """Вместо textbox вкладки документа: save_all_to_db читает только get()."""
+
+    _textbox = None  # без виджета UndoJournal не ставит прокси
+
+    def __init__(self, text):
+        self.text = text
+
+    def get(self, _start, _end):
+        return self.text
+
+
+@pytest.fixture
+def open_tab(core):
+    """Открывает вкладку документа без окна: open_tab(имя, текст) -> tab_data."""
+
+    def open_(name, text):
+        tab_data = {"id": None, "textbox": TextStub(text)}
+        core["current_tabs"][name] = tab_data
+        core["tab_order_keys"][name] = core["next_order_key"](core["tab_order"], core["tab_order_keys"])
+        core["tab_order"].append(name)
+        return tab_data
+
+    return open_
@@ -0,0 +1,69 @@
+"""Команды --cli на временной базе."""
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def cli(core, tmp_path, capsys):
+    db = str(tmp_path / "cli.sqlite3")
+
+    def run(*argv):
+        code = core["run_cli"](["--db", db, *argv])
+        out, err = capsys.readouterr()
+        return code, out, err
+
+    run.db = db
+    return run
+
+
+def test_notes_follow_tab_order_not_creation_order(cli):
+    cli("add-note", "первая", "--tab", "Б", "--date", "01.02.2026", "--tags", "Дом, работа")
+    cli("add-note", "вторая", "--tab", "А", "--pinned", "--start", "10:00", "--end", "11:00")
+    with sqlite3.connect(cli.db) as conn:  # переставляем вкладки, как это делает окно
+        conn.execute("UPDATE note_tabs SET position = -1 WHERE name = 'А'")
+
+    code, out, _ = cli("notes")
+    assert code == 0
+    lines = out.splitlines()
+    assert lines[0].startswith("[ 📌] А#0: вторая") and "10:00-11:00" in lines[0]
+    assert lines[1].startswith("[ ] Б#0: первая  (01.02.2026 #дом #работа")
+
+    assert cli("notes", "--tag", "работа")[1].splitlines() == lines[1:]
+    assert cli("notes", "--tab", "А")[1].splitlines() == lines[:1]
+
+
+def test_search_is_case_insensitive_and_reports_misses(cli):
+    cli("add-note", "Купить ХЛЕБ")
+    code, out, _ = cli("search", "хлеб")
+    assert code == 0 and "Купить ХЛЕБ" in out
+    assert cli("search", "молоко")[0] == 1
+
+
+def test_add_tab_tabs_and_show(cli, tmp_path):
+    source = tmp_path / "src.txt"
+    source.write_text("из файла\n", encoding="utf-8")
+    cli("add-tab", "Черновик", "--text", "без перевода строки")
+    cli("add-tab", "Черновик", "--file", str(source))  # имя занято — получит суффикс
+
+    code, out, _ = cli("tabs")
+    assert code == 0
+    assert "  Черновик  (" in out and "  Черновик (2)  (" in out and str(source) in out
+
+    assert cli("show", "Черновик")[1] == "без перевода строки\n"
+    assert cli("show", "Черновик (2)")[1] == "из файла\n"
+    code, out, err = cli("show", "Нет такого")
+    assert code == 1 and out == "" and "Нет такого" in err
+
+
+def test_compact_reports_sizes(cli):
+    cli("add-tab", "Большой", "--text", "x" * 200_000)
+    with sqlite3.connect(cli.db) as conn:
+        conn.execute("DELETE FROM tabs")
+    code, out, _ = cli("compact")
+    assert code == 0 and out.startswith("✓ Сжато:")
+
+
+def test_bad_database_path_is_an_error(core, tmp_path, capsys):
+    assert core["run_cli"](["--db", str(tmp_path), "tabs"]) == 1  # каталог, а не файл базы
+    assert capsys.readouterr().err.startswith("Ошибка:")
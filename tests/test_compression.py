@@ -0,0 +1,64 @@
+"""Сжатие текстов документов: encode_content/decode_content."""
+import sqlite3
+
+import pytest
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_large_text_is_compressed_and_round_trips(core, codec):
+    text = "2024-01-01 12:00:00 INFO строка журнала №%d\n" * 2000 % tuple(range(2000))
+    stored, used = core["encode_content"](text, codec)
+    assert used == codec
+    assert isinstance(stored, bytes) and len(stored) < len(text.encode("utf-8")) // 4
+    assert core["decode_content"](stored, used) == text
+
+
+def test_small_text_is_stored_plain(core):
+    encode, decode = core["encode_content"], core["decode_content"]
+    small = "к" * (core["COMPRESS_MIN_BYTES"] // 2 - 1)
+    assert encode(small, "zlib") == (small, "")
+    assert encode("коротко", "lzma") == ("коротко", "")
+    assert decode(small, "") == small
+    assert decode(None, "") == ""
+
+
+def test_compression_can_be_switched_off(core):
+    core["settings"]["doc_compression"] = "none"
+    text = "a" * 10 * core["COMPRESS_MIN_BYTES"]
+    assert core["encode_content"](text) == (text, "")
+
+
+def _stored(core):
+    return [(name, codec, type(stored)) for _pos, name, stored, _fp, _ver, codec, _id in core["load_from_db"](raw=True)]
+
+
+def test_saving_compresses_large_documents_only(core, open_tab):
+    big = "строка журнала\n" * 2000
+    open_tab("Журнал", big)
+    open_tab("Заметка", "коротко")
+    core["save_all_to_db"]()
+    assert _stored(core) == [("Журнал", "zlib", bytes), ("Заметка", "", str)]
+    assert [row[1:3] for row in core["load_from_db"]()] == [("Журнал", big), ("Заметка", "коротко")]
+
+    core["current_tabs"]["Журнал"]["textbox"].text = "стало коротким"
+    core["save_all_to_db"]()
+    assert _stored(core)[0] == ("Журнал", "", str)
+
+
+def test_tabs_still_unpacking_are_not_saved(core, open_tab):
+    tab = open_tab("Журнал", "строка журнала\n" * 2000)
+    core["save_all_to_db"]()
+    tab["loading"] = True  # пустое окно до распаковки не должно затереть текст в БД
+    tab["textbox"].text = ""
+    core["save_all_to_db"]()
+    assert core["load_from_db"]()[0][2] == "строка журнала\n" * 2000
+
+
+def test_plain_and_compressed_rows_load_together(core):
+    big = "x" * 10 * core["COMPRESS_MIN_BYTES"]
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        stored, codec = core["encode_content"](big, "lzma")
+        conn.execute("INSERT INTO tabs(position, name, content, codec) VALUES(1, 'Сжатый', ?, ?)", (stored, codec))
+        # строка из базы до появления сжатия: codec по умолчанию ''
+        conn.execute("INSERT INTO tabs(position, name, content) VALUES(2, 'Старый', 'как было')")
+    assert [row[1:3] for row in core["load_from_db"]()] == [("Сжатый", big), ("Старый", "как было")]
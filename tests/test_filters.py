@@ -0,0 +1,96 @@
+"""Теги и обратные индексы фильтра заметок: теги, цвет, состояние, даты."""
+import pytest
+
+
+def _note(text, tags="", color="#aaa", done=False, pinned=False, date=""):
+    return {"text": text, "tags": tags, "color": color, "done": done, "pinned": pinned,
+            "date": date, "time_start": "", "time_end": ""}
+
+
+@pytest.fixture
+def notes(core):
+    found = {
+        "work": _note("отчёт", tags="работа срочно", color="#f00", date="03.01.2026"),
+        "home": _note("полить цветы", tags="дом", color="#0f0", done=True, date="05.01.2026"),
+        "both": _note("купить бумагу", tags="дом работа", color="#f00", pinned=True, date="10.01.2026"),
+        "bare": _note("без тегов"),
+    }
+    core["notes_by_tab"]["Заметки"] = list(found.values())
+    core["rebuild_filter_index"]()
+    return found
+
+
+def _ids(core, **fields):
+    core["_notes_filter"].update(
+        {"tags": "", "color": None, "state": None, "date_from": None, "date_to": None, **fields}
+    )
+    return core["filtered_note_ids"]()
+
+
+def _names(notes, ids):
+    return {name for name, note in notes.items() if id(note) in ids}
+
+
+def test_no_filter_means_none(core, notes):
+    assert _ids(core) is None
+
+
+def test_tags_need_all_of_them(core, notes):
+    assert _names(notes, _ids(core, tags="работа")) == {"work", "both"}
+    assert _names(notes, _ids(core, tags="дом работа")) == {"both"}
+    assert _names(notes, _ids(core, tags="нет-такого")) == set()
+
+
+def test_color_state_and_dates_intersect(core, notes):
+    day = core["_filter_day"]
+    assert _names(notes, _ids(core, color="#f00")) == {"work", "both"}
+    assert _names(notes, _ids(core, state="active")) == {"work", "both", "bare"}
+    assert _names(notes, _ids(core, state="done")) == {"home"}
+    assert _names(notes, _ids(core, state="pinned", color="#f00")) == {"both"}
+    assert _names(notes, _ids(core, date_from=day("04.01.2026"))) == {"home", "both"}
+    assert _names(notes, _ids(core, date_from=day("01.01.2026"), date_to=day("05.01.2026"))) == {"work", "home"}
+
+
+def test_unindex_drops_empty_buckets(core, notes):
+    index = core["_filter_index"]
+    core["_unindex_note"](id(notes["home"]))
+    assert "дом" in index["tag"] and id(notes["home"]) not in index["tag"]["дом"]
+    assert "#0f0" not in index["color"]
+    assert core["_filter_day"]("05.01.2026") not in index["days"]
+    assert id(notes["home"]) not in index["done"] and id(notes["home"]) not in index["all"]
+
+
+def test_tags_are_normalized(core):
+    normalize = core["normalize_tags"]
+    assert normalize("#Работа, дом;работа  #ДОМ") == "дом работа"
+    assert normalize(["Б", "#а", ""]) == "а б"
+    assert normalize(None) == normalize("#, ,") == ""
+    assert core["tags_label"]("дом работа") == "#дом #работа"
+    assert core["tags_label"]("") == ""
+
+
+def test_store_events_keep_index_and_cache_fresh(core):
+    note = core["store_add_note"]("Заметки", _note("отчёт", tags="работа"))
+    core["flush_store_events"]()
+    core["store_set_filter"](tags="работа")
+    assert core["filtered_note_ids"]() == {id(note)}
+
+    core["store_update_note"]("Заметки", note, tags="дом")  # закешированный ответ устарел
+    core["flush_store_events"]()
+    assert core["filtered_note_ids"]() == set()
+    core["store_set_filter"](tags="дом")
+    assert core["filtered_note_ids"]() == {id(note)}
+
+    core["store_remove_note"]("Заметки", note)
+    core["flush_store_events"]()
+    assert core["filtered_note_ids"]() == set() and core["_filter_index"]["tag"] == {}
+
+
+def test_reload_marks_index_stale(core):
+    core["store_set_filter"](tags="дом")
+    note = _note("с диска", tags="дом")
+    core["notes_by_tab"]["Заметки"] = [note]  # так подменяет заметки перечитывание из БД
+    core["emit"]("notes_reloaded", saved=True)
+    core["flush_store_events"]()
+    assert core["_filter_index"]["stale"]
+    assert core["filtered_note_ids"]() == {id(note)}
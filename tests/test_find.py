@@ -0,0 +1,64 @@
+"""Поиск и замена по тексту документов: шаблон, координаты совпадений, фоновый поиск."""
+import queue
+import sqlite3
+import threading
+
+
+def _matches(core, query, text, regex=False, case=False):
+    pattern = core["compile_find_pattern"](query, regex, case)
+    return list(core["find_matches"](pattern, text))
+
+
+def test_literal_search_escapes_and_ignores_case(core):
+    text = "a.b\nA.B и a*b"
+    assert _matches(core, "a.b", text) == [(1, 0, 1, 3, "a.b"), (2, 0, 2, 3, "A.B и a*b")]
+    assert _matches(core, "a.b", text, case=True) == [(1, 0, 1, 3, "a.b")]
+    assert _matches(core, "a*b", text) == [(2, 6, 2, 9, "A.B и a*b")]
+
+
+def test_regex_positions_span_lines(core):
+    text = "первая\nвторая строка\nтретья"
+    assert _matches(core, r"^\w+я$", text, regex=True) == [(1, 0, 1, 6, "первая"), (3, 0, 3, 6, "третья")]
+    # совпадение через перевод строки: конец — на следующей строке
+    assert _matches(core, r"ка\nтр", text, regex=True) == [(2, 11, 3, 2, "вторая строка")]
+
+
+def test_empty_matches_are_skipped(core):
+    assert _matches(core, r"x*", "abc", regex=True) == []
+    assert _matches(core, "b", "abc\n\nb") == [(1, 1, 1, 2, "abc"), (3, 0, 3, 1, "b")]
+
+
+def _replace(core, query, replacement, text, regex=False):
+    pattern = core["compile_find_pattern"](query, regex, False)
+    return pattern.subn(core["find_replacement"](replacement, regex), text)
+
+
+def test_literal_replacement_is_not_expanded(core):
+    assert _replace(core, "a(b)", r"\1\n", "A(B) a(b)") == (r"\1\n \1\n", 2)
+    assert _replace(core, r"a(b)", r"[\1]", "ab AB", regex=True) == ("[b] [B]", 2)
+
+
+def test_worker_reads_unloaded_tabs_from_database(core, monkeypatch):
+    monkeypatch.setitem(core, "FIND_BATCH", 2)
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        stored, codec = core["encode_content"]("нашёл\n" * 1000, "zlib")
+        tab_id = conn.execute("INSERT INTO tabs(position, name, content, codec) VALUES(1, 'Сжатый', ?, ?)",
+                              (stored, codec)).lastrowid
+    out = queue.Queue()
+    pattern = core["compile_find_pattern"]("нашёл", False, False)
+    sources = [("Открытый", "нашёл тут", None), ("Сжатый", None, tab_id), ("Удалённый", None, tab_id + 1)]
+    core["_find_worker"](pattern, sources, out, threading.Event())
+
+    batches = list(iter(out.get_nowait, None))
+    assert batches[0] == ("Открытый", [(1, 0, 1, 5, "нашёл тут")])
+    assert {name for name, _ in batches[1:]} == {"Сжатый"}
+    assert all(len(batch) <= 2 for _, batch in batches)
+    assert sum(len(batch) for _, batch in batches[1:]) == 1000
+
+
+def test_worker_stops_on_cancel(core):
+    out = queue.Queue()
+    cancel = threading.Event()
+    cancel.set()
+    core["_find_worker"](core["compile_find_pattern"]("a", False, False), [("A", "aaa", None)], out, cancel)
+    assert out.get_nowait() is None
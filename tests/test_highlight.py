@@ -0,0 +1,48 @@
+"""Построчные лексеры подсветки и выбор языка."""
+
+
+def _tokens(core, language, lines, state=None):
+    lex = core["LEXERS"][language]
+    out = []
+    for line in lines:
+        tokens, state = lex(line, state)
+        out.append([(tag, line[start:end]) for tag, start, end in tokens])
+    return out, state
+
+
+def test_python_tokens_and_multiline_string_state(core):
+    out, state = _tokens(core, "python", ['def f(x=0x1F):  # тут', 's = """начало', "середина", 'конец""" + 2'])
+    assert out[0] == [("hl_keyword", "def"), ("hl_name", "f"), ("hl_number", "0x1F"), ("hl_comment", "# тут")]
+    assert out[1] == [("hl_string", '"""'), ("hl_string", "начало")]
+    assert out[2] == [("hl_string", "середина")]
+    assert out[3] == [("hl_string", 'конец"""'), ("hl_number", "2")]
+    assert state is None
+
+
+def test_markdown_fence_state(core):
+    out, state = _tokens(core, "markdown", ["# Заголовок", "- [x] **готово**", "```py", "# не заголовок", "```"])
+    assert out[0] == [("hl_heading", "# Заголовок")]
+    assert out[1] == [("hl_keyword", "- [x] "), ("hl_heading", "**готово**")]
+    assert out[3] == [("hl_code", "# не заголовок")]
+    assert out[4] == [("hl_muted", "```")]
+    assert state is None
+    _, open_state = _tokens(core, "markdown", ["~~~~"])
+    assert open_state == "~~~~"
+
+
+def test_json_and_log_lexers(core):
+    out, _ = _tokens(core, "json", ['{"ключ": "значение", "n": -1.5e3, "ok": true}'])
+    assert out[0] == [("hl_name", '"ключ"'), ("hl_string", '"значение"'), ("hl_name", '"n"'),
+                      ("hl_number", "-1.5e3"), ("hl_name", '"ok"'), ("hl_keyword", "true")]
+    out, _ = _tokens(core, "log", ["2024-01-01 12:00:00 ERROR ValueError: 'x' 42"])
+    assert out[0] == [("hl_muted", "2024-01-01 12:00:00"), ("hl_error", "ERROR"), ("hl_error", "ValueError"),
+                      ("hl_string", "'x'"), ("hl_number", "42")]
+
+
+def test_detect_language(core):
+    detect = core["detect_language"]
+    assert detect("Документ 1", "/tmp/app.LOG", "") == "log"
+    assert detect("notes.md", None, "") == "markdown"
+    assert detect("Документ 1", None, '{"a": 1}') == "json"
+    assert detect("Документ 1", None, "import os\n") == "python"
+    assert detect("Документ 1", None, "просто текст") is None
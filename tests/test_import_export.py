@@ -0,0 +1,121 @@
+"""Экспорт и импорт: JSONL, Markdown и CSV, пачки и откат при ошибке."""
+import json
+import sqlite3
+import threading
+
+import pytest
+
+NOTES = [
+    {"tab": "Дела", "text": "обычная", "done": False, "pinned": True, "date": "05.01.2026",
+     "color": "#2b2b2b", "time_start": "09:00", "time_end": "10:30", "tags": "дом работа"},
+    {"tab": "Дела", "text": "две\nстроки & <br> буквально, &lt; и ~~~~", "done": True, "pinned": False,
+     "date": "", "color": "", "time_start": "", "time_end": "", "tags": ""},
+    {"tab": "Идеи", "text": "- [x] похоже на пункт <!-- {} -->", "done": False, "pinned": False,
+     "date": "", "color": "#ff0000", "time_start": "", "time_end": "", "tags": "идея"},
+]
+DOCUMENT = "~~~\nкод с тильдами\n~~~~\n" + "строка\n" * 3000
+
+
+def _fill(core, db):
+    core["init_db"](db)
+    with sqlite3.connect(db) as conn:
+        importer = core["_Importer"](conn, core["_Progress"](None))
+        importer.note_tab("Пустая")
+        for note in NOTES:
+            importer.note(note)
+        importer.document("Большой.py", DOCUMENT, "/tmp/Большой.py")
+        importer.document("Пустой", "")
+        importer.finish()
+
+
+def _snapshot(core, db):
+    with sqlite3.connect(db) as conn:
+        return (
+            [name for _position, name in core["_iter_note_tabs"](conn)],
+            [core["_note_record"](row) for row in core["_iter_notes"](conn)],
+            list(core["_iter_documents"](conn)),
+        )
+
+
+@pytest.mark.parametrize("ext", [".jsonl", ".md"])
+def test_export_import_round_trip(core, tmp_path, ext):
+    source, target = str(tmp_path / "a.sqlite3"), str(tmp_path / "b.sqlite3")
+    _fill(core, source)
+    path = str(tmp_path / f"export{ext}")
+    records = len(NOTES) + 2  # заметки и документы; JSONL пишет ещё и вкладки заметок
+    assert core["export_data"](path, source) == records + (3 if ext == ".jsonl" else 0)
+
+    core["init_db"](target)
+    core["import_data"](path, target)
+    tabs, notes, documents = _snapshot(core, target)
+    source_tabs, source_notes, source_documents = _snapshot(core, source)
+    assert (notes, documents) == (source_notes, source_documents)
+    # Markdown пишет пустые вкладки после непустых
+    assert tabs == source_tabs if ext == ".jsonl" else sorted(tabs) == sorted(source_tabs)
+    with sqlite3.connect(target) as conn:
+        assert conn.execute("SELECT codec FROM tabs WHERE name='Большой.py'").fetchone() == ("zlib",)
+
+
+def test_csv_round_trip_of_notes(core, tmp_path):
+    source, target = str(tmp_path / "a.sqlite3"), str(tmp_path / "b.sqlite3")
+    _fill(core, source)
+    path = str(tmp_path / "notes.csv")
+    assert core["export_data"](path, source) == len(NOTES)
+    core["init_db"](target)
+    assert core["import_data"](path, target) == len(NOTES)
+    assert _snapshot(core, target)[1] == _snapshot(core, source)[1]
+
+
+def test_markdown_note_text_escaping(core):
+    text = "a<br>b\nc &lt; & <x>"
+    line = core["_md_note_text"](text)
+    assert "\n" not in line and line.count("<br>") == 1
+    assert core["_md_note_text_back"](line) == text
+
+
+def test_import_appends_to_existing_data(core, tmp_path):
+    db = str(tmp_path / "a.sqlite3")
+    _fill(core, db)
+    path = str(tmp_path / "export.jsonl")
+    core["export_data"](path, db)
+    core["import_data"](path, db)
+    tabs, notes, documents = _snapshot(core, db)
+    assert len(notes) == 2 * len(NOTES)
+    assert tabs.count("Дела") == 1  # вкладки заметок сливаются по имени
+    assert [name for name, _content, _path in documents] == ["Большой.py", "Пустой", "Большой.py (2)", "Пустой (2)"]
+
+
+def test_unknown_format_is_rejected(core, tmp_path):
+    with pytest.raises(ValueError, match="Неизвестный формат"):
+        core["export_data"](str(tmp_path / "notes.txt"))
+
+
+def _jsonl(tmp_path, count, tail=""):
+    path = tmp_path / "in.jsonl"
+    lines = [json.dumps({"type": "note", "tab": "T", "text": f"n{i}"}) for i in range(count)]
+    path.write_text("\n".join(lines) + "\n" + tail, encoding="utf-8")
+    return str(path)
+
+
+def _note_count(db):
+    with sqlite3.connect(db) as conn:
+        return conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+def test_parse_error_rolls_back_open_batch(core, tmp_path, monkeypatch):
+    monkeypatch.setitem(core, "IMPORT_BATCH_SIZE", 3)
+    db = str(tmp_path / "a.sqlite3")
+    with pytest.raises(ValueError, match="до ошибки импортировано записей: 6"):
+        core["import_data"](_jsonl(tmp_path, 7, "{не json\n"), db)
+    assert _note_count(db) == 6  # две целые пачки; седьмая заметка откатилась
+
+
+def test_cancel_keeps_what_was_read(core, tmp_path, monkeypatch):
+    monkeypatch.setitem(core, "IMPORT_BATCH_SIZE", 3)
+    monkeypatch.setitem(core, "PROGRESS_EVERY", 4)
+    db = str(tmp_path / "a.sqlite3")
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(InterruptedError):
+        core["import_data"](_jsonl(tmp_path, 10), db, cancel=cancel)
+    assert _note_count(db) == 4
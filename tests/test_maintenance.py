@@ -0,0 +1,36 @@
+"""Обслуживание базы: incremental_vacuum до конца и честный отчёт."""
+import sqlite3
+
+
+def _free_pages(db):
+    with sqlite3.connect(db) as conn:
+        conn.executemany("INSERT INTO tabs(position, name, content) VALUES(?, ?, ?)",
+                         [(i, f"Док {i}", "x" * 8000) for i in range(200)])
+    with sqlite3.connect(db) as conn:
+        conn.execute("DELETE FROM tabs")
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def test_incremental_vacuum_frees_every_page(core):
+    db = core["DB_PATH"]
+    freed = _free_pages(db)
+    assert freed > 100
+
+    report = core["run_db_maintenance"](db)
+    assert report["freelist"] == freed and report["vacuumed_pages"] == freed
+    assert not report["full_vacuum"] and report["analyzed"] and report["integrity"] == "ok"
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+
+def test_old_database_gets_full_vacuum(core, tmp_path):
+    db = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(db) as conn:
+        conn.execute("CREATE TABLE t (x TEXT)")
+        conn.executemany("INSERT INTO t VALUES(?)", [("x" * 4000,)] * 100)
+        conn.execute("DELETE FROM t")
+    report = core["run_db_maintenance"](db, force=True)
+    assert report["full_vacuum"] and report["vacuumed_pages"] == 0
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
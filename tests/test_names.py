@@ -0,0 +1,52 @@
+"""Подбор свободных имён вкладок и постоянные id документов."""
+import sqlite3
+
+
+def test_allocator_counts_suffixes_instead_of_rescanning(core):
+    taken = {"Документ"}
+    checked = []
+
+    def is_taken(name):
+        checked.append(name)
+        return name in taken
+
+    allocator = core["NameAllocator"](is_taken)
+    names = []
+    for _ in range(3):
+        names.append(allocator.allocate("Документ"))
+        taken.add(names[-1])
+    assert names == ["Документ (2)", "Документ (3)", "Документ (4)"]
+    assert checked.count("Документ (2)") == 1  # занятые суффиксы не перебираются заново
+
+    assert allocator.allocate("Новый") == "Новый"
+
+
+def test_noted_names_push_the_suffix_forward(core):
+    taken = {"Лог", "Лог (7)"}
+    allocator = core["NameAllocator"](taken.__contains__)
+    allocator.note("Лог (7)")
+    allocator.note("Лог (3)")  # меньший суффикс счётчик не откатывает
+    allocator.note("Без (суффикса)")
+    assert allocator.allocate("Лог") == "Лог (8)"
+    assert allocator.allocate("Без") == "Без"
+
+
+def test_free_tab_name_checks_window_and_database(core, open_tab):
+    open_tab("Черновик", "")
+    with core["write_transaction"]() as conn:
+        conn.execute("INSERT INTO tabs(position, name, content) VALUES(1, 'Черновик (2)', '')")
+        assert core["_free_tab_name"](conn, "Черновик") == "Черновик (3)"
+        assert core["_free_tab_name"](conn, "Другой") == "Другой"
+
+
+def test_document_row_is_addressed_by_id_not_name(core, open_tab):
+    tab = open_tab("Документ", "раз")
+    core["save_all_to_db"]()
+    tab_id = tab["id"]
+    assert core["tab_names_by_id"][tab_id] == "Документ"
+
+    with sqlite3.connect(core["DB_PATH"]) as conn:  # переименовали в другом окне
+        conn.execute("UPDATE tabs SET name='Отчёт' WHERE id=?", (tab_id,))
+    tab["textbox"].text = "два"
+    core["save_all_to_db"]()
+    assert core["load_from_db"]() == [(core["tab_order_keys"]["Документ"], "Отчёт", "два", None, 2, tab_id)]
@@ -0,0 +1,75 @@
+"""Удаление вкладки заметок: индексы хранилища и напоминания не хранят её заметок."""
+import os
+import runpy
+import shutil
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+ctk = pytest.importorskip("customtkinter")
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "versio_programm_two.py")
+
+
+@pytest.fixture
+def app_globals(tmp_path, monkeypatch):
+    """Глобалы приложения, запущенного без mainloop на пустой БД во временной папке."""
+    import tkinter
+
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError:
+        pytest.skip("для окна Tk нужен дисплей")
+
+    script = tmp_path / "versio_programm_two.py"
+    shutil.copy(APP, script)
+    monkeypatch.setattr(ctk.CTk, "mainloop", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(sys, "argv", [str(script)])
+    app_globals = runpy.run_path(str(script), run_name="__main__")["save_all_to_db"].__globals__
+    yield app_globals
+    try:
+        app_globals["app"].destroy()
+    except Exception:
+        pass
+
+
+def test_delete_notes_tab_clears_indexes_and_reminders(app_globals):
+    g = app_globals
+    g["new_notes_tab"]("Удаляемая")
+    due = datetime.now() + timedelta(hours=2)
+    note = g["store_add_note"](
+        "Удаляемая",
+        {
+            "text": "длинная заметка " * 20,
+            "done": False,
+            "pinned": False,
+            "date": due.strftime("%d.%m.%Y"),
+            "color": g["colors"]["Серый"],
+            "time_start": due.strftime("%H:%M"),
+            "time_end": "",
+            "tags": "дом",
+        },
+    )
+    g["flush_store_events"]()
+
+    key = id(note)
+    g["store_set_filter"](tags="дом")
+    assert key in g["filtered_note_ids"]()
+    assert key in g["notes_text_index"]
+    g["toggle_note_expanded"](note)
+    assert key in g["note_previews"] and key in g["expanded_notes"]
+    assert key in g["_reminder_due"]
+
+    g["set_current_notes_tab"]("Удаляемая")
+    g["delete_current_notes_tab"]()
+    g["flush_store_events"]()
+
+    assert "Удаляемая" not in g["notes_by_tab"]
+    assert key not in g["notes_text_index"]
+    assert key not in g["_filter_index"]["keys"]
+    assert not g["filtered_note_ids"]()
+    assert key not in g["note_previews"]
+    assert key not in g["expanded_notes"]
+    assert not g["_reminder_due"]
+    assert not g["_reminder_heap"]
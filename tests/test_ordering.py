@@ -0,0 +1,82 @@
+"""Разреженные ключи порядка вкладок: вставка и перенос меняют как можно меньше ключей и строк БД."""
+import sqlite3
+
+
+def test_order_key_between(core):
+    between = core["order_key_between"]
+    step = core["ORDER_STEP"]
+    assert between(None, None) == step
+    assert between(step, None) == 2 * step
+    assert between(None, step) == 0
+    assert between(step, 2 * step) == step + step // 2
+    assert between(5, 6) is None  # места нет — нужна перенумерация
+
+
+def test_insert_ordered_keeps_keys_sorted(core):
+    order, keys = [], {}
+    step = core["ORDER_STEP"]
+    assert core["insert_ordered"](order, keys, "b", 2 * step) == 0
+    assert core["insert_ordered"](order, keys, "d", 4 * step) == 1
+    assert core["insert_ordered"](order, keys, "a", step) == 0
+    assert core["insert_ordered"](order, keys, "c", 3 * step) == 2
+    assert order == ["a", "b", "c", "d"]
+    assert core["next_order_key"](order, keys) == 5 * step
+    assert core["next_order_key"]([], {}) == step
+
+
+def test_move_changes_one_key_until_gap_is_exhausted(core):
+    move = core["move_ordered"]
+    order = ["a", "b", "c", "d"]
+    keys = {name: (i + 1) * core["ORDER_STEP"] for i, name in enumerate(order)}
+
+    assert move(order, keys, "d", 1) == ["d"]
+    assert order == ["a", "d", "b", "c"]
+    assert keys["a"] < keys["d"] < keys["b"]
+
+    # Каждый следующий перенос — между «a» и предыдущим перенесённым:
+    # промежуток делится пополам, пока не кончится
+    changed = []
+    for _ in range(100):
+        changed = move(order, keys, order[-1], 1)
+        if len(changed) > 1:
+            break
+    assert changed == order  # промежуток исчерпан — перенумерованы все
+    assert [keys[name] for name in order] == [(i + 1) * core["ORDER_STEP"] for i in range(len(order))]
+    assert sorted(order, key=keys.get) == order
+
+
+def _log(core, op):
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        return conn.execute("SELECT entity, key FROM change_log WHERE op=? ORDER BY seq", (op,)).fetchall()
+
+
+def test_moving_a_document_writes_one_position(core, open_tab):
+    tabs = [open_tab(name, name) for name in "abcd"]
+    core["save_all_to_db"]()
+    before = {row[1]: row[0] for row in core["load_from_db"]()}
+
+    moved = core["move_ordered"](core["tab_order"], core["tab_order_keys"], "d", 1)
+    open_tab("новый", "")  # ещё не записан — его позицию запишет обычное сохранение
+    core["save_tab_positions"](moved + ["новый"])
+
+    after = {row[1]: row[0] for row in core["load_from_db"]()}
+    assert [row[1] for row in core["load_from_db"]()] == ["a", "d", "b", "c"]
+    assert {name for name in after if after[name] != before[name]} == {"d"}
+    assert _log(core, "move") == [("tab", str(tabs[3]["id"]))]
+
+
+def test_moving_a_notes_tab_writes_one_position(core):
+    for name in ("Первая", "Вторая", "Третья"):
+        core["ensure_notes_tab"](name, switch_to=False)
+    core["save_notes_to_db"]()
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        before = dict(conn.execute("SELECT name, position FROM note_tabs"))
+
+    core["move_notes_tab"]("Третья", 0)
+    core["app"].run()  # tab_changed -> сохранение заметок
+
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        after = dict(conn.execute("SELECT name, position FROM note_tabs"))
+        order = [name for (name,) in conn.execute("SELECT name FROM note_tabs ORDER BY position")]
+    assert order == ["Третья", "Первая", "Вторая"]
+    assert {name for name in after if after[name] != before[name]} == {"Третья"}
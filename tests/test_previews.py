@@ -0,0 +1,56 @@
+"""Длинные заметки: превью в одну строку, его кеш и развёрнутые заметки."""
+import sqlite3
+
+
+def _note(text):
+    return {"text": text, "done": False, "pinned": False, "date": "", "color": "#aaa",
+            "time_start": "", "time_end": "", "tags": ""}
+
+
+def test_short_note_is_its_own_preview(core):
+    note = _note("коротко")
+    assert core["note_preview"](note) is note["text"]
+    assert not core["note_is_long"](note)
+    assert core["note_previews"] == {}  # короткие заметки кеш не занимают
+
+
+def test_long_and_multiline_previews(core):
+    limit = core["NOTE_PREVIEW_CHARS"]
+    long = _note("с" * (limit + 50))
+    assert core["note_preview"](long) == "с" * limit + " …" and core["note_is_long"](long)
+    lines = _note("первая строка   \nвторая")
+    assert core["note_preview"](lines) == "первая строка …" and core["note_is_long"](lines)
+
+
+def test_preview_is_cached_until_text_changes(core):
+    note = core["store_add_note"]("Заметки", _note("строка\n" * 1000))
+    first = core["note_preview"](note)
+    assert core["note_preview"](note) is first
+
+    core["store_update_note"]("Заметки", note, text="другая\n" + "x" * 500)
+    assert core["note_preview"](note) == "другая …"
+
+
+def test_removal_and_reload_drop_preview_state(core):
+    gone = core["store_add_note"]("Заметки", _note("удалю\nпотом"))
+    kept = core["store_add_note"]("Заметки", _note("оставлю\nэту"))
+    for note in (gone, kept):
+        core["note_preview"](note)
+        core["expanded_notes"].add(id(note))
+
+    core["store_remove_note"]("Заметки", gone)
+    core["flush_store_events"]()
+    assert set(core["note_previews"]) == {id(kept)} and core["expanded_notes"] == {id(kept)}
+
+    core["notes_by_tab"]["Заметки"] = []  # перечитали из БД: заметок больше нет
+    core["emit"]("notes_reloaded", saved=True)
+    core["flush_store_events"]()
+    assert core["note_previews"] == {} and core["expanded_notes"] == set()
+
+
+def test_long_text_is_stored_whole(core):
+    text = "абзац\n" * 5000
+    core["store_add_note"]("Заметки", _note(text))
+    core["flush_store_events"]()
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        assert conn.execute("SELECT text FROM notes").fetchone() == (text,)
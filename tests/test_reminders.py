@@ -0,0 +1,118 @@
+"""Куча сроков напоминаний: ближайший срок, устаревшие записи, пересборка."""
+import sqlite3
+from datetime import datetime, timedelta
+
+
+def _timed(hours: float, done=False):
+    due = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=hours)
+    note = {"text": f"через {hours} ч", "done": done, "date": due.strftime("%d.%m.%Y"),
+            "time_start": due.strftime("%H:%M"), "time_end": ""}
+    return note, due.timestamp()
+
+
+def _live(core):
+    return [entry for entry in core["_reminder_heap"] if core["_reminder_is_live"](entry)]
+
+
+def test_note_due_time_parsing(core):
+    due = core["note_due_time"]
+    assert due("05.01.2026", "9", "") == datetime(2026, 1, 5, 9, 0).timestamp()
+    assert due("05.01.2026", "", "18.30") == datetime(2026, 1, 5, 18, 30).timestamp()
+    assert due("05.01.2026", "", "") is None
+    assert due("05.01.2026", "25:00", "") is None
+    assert due("не дата", "10:00", "") is None
+
+
+def test_heap_top_is_nearest_and_reschedule_leaves_stale_entry(core):
+    far, far_due = _timed(5)
+    near, near_due = _timed(1)
+    for note in (far, near):
+        core["schedule_reminder"](note)
+    core["arm_reminders"]()
+    assert core["_reminders"]["armed"] == near_due
+
+    # перенос срока: старая запись остаётся в куче, но уже не живая
+    near["time_start"] = (datetime.now() + timedelta(hours=8)).strftime("%H:%M")
+    near["date"] = (datetime.now() + timedelta(hours=8)).strftime("%d.%m.%Y")
+    core["schedule_reminder"](near)
+    assert len(core["_reminder_heap"]) == 3 and len(_live(core)) == 2
+    core["arm_reminders"]()
+    assert core["_reminders"]["armed"] == far_due
+    assert len(core["_reminder_heap"]) == 2  # устаревшая вершина выброшена
+
+
+def test_done_and_past_notes_are_not_scheduled(core):
+    done, _ = _timed(2, done=True)
+    past, _ = _timed(-2)
+    core["schedule_reminder"](done)
+    core["schedule_reminder"](past)
+    assert core["_reminder_due"] == {}
+    core["arm_reminders"]()
+    assert core["_reminders"]["armed"] is None
+
+
+def test_heap_is_rebuilt_when_mostly_stale(core):
+    note, _ = _timed(3)
+    for minutes in range(200):
+        note["time_start"] = (datetime.now() + timedelta(hours=3, minutes=minutes)).strftime("%H:%M")
+        note["date"] = (datetime.now() + timedelta(hours=3, minutes=minutes)).strftime("%d.%m.%Y")
+        core["schedule_reminder"](note)
+    assert len(core["_reminder_due"]) == 1
+    assert len(core["_reminder_heap"]) <= 2 * len(core["_reminder_due"]) + 64
+
+
+def test_fire_pops_due_notes_and_rearms(core, monkeypatch):
+    soon, soon_due = _timed(1)
+    later, later_due = _timed(2)
+    for note in (soon, later):
+        core["schedule_reminder"](note)
+    shown = []
+    monkeypatch.setitem(core, "show_reminders", shown.extend)
+    monkeypatch.setattr(core["time"], "time", lambda: soon_due + 1)
+    core["fire_reminders"]()
+    assert shown == [soon]
+    assert list(core["_reminder_due"]) == [id(later)]
+    assert core["_reminders"]["armed"] == later_due
+
+
+def _add(core, tab, hours):
+    note, due = _timed(hours)
+    note.update(pinned=False, color="#aaa", tags="")
+    core["store_add_note"](tab, note)
+    return note, due
+
+
+def test_store_events_schedule_and_unschedule(core):
+    first, first_due = _add(core, "Заметки", 2)
+    second, second_due = _add(core, "Заметки", 1)
+    core["flush_store_events"]()
+    assert core["_reminders"]["armed"] == second_due
+
+    core["store_update_note"]("Заметки", second, done=True)
+    core["flush_store_events"]()
+    assert list(core["_reminder_due"]) == [id(first)]
+    assert core["_reminders"]["armed"] == first_due
+
+    core["store_update_note"]("Заметки", first, text="только текст")  # срок не тронут
+    core["flush_store_events"]()
+    assert core["_reminder_due"][id(first)][1] == first_due
+
+    core["store_remove_note"]("Заметки", first)
+    core["flush_store_events"]()
+    assert core["_reminder_due"] == {} and core["_reminders"]["armed"] is None
+
+
+def test_deleted_notes_tab_takes_its_reminders(core):
+    core["ensure_notes_tab"]("Дела", switch_to=True)
+    kept, kept_due = _add(core, "Заметки", 3)
+    _add(core, "Дела", 1)
+    _add(core, "Дела", 2)
+    core["flush_store_events"]()
+
+    core["remove_notes_tab"]("Дела")
+    core["flush_store_events"]()
+    assert list(core["_reminder_due"]) == [id(kept)]
+    assert core["_reminders"]["armed"] == kept_due
+    assert core["get_current_notes_tab"]() == "Заметки"
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 1
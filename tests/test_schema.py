@@ -0,0 +1,68 @@
+"""Миграции схемы: новая база и база старого формата доводятся до SCHEMA_VERSION."""
+import sqlite3
+
+
+OLD_SCHEMA = """
+CREATE TABLE tabs (position INTEGER NOT NULL, name TEXT PRIMARY KEY, content TEXT NOT NULL, filepath TEXT);
+CREATE TABLE notes (
+    position INTEGER NOT NULL, tab_name TEXT NOT NULL, text TEXT NOT NULL, done INTEGER NOT NULL,
+    pinned INTEGER NOT NULL, date TEXT NOT NULL, color TEXT NOT NULL, time_start TEXT, time_end TEXT
+);
+CREATE TABLE note_tabs (position INTEGER NOT NULL, name TEXT PRIMARY KEY);
+CREATE TABLE app_settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _tables(db):
+    with sqlite3.connect(db) as conn:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+def _pragma(db, name):
+    with sqlite3.connect(db) as conn:
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_new_database_gets_current_schema(core):
+    db = core["DB_PATH"]
+    assert _pragma(db, "user_version") == core["SCHEMA_VERSION"] == len(core["SCHEMA_MIGRATIONS"])
+    assert {"tabs", "notes", "note_tabs", "change_log", "undo_journal", "undo_heads"} <= _tables(db)
+    assert _pragma(db, "auto_vacuum") == 2  # INCREMENTAL задаётся до первой таблицы
+    assert _pragma(db, "journal_mode") == "wal"
+
+
+def test_old_database_is_migrated_with_its_data(core, tmp_path):
+    db = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(db) as conn:
+        conn.executescript(OLD_SCHEMA)
+        conn.execute("INSERT INTO tabs VALUES(0, 'Документ 1', 'текст', NULL)")
+        conn.executemany("INSERT INTO note_tabs VALUES(?, ?)", [(0, "Первая"), (1, "Вторая")])
+        conn.executemany(
+            "INSERT INTO notes VALUES(?, ?, ?, ?, 0, '04.01.2026', '#2b2b2b', '', '')",
+            [(0, "Вторая", "б", 1), (1, "Первая", "а", 0), (0, "Первая", "в", 0)],
+        )
+
+    core["init_db"](db)
+
+    assert _pragma(db, "user_version") == core["SCHEMA_VERSION"]
+    with sqlite3.connect(db) as conn:
+        tabs = conn.execute("SELECT name FROM note_tabs ORDER BY position").fetchall()
+        notes = conn.execute(
+            "SELECT t.name, n.text, n.done, n.tags, n.version FROM notes n "
+            "JOIN note_tabs t ON t.id = n.tab_id ORDER BY t.position, n.position"
+        ).fetchall()
+        doc = conn.execute("SELECT id, name, content, codec, version FROM tabs").fetchone()
+    assert tabs == [("Первая",), ("Вторая",)]
+    assert notes == [("Первая", "в", 0, "", 1), ("Первая", "а", 0, "", 1), ("Вторая", "б", 1, "", 1)]
+    assert doc[1:] == ("Документ 1", "текст", "", 1) and doc[0] is not None
+
+
+def test_init_db_is_idempotent(core):
+    db = core["DB_PATH"]
+    with sqlite3.connect(db) as conn:
+        conn.execute("INSERT INTO note_tabs(position, name) VALUES(1024, 'Вкладка')")
+    core["init_db"](db)
+    core["init_db"](db)
+    assert _pragma(db, "user_version") == core["SCHEMA_VERSION"]
+    with sqlite3.connect(db) as conn:
+        assert conn.execute("SELECT name FROM note_tabs").fetchall() == [("Вкладка",)]
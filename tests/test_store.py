@@ -0,0 +1,61 @@
+"""Хранилище заметок: события пачкой, индексы подписчиков и запись в БД."""
+import sqlite3
+
+
+def _note(text, **fields):
+    return {"text": text, "done": False, "pinned": False, "date": "", "color": "#aaa",
+            "time_start": "", "time_end": "", "tags": "", **fields}
+
+
+def test_events_are_batched_until_idle(core):
+    seen = []
+    core["subscribe"](seen.append)
+    core["store_add_note"]("Заметки", _note("раз"))
+    core["store_add_note"]("Заметки", _note("два"))
+    assert seen == []  # подписчики зовутся один раз за такт простоя
+    core["app"].run()
+    assert len(seen) == 1 and [event["kind"] for event in seen[0]] == ["note_added", "note_added"]
+
+
+def test_store_edits_reach_index_and_database(core):
+    note = core["store_add_note"]("Заметки", _note("Купить Хлеб"))
+    core["flush_store_events"]()
+    assert core["notes_text_index"][id(note)] == "купить хлеб"
+
+    core["store_update_note"]("Заметки", note, text="Купить молоко", done=True)
+    core["flush_store_events"]()
+    assert core["note_search_text"](note) == "купить молоко"
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        assert conn.execute("SELECT text, done FROM notes").fetchall() == [("Купить молоко", 1)]
+
+    core["store_remove_note"]("Заметки", note)
+    core["flush_store_events"]()
+    assert id(note) not in core["notes_text_index"]
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+
+
+def test_saved_events_are_not_written_back(core, monkeypatch):
+    writes = []
+    monkeypatch.setitem(core, "save_notes_to_db", lambda: writes.append(1))
+    core["emit"]("notes_reloaded", saved=True)
+    core["flush_store_events"]()
+    assert writes == []
+    core["emit"]("note_added", note=_note("x"), tab="Заметки")
+    core["flush_store_events"]()
+    assert writes == [1]
+
+
+def test_moved_note_gets_new_version_for_other_windows(core):
+    first = core["store_add_note"]("Заметки", _note("первая"))
+    second = core["store_add_note"]("Заметки", _note("вторая"))
+    core["flush_store_events"]()
+
+    core["store_move_note"]("Заметки", second, 0)
+    core["flush_store_events"]()
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        rows = conn.execute("SELECT text, position, version FROM notes ORDER BY position").fetchall()
+        log = conn.execute("SELECT key FROM change_log WHERE entity='note' AND op='update'").fetchall()
+    assert rows == [("вторая", 0, 2), ("первая", 1, 2)]
+    assert sorted(log) == sorted([(str(first["id"]),), (str(second["id"]),)])
+    assert first["version"] == second["version"] == 2
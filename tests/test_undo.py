@@ -0,0 +1,128 @@
+"""Журнал правок: слияние ввода в шаги, запись в БД и выгрузка старых шагов из памяти."""
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+
+def test_typing_and_backspace_merge(core):
+    continues, merged = core["_continues"], core["_merged"]
+    typed = ("i", "1.0", "1.3", "абв")
+    more = ("i", "1.3", "1.4", "г")
+    assert continues(typed, more)
+    assert merged(typed, more) == ("i", "1.0", "1.4", "абвг")
+    assert not continues(typed, ("i", "2.0", "2.1", "x"))  # ввод в другом месте
+    assert not continues(typed, ("d", "1.2", "1.3", "в"))
+
+    backspace = ("d", "1.3", "1.4", "г")
+    again = ("d", "1.2", "1.3", "в")
+    assert continues(backspace, again)
+    assert merged(backspace, again) == ("d", "1.2", "1.4", "вг")
+    # Delete на месте продолжает шаг, но не сливается (текст правее)
+    assert continues(backspace, ("d", "1.3", "1.4", "д"))
+    assert merged(backspace, ("d", "1.3", "1.4", "д")) is None
+
+
+def test_ops_pack_round_trip(core):
+    ops = [("i", "1.0", "1.5", "текст"), ("d", "2.0", "3.0", "\n")]
+    assert core["unpack_undo_ops"](core["pack_undo_ops"](ops)) == ops
+
+
+@pytest.fixture
+def journal(core):
+    """Журнал вкладки без виджета: прокси не ставится, стеки правим напрямую."""
+    with core["write_transaction"]() as conn:
+        tab_id = conn.execute(
+            "INSERT INTO tabs(position, name, content, codec) VALUES(1024, 'Док', '', '')"
+        ).lastrowid
+    tab_data = {"textbox": SimpleNamespace(_textbox=object()), "id": tab_id}
+    journal = core["UndoJournal"](tab_data)
+    assert not journal.active
+    journal.reset(1)
+    return journal
+
+
+def _push(core, journal, text):
+    group = core["_group"]([("i", "1.0", f"1.{len(text)}", text)])
+    journal.undo.append(group)
+    journal.size += group["size"]
+    journal.dirty = True
+
+
+def test_flush_then_spill_keeps_history_on_disk(core, journal):
+    for text in ("раз", "два", "три"):
+        _push(core, journal, text)
+    with core["write_transaction"]() as conn:
+        journal.flush(conn, journal.tab_data["id"], 1)
+    assert [group["seq"] for group in journal.undo] == [1, 2, 3]
+    assert not journal.dirty
+
+    # Предел памяти 0: записанные шаги уходят из памяти все
+    core["settings"]["undo_memory_mb"] = 0
+    core["trim_undo_memory"]()
+    assert journal.undo == [] and journal.size == 0
+
+    # Ctrl+Z дочитывает их из БД — последний шаг сверху
+    journal._load_undo()
+    assert [group["ops"][0][3] for group in journal.undo] == ["раз", "два", "три"]
+
+
+def test_unsaved_steps_are_not_spilled(core, journal):
+    _push(core, journal, "несохранённое")
+    core["settings"]["undo_memory_mb"] = 0
+    core["trim_undo_memory"]()
+    assert len(journal.undo) == 1 and journal.size > 0
+
+
+def test_history_of_other_version_is_not_loaded(core, journal):
+    _push(core, journal, "шаг")
+    with core["write_transaction"]() as conn:
+        journal.flush(conn, journal.tab_data["id"], 1)
+    journal.reset(2)  # документ менялся без этого журнала
+    journal._load_undo()
+    assert journal.undo == []
+
+
+def _rows(core, tab_id):
+    with sqlite3.connect(core["DB_PATH"]) as conn:
+        journal = conn.execute("SELECT stack, seq FROM undo_journal WHERE tab_id=? ORDER BY stack, seq",
+                               (tab_id,)).fetchall()
+        head = conn.execute("SELECT version FROM undo_heads WHERE tab_id=?", (tab_id,)).fetchall()
+    return journal, head
+
+
+def test_history_is_saved_with_document_and_reloaded(core, open_tab):
+    tab = open_tab("Док", "два")
+    tab["journal"] = core["UndoJournal"](tab)
+    _push(core, tab["journal"], "раз")
+    tab["journal"].redo.append(core["_group"]([("i", "1.0", "1.3", "три")]))
+    tab["journal"].redo_dirty = True
+    core["save_all_to_db"]()
+    assert _rows(core, tab["id"]) == ([("redo", 0), ("undo", 1)], [(1,)])
+
+    restarted = core["UndoJournal"](tab)  # следующий запуск: журнал с версии документа в БД
+    restarted.reset(1)
+    restarted._load_undo()
+    restarted._load_redo()
+    assert [group["ops"][0][3] for group in restarted.undo + restarted.redo] == ["раз", "три"]
+
+
+def test_only_last_steps_are_kept(core, journal, monkeypatch):
+    monkeypatch.setitem(core, "UNDO_MAX_STEPS", 2)
+    for text in ("раз", "два", "три"):
+        _push(core, journal, text)
+    with core["write_transaction"]() as conn:
+        journal.flush(conn, journal.tab_data["id"], 1)
+    assert _rows(core, journal.tab_data["id"])[0] == [("undo", 2), ("undo", 3)]
+    assert [group["seq"] for group in journal.undo] == [2, 3]
+
+
+def test_deleted_document_takes_its_history(core, open_tab):
+    tab = open_tab("Док", "текст")
+    tab["journal"] = core["UndoJournal"](tab)
+    _push(core, tab["journal"], "текст")
+    core["save_all_to_db"]()
+    del core["current_tabs"]["Док"]
+    core["tab_order"].remove("Док")
+    core["save_all_to_db"]()
+    assert _rows(core, tab["id"]) == ([], [])
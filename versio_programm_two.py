@@ -1,9 +1,30 @@
 import customtkinter as ctk
-from tkinter import filedialog
+from tkinter import filedialog, messagebox
 import os
 import sys
 import shutil
 import sqlite3
+import queue
+import random
+import select
+import struct
+import ctypes
+import heapq
+import bisect
+import functools
+import threading
+import time
+import json
+import re
+import keyword
+import csv
+import argparse
+import tempfile
+import uuid
+import zlib
+import gzip
+import lzma
+from contextlib import contextmanager
 from datetime import datetime
 
 
@@ -45,20 +66,7 @@ def get_data_dir() -> str:
 def data_path(filename: str) -> str:
     return os.path.join(get_data_dir(), filename)
 
-# ---------------- НАСТРОЙКИ ----------------
-ctk.set_appearance_mode("dark")
-ctk.set_default_color_theme("dark-blue")
-
-# ---------------- ОКНО ----------------
-app = ctk.CTk()
-app.title("Твой личный блокнот")
-app.geometry("1100x800")
-app.resizable(False, False)
-
-# ---------------- ШРИФТЫ / НАСТРОЙКИ ----------------
-emoji_font = ("Arial Unicode MS", 16)
-title_font = ("Segoe UI", 24)
-
+# ---------------- НАСТРОЙКИ ПРИЛОЖЕНИЯ ----------------
 settings = {
     "theme": "dark",
     "font_family": "Segoe UI",
@@ -66,115 +74,22 @@ settings = {
     "editor_font_size": 14,
     "always_on_top": False,
     "show_save_status": True,
+    "doc_compression": "zlib",
+    "backup_interval_min": 60,
+    "backup_compress": False,
+    "memory_budget_mb": 64,
+    "undo_memory_mb": 4,
+    "notes_renderer": "canvas",
 }
 
-
-def _focused_text_like_widget():
-    """Возвращает виджет с фокусом, если это поле ввода (Entry/Text)."""
-    try:
-        w = app.focus_get()
-    except Exception:
-        return None
-
-    if w is None:
-        return None
-
-    try:
-        cls = w.winfo_class()
-    except Exception:
-        return None
-
-    # Tk классы для ввода
-    if cls in ("Text", "Entry"):
-        return w
-    return None
-
-
-def _event_generate_on_focused(sequence: str):
-    w = _focused_text_like_widget()
-    if not w:
-        return
-    try:
-        w.event_generate(sequence)
-    except Exception:
-        pass
-
-
-def _select_all_on_focused():
-    w = _focused_text_like_widget()
-    if not w:
-        return
-    try:
-        if w.winfo_class() == "Text":
-            w.tag_add("sel", "1.0", "end-1c")
-            w.mark_set("insert", "1.0")
-            w.see("insert")
-        elif w.winfo_class() == "Entry":
-            w.selection_range(0, "end")
-            w.icursor(0)
-    except Exception:
-        pass
-
-
-def _undo_on_focused():
-    w = _focused_text_like_widget()
-    if not w:
-        return
-    try:
-        if w.winfo_class() == "Text":
-            w.edit_undo()
-    except Exception:
-        pass
-
-
-def _redo_on_focused():
-    w = _focused_text_like_widget()
-    if not w:
-        return
-    try:
-        if w.winfo_class() == "Text":
-            w.edit_redo()
-    except Exception:
-        pass
-
-
-def _bind_edit_hotkeys_to_app():
-    """Глобальные горячие клавиши для копирования/вставки/вырезания и т.п."""
-    # Не используем bind_all, чтобы избежать дублирования событий
-    pass
-
-
-def get_notes_font():
-    return (settings["font_family"], settings["notes_font_size"])
-
-
-def get_editor_font():
-    return ("Consolas", settings["editor_font_size"])
-
-# ---------------- ОСНОВНОЙ КОНТЕЙНЕР ----------------
-content_frame = ctk.CTkFrame(app)
-content_frame.grid(row=2, column=0, columnspan=4, sticky="nsew", padx=20, pady=(0, 20))
-
-app.grid_columnconfigure((0, 1, 2, 3), weight=1)
-app.grid_rowconfigure(2, weight=1)
-
-content_frame.grid_rowconfigure(0, weight=1)
-content_frame.grid_columnconfigure(0, weight=1)
-
-# ---------------- TOOLBAR ДЛЯ БЛОКНОТА ----------------
-toolbar = ctk.CTkFrame(app)
-toolbar.grid(row=1, column=0, columnspan=4, sticky="ew", padx=20, pady=(0, 10))
-
-# Переменные для работы с вкладками
-tab_counter = 1
-current_tabs = {}  # Словарь для хранения данных вкладок
-tab_order = []
-
-# Данные заметок (вкладки внутри "Заметок")
-notes_search_text = ""
-notes_tabs_order: list[str] = []
-notes_by_tab: dict[str, list[dict]] = {}
-notes_frames: dict[str, ctk.CTkScrollableFrame] = {}
+# Цвета заметок
+colors = {
+    "Серый": "#2b2b2b",
+    "Синий": "#1f4fff",
+    "Оранжевый": "#ff8c1a",
+    "Жёлтый": "#f5c542",
+    "Фиолетовый": "#7a3db8",
+}
 
 # ---------------- SQLITE (ПАМЯТЬ БЛОКНОТА) ----------------
 DB_PATH = data_path("notebook.sqlite3")
@@ -188,23 +103,100 @@ if not os.path.exists(DB_PATH):
         except Exception:
             pass
 
+# Идентификатор этого процесса в журнале изменений (change_log)
+INSTANCE_ID = uuid.uuid4().hex
 
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS tabs (
-                position INTEGER NOT NULL,
-                name TEXT PRIMARY KEY,
-                content TEXT NOT NULL,
-                filepath TEXT
-            )
-            """
+# Сколько последних записей change_log хранить для отстающих окон
+CHANGE_LOG_KEEP = 100_000
+
+
+# ---------------- СХЕМА БД И МИГРАЦИИ ----------------
+# Версия схемы хранится в PRAGMA user_version. SCHEMA_MIGRATIONS[i] переводит
+# базу с версии i на i + 1; каждая миграция — своя транзакция.
+
+
+def _migration_base(conn):
+    """Базовая схема. Идемпотентна: доводит до неё и старые базы без версии
+    (созданные до tab_name/time_*/id/version), и уже почти актуальные."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tabs (
+            position INTEGER NOT NULL,
+            name TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            filepath TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            tab_name TEXT NOT NULL,
+            text TEXT NOT NULL,
+            done INTEGER NOT NULL,
+            pinned INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            color TEXT NOT NULL,
+            time_start TEXT,
+            time_end TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS note_tabs (
+            position INTEGER NOT NULL,
+            name TEXT PRIMARY KEY
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """
+    )
+
+    # Журнал изменений: по нему другие окна подтягивают чужие правки.
+    # entity: 'note' (key = id или "первый:последний"), 'tab' (key = id),
+    # 'note_tabs' (key = '*'); op: insert / update / delete.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            entity TEXT NOT NULL,
+            key TEXT NOT NULL,
+            op TEXT NOT NULL
         )
+        """
+    )
 
+    # Базы, созданные до появления новых колонок
+    existing_cols = {row[1] for row in conn.execute("PRAGMA table_info(notes)").fetchall()}
+    if "tab_name" not in existing_cols:
+        conn.execute("ALTER TABLE notes ADD COLUMN tab_name TEXT")
+        conn.execute("UPDATE notes SET tab_name='Заметки' WHERE tab_name IS NULL")
+    if "time_start" not in existing_cols:
+        conn.execute("ALTER TABLE notes ADD COLUMN time_start TEXT")
+    if "time_end" not in existing_cols:
+        conn.execute("ALTER TABLE notes ADD COLUMN time_end TEXT")
+    if "id" not in existing_cols:
+        # Постоянный id нельзя добавить через ALTER — пересоздаём таблицу
+        conn.execute("ALTER TABLE notes RENAME TO notes_old")
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS notes (
+            CREATE TABLE notes (
+                id INTEGER PRIMARY KEY,
                 position INTEGER NOT NULL,
                 tab_name TEXT NOT NULL,
                 text TEXT NOT NULL,
@@ -213,757 +205,6615 @@ def init_db():
                 date TEXT NOT NULL,
                 color TEXT NOT NULL,
                 time_start TEXT,
-                time_end TEXT
+                time_end TEXT,
+                version INTEGER NOT NULL DEFAULT 1
             )
             """
         )
-
         conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS note_tabs (
-                position INTEGER NOT NULL,
-                name TEXT PRIMARY KEY
-            )
-            """
+            "INSERT INTO notes(position, tab_name, text, done, pinned, date, color, time_start, time_end) "
+            "SELECT position, tab_name, text, done, pinned, date, color, time_start, time_end "
+            "FROM notes_old ORDER BY rowid"
         )
-
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS app_settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-            """
+        conn.execute("DROP TABLE notes_old")
+
+    tab_cols = {row[1] for row in conn.execute("PRAGMA table_info(tabs)").fetchall()}
+    if "version" not in tab_cols:
+        conn.execute("ALTER TABLE tabs ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _migration_indexes(conn):
+    """Индексы под все запросы программы."""
+    # Загрузка (ORDER BY tab_name, position), выборки по вкладке, GROUP BY tab_name
+    conn.execute("CREATE INDEX IF NOT EXISTS notes_tab_position ON notes(tab_name, position)")
+    # Загрузка и экспорт документов/вкладок по порядку
+    conn.execute("CREATE INDEX IF NOT EXISTS tabs_position ON tabs(position)")
+    conn.execute("CREATE INDEX IF NOT EXISTS note_tabs_position ON note_tabs(position)")
+
+
+def _migration_doc_codec(conn):
+    """Кодек сжатия текста документа: '' — обычный текст, 'zlib', 'lzma'."""
+    conn.execute("ALTER TABLE tabs ADD COLUMN codec TEXT NOT NULL DEFAULT ''")
+
+
+def _migration_integer_ids(conn):
+    """Постоянные целые id у документов и вкладок заметок; имя — только
+    отображаемое (уникальное) поле. Заметки ссылаются на вкладку по tab_id."""
+    conn.execute("ALTER TABLE tabs RENAME TO tabs_old")
+    conn.execute(
+        """
+        CREATE TABLE tabs (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL UNIQUE,
+            content TEXT NOT NULL,
+            codec TEXT NOT NULL DEFAULT '',
+            filepath TEXT,
+            version INTEGER NOT NULL DEFAULT 1
         )
+        """
+    )
+    conn.execute(
+        "INSERT INTO tabs(position, name, content, codec, filepath, version) "
+        "SELECT position, name, content, codec, filepath, version FROM tabs_old ORDER BY position"
+    )
+    conn.execute("DROP TABLE tabs_old")
+    conn.execute("CREATE INDEX IF NOT EXISTS tabs_position ON tabs(position)")
+
+    conn.execute("ALTER TABLE note_tabs RENAME TO note_tabs_old")
+    conn.execute(
+        """
+        CREATE TABLE note_tabs (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO note_tabs(position, name) SELECT position, name FROM note_tabs_old ORDER BY position"
+    )
+    conn.execute("DROP TABLE note_tabs_old")
+    # Заметки из вкладок, которых нет в note_tabs, не должны потеряться
+    next_pos = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM note_tabs").fetchone()[0]
+    orphans = conn.execute(
+        "SELECT DISTINCT tab_name FROM notes WHERE tab_name NOT IN (SELECT name FROM note_tabs) ORDER BY tab_name"
+    ).fetchall()
+    for offset, (name,) in enumerate(orphans):
+        conn.execute("INSERT INTO note_tabs(position, name) VALUES(?, ?)", (next_pos + offset, name))
+    conn.execute("CREATE INDEX IF NOT EXISTS note_tabs_position ON note_tabs(position)")
+
+    conn.execute("ALTER TABLE notes RENAME TO notes_old")
+    conn.execute(
+        """
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY,
+            position INTEGER NOT NULL,
+            tab_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            done INTEGER NOT NULL,
+            pinned INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            color TEXT NOT NULL,
+            time_start TEXT,
+            time_end TEXT,
+            version INTEGER NOT NULL DEFAULT 1
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO notes(id, position, tab_id, text, done, pinned, date, color, time_start, time_end, version) "
+        "SELECT n.id, n.position, t.id, n.text, n.done, n.pinned, n.date, n.color, n.time_start, n.time_end, "
+        "n.version FROM notes_old AS n JOIN note_tabs AS t ON t.name = n.tab_name ORDER BY n.id"
+    )
+    conn.execute("DROP TABLE notes_old")
+    conn.execute("CREATE INDEX IF NOT EXISTS notes_tab_position ON notes(tab_id, position)")
 
-        # Миграция: если база уже была создана без новых колонок
-        existing_cols = {row[1] for row in conn.execute("PRAGMA table_info(notes)").fetchall()}
-        if "tab_name" not in existing_cols:
-            conn.execute("ALTER TABLE notes ADD COLUMN tab_name TEXT")
-            conn.execute("UPDATE notes SET tab_name='Заметки' WHERE tab_name IS NULL")
-        if "time_start" not in existing_cols:
-            conn.execute("ALTER TABLE notes ADD COLUMN time_start TEXT")
-        if "time_end" not in existing_cols:
-            conn.execute("ALTER TABLE notes ADD COLUMN time_end TEXT")
-
+    # Старые записи журнала ссылаются на документы по имени — они уже применены
+    conn.execute("DELETE FROM change_log WHERE entity='tab'")
 
-def save_all_to_db():
-    """Сохраняет ВСЕ вкладки в SQLite (имя, текст, filepath)."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM tabs")
-        for position, tab_name in enumerate(tab_order):
-            tab_data = current_tabs.get(tab_name)
-            if not tab_data:
-                continue
-            content = tab_data["textbox"].get("1.0", "end-1c")
-            filepath = tab_data.get("filepath")
-            conn.execute(
-                "INSERT INTO tabs(position, name, content, filepath) VALUES(?, ?, ?, ?)",
-                (position, tab_name, content, filepath),
-            )
 
+def _migration_sparse_positions(conn):
+    """Порядок вкладок — разреженные ключи с шагом ORDER_STEP."""
+    for table in ("tabs", "note_tabs"):
+        ids = [row_id for (row_id,) in conn.execute(f"SELECT id FROM {table} ORDER BY position, id")]
+        conn.executemany(
+            f"UPDATE {table} SET position=? WHERE id=?",
+            [((index + 1) * ORDER_STEP, row_id) for index, row_id in enumerate(ids)],
+        )
 
-def load_from_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute(
-            "SELECT position, name, content, filepath FROM tabs ORDER BY position ASC"
-        ).fetchall()
-    return rows
 
+def _migration_undo_journal(conn):
+    """Журнал правок документов (Ctrl+Z/Ctrl+Y между запусками)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS undo_journal (
+            tab_id INTEGER NOT NULL,
+            stack TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ops BLOB NOT NULL,
+            PRIMARY KEY (tab_id, stack, seq)
+        )
+        """
+    )
+    # Версия документа, на которой кончается журнал
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS undo_heads (
+            tab_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """
+    )
 
-def save_notes_to_db():
-    """Сохраняет все вкладки заметок и заметки в SQLite."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM notes")
-        conn.execute("DELETE FROM note_tabs")
 
-        for pos, tab_name in enumerate(notes_tabs_order):
-            conn.execute("INSERT INTO note_tabs(position, name) VALUES(?, ?)", (pos, tab_name))
+def _migration_note_tags(conn):
+    """Теги заметок: нормализованные слова через пробел (см. normalize_tags)."""
+    conn.execute("ALTER TABLE notes ADD COLUMN tags TEXT NOT NULL DEFAULT ''")
 
-        for tab_name in notes_tabs_order:
-            tab_notes = notes_by_tab.get(tab_name, [])
-            for position, note in enumerate(tab_notes):
-                conn.execute(
-                    "INSERT INTO notes(position, tab_name, text, done, pinned, date, color, time_start, time_end) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (
-                        position,
-                        tab_name,
-                        note.get("text", ""),
-                        1 if note.get("done") else 0,
-                        1 if note.get("pinned") else 0,
-                        note.get("date", ""),
-                        note.get("color", ""),
-                        note.get("time_start") or "",
-                        note.get("time_end") or "",
-                    ),
-                )
 
+SCHEMA_MIGRATIONS = [
+    _migration_base,
+    _migration_indexes,
+    _migration_doc_codec,
+    _migration_integer_ids,
+    _migration_sparse_positions,
+    _migration_undo_journal,
+    _migration_note_tags,
+]
 
-def load_notes_from_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        cols = {row[1] for row in conn.execute("PRAGMA table_info(notes)").fetchall()}
-        has_tab = "tab_name" in cols
-        has_time = "time_start" in cols and "time_end" in cols
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
 
-        tab_rows = conn.execute(
-            "SELECT position, name FROM note_tabs ORDER BY position ASC"
-        ).fetchall()
 
-        if has_tab and has_time:
-            note_rows = conn.execute(
-                "SELECT position, tab_name, text, done, pinned, date, color, time_start, time_end FROM notes ORDER BY tab_name ASC, position ASC"
-            ).fetchall()
-        elif has_tab:
-            note_rows = conn.execute(
-                "SELECT position, tab_name, text, done, pinned, date, color, '' as time_start, '' as time_end FROM notes ORDER BY tab_name ASC, position ASC"
-            ).fetchall()
-        else:
-            note_rows = conn.execute(
-                "SELECT position, 'Заметки' as tab_name, text, done, pinned, date, color, '' as time_start, '' as time_end FROM notes ORDER BY position ASC"
-            ).fetchall()
+def init_db(db_path: str | None = None):
+    """Открывает БД и доводит её схему до SCHEMA_VERSION."""
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=10, isolation_level=None)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+            # Новая база: место от удалённых строк можно будет вернуть
+            # incremental_vacuum без полного VACUUM (задаётся до первой таблицы)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
 
-    return tab_rows, note_rows
+        # WAL: чтение (опрос изменений, экспорт) не блокирует запись других окон
+        conn.execute("PRAGMA journal_mode=WAL")
 
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Перечитываем под блокировкой: другое окно могло уже мигрировать
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target in range(version, SCHEMA_VERSION):
+                SCHEMA_MIGRATIONS[target](conn)
+                conn.execute(f"PRAGMA user_version = {target + 1}")
 
-def save_settings_to_db():
-    """Сохраняет настройки приложения в SQLite."""
-    with sqlite3.connect(DB_PATH) as conn:
-        for key, value in settings.items():
             conn.execute(
-                "INSERT INTO app_settings(key, value) VALUES(?, ?) "
-                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
-                (key, str(value)),
+                "DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?",
+                (CHANGE_LOG_KEEP,),
             )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
 
 
-def load_settings_from_db():
-    """Загружает настройки приложения из SQLite (если есть)."""
-    with sqlite3.connect(DB_PATH) as conn:
-        rows = conn.execute("SELECT key, value FROM app_settings").fetchall()
+# ---------------- ОБСЛУЖИВАНИЕ БД ----------------
+# Фоновая задача: если свободных страниц стало много — incremental_vacuum
+# (или разовый VACUUM для старых баз без auto_vacuum), затем ANALYZE;
+# иначе только PRAGMA optimize. Раз за сессию — quick_check.
 
-    for key, value in rows:
-        if key not in settings:
-            continue
-        if key in ("notes_font_size", "editor_font_size"):
-            try:
-                settings[key] = int(value)
-            except Exception:
-                pass
-        elif key in ("always_on_top", "show_save_status"):
-            settings[key] = str(value).lower() in ("1", "true", "yes", "on")
+MAINTENANCE_FIRST_MS = 30 * 1000
+MAINTENANCE_INTERVAL_MS = 10 * 60 * 1000
+FREELIST_MIN_PAGES = 256
+FREELIST_RATIO = 0.2
+
+
+def run_db_maintenance(db_path: str | None = None, integrity: bool = True, force: bool = False) -> dict:
+    """Обслуживание БД. Возвращает отчёт: что сделано и результат проверки."""
+    report = {"vacuumed_pages": 0, "full_vacuum": False, "analyzed": False, "integrity": None}
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=30, isolation_level=None)
+    try:
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        report.update(pages=page_count, freelist=freelist)
+
+        fragmented = freelist >= FREELIST_MIN_PAGES and freelist >= page_count * FREELIST_RATIO
+        if fragmented or force:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                # прагма освобождает по странице на шаг, а execute() делает
+                # только первый; executescript() прогоняет её до конца
+                conn.executescript("PRAGMA incremental_vacuum;")
+                left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                report["vacuumed_pages"] = freelist - left
+            else:
+                # Старая база: включаем auto_vacuum, он вступает в силу после VACUUM
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                report["full_vacuum"] = True
+            conn.execute("ANALYZE")
+            report["analyzed"] = True
         else:
-            settings[key] = value
+            conn.execute("PRAGMA optimize")
 
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
-# ---------------- СТАТУС СОХРАНЕНИЯ (В TOOLBAR) ----------------
+        if integrity:
+            problems = [row[0] for row in conn.execute("PRAGMA quick_check")]
+            report["integrity"] = "ok" if problems == ["ok"] else "; ".join(problems[:5])
+    finally:
+        conn.close()
+    return report
 
-_status_after_ids: list[str] = []
 
+# ---------------- РЕЗЕРВНЫЕ КОПИИ ----------------
+# Копия снимается онлайн-API SQLite (Connection.backup) порциями по
+# BACKUP_PAGES_PER_STEP страниц с паузой между ними: окно продолжает
+# работать с базой, а один шаг стоит одинаково при любом размере файла.
 
-def show_status(message: str = "✓ Сохранено", ms: int = 1600):
-    """Показывает краткий статус справа и затем скрывает."""
-    global _status_after_ids
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE = 0.005
+BACKUP_KEEP = 10
+BACKUP_PREFIX = "notebook-"
+BACKUP_SUFFIXES = (".sqlite3", ".sqlite3.gz")
 
-    if not settings.get("show_save_status", True):
-        return
 
-    # Отменяем предыдущие таймеры, чтобы сообщения не наслаивались
-    for after_id in _status_after_ids:
-        try:
-            app.after_cancel(after_id)
-        except Exception:
-            pass
-    _status_after_ids = []
+def backup_dir(db_path: str | None = None) -> str:
+    """Папка копий — рядом с базой."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path or DB_PATH)), "backups")
 
-    status_label.configure(text=message)
 
-    # Простая "красивая" анимация исчезновения через точки
-    steps = [message, f"{message}.", f"{message}..", f"{message}...", ""]
-    step_ms = max(200, ms // max(1, (len(steps) - 1)))
-    for i, text in enumerate(steps):
-        after_id = app.after(i * step_ms, lambda t=text: status_label.configure(text=t))
-        _status_after_ids.append(after_id)
+def _copy_db_by_pages(src, dst, progress=None):
+    def step(_status, remaining, total):
+        if progress is not None:
+            progress(remaining, total)
+        time.sleep(BACKUP_STEP_PAUSE)  # между порциями база и GIL свободны
 
-# ---------------- ФУНКЦИЯ ПЕРЕКЛЮЧЕНИЯ ----------------
-def show_frame(frame):
-    toolbar.grid_remove()  # Скрываем toolbar по умолчанию
-    for f in (frame_blocknot, frame_notes, frame_dev, frame_settings):
-        f.grid_forget()
-    frame.grid(sticky="nsew")
-    
-    # Показываем toolbar только для блокнота
-    if frame == frame_blocknot:
-        toolbar.grid(row=1, column=0, columnspan=4, sticky="ew", padx=20, pady=(0, 20))
+    src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=step)
 
-# ---------------- ЭКРАНЫ ----------------
-frame_blocknot = ctk.CTkFrame(content_frame)
-frame_notes = ctk.CTkFrame(content_frame)
-frame_dev = ctk.CTkFrame(content_frame)
-frame_settings = ctk.CTkFrame(content_frame)
 
-# ---------- Экран 1: Блокнот ----------
-# TabView для вкладок
-tabs = ctk.CTkTabview(frame_blocknot)
-tabs.pack(fill="both", expand=True, padx=5, pady=5)
+def backup_db(db_path: str | None = None, dest_dir: str | None = None, compress: bool = False,
+              label: str = "", progress=None) -> str:
+    """Снимает копию базы и возвращает путь к файлу копии.
 
-frame_blocknot.tabs = tabs
+    progress(remaining, total) вызывается после каждой порции страниц.
+    """
+    dest_dir = dest_dir or backup_dir(db_path)
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(dest_dir, f"{BACKUP_PREFIX}{stamp}{label}" + BACKUP_SUFFIXES[bool(compress)])
 
-# Сделать "шапку" вкладок выше/крупнее
-if hasattr(tabs, "_segmented_button"):
+    # Пишем во временный файл той же папки: недописанная копия не попадёт в список
+    fd, tmp = tempfile.mkstemp(prefix=".backup-", dir=dest_dir)
+    os.close(fd)
     try:
-        tabs._segmented_button.configure(height=42, font=("Segoe UI", 16))
-    except Exception:
-        pass
+        src = sqlite3.connect(db_path or DB_PATH, timeout=30)
+        dst = sqlite3.connect(tmp)
+        try:
+            _copy_db_by_pages(src, dst, progress)
+            dst.execute("PRAGMA journal_mode=DELETE")  # копия — один самодостаточный файл
+        finally:
+            dst.close()
+            src.close()
+
+        if compress:
+            packed = tmp + ".gz"
+            with open(tmp, "rb") as fin, gzip.open(packed, "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+            os.remove(tmp)
+            tmp = packed
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
+
+
+def list_backups(db_path: str | None = None) -> list:
+    """Копии, новые сначала: (путь, время изменения, размер)."""
+    folder = backup_dir(db_path)
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    items = []
+    for name in names:
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES):
+            path = os.path.join(folder, name)
+            stat = os.stat(path)
+            items.append((path, stat.st_mtime, stat.st_size))
+    items.sort(key=lambda item: item[1], reverse=True)
+    return items
+
+
+def rotate_backups(db_path: str | None = None, keep: int = BACKUP_KEEP) -> int:
+    """Удаляет старые копии сверх keep. Возвращает число удалённых."""
+    removed = 0
+    for path, _mtime, _size in list_backups(db_path)[keep:]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
 
-# ---------- Экран 2: Заметки ----------
-# ---------- Экран 3: В разработке ----------
-# ---------- Экран 4: Настройки ----------
 
-# Большая надпись по центру для экрана "В разработке"
-ctk.CTkLabel(
-    frame_dev,
-    text="🚧 В РАЗРАБОТКЕ 🚧",
-    font=("Segoe UI", 48),
-    text_color="#aaaaaa",
-).place(relx=0.5, rely=0.5, anchor="center")
+def restore_db(backup_path: str, db_path: str | None = None, progress=None):
+    """Восстанавливает базу из копии (.sqlite3 или .sqlite3.gz).
 
+    Запись идёт тем же API под блокировками SQLite, поэтому открытые
+    соединения других окон не ломаются, а увидят новую версию базы.
+    """
+    db_path = db_path or DB_PATH
+    tmp = None
+    try:
+        source = backup_path
+        if backup_path.endswith(".gz"):
+            fd, tmp = tempfile.mkstemp(prefix=".restore-", dir=os.path.dirname(os.path.abspath(db_path)))
+            os.close(fd)
+            with gzip.open(backup_path, "rb") as fin, open(tmp, "wb") as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+            source = tmp
+
+        src = sqlite3.connect(source)
+        try:
+            problems = [row[0] for row in src.execute("PRAGMA quick_check")]
+            if problems != ["ok"]:
+                raise ValueError(f"копия повреждена: {'; '.join(problems[:3])}")
+            dst = sqlite3.connect(db_path, timeout=30)
+            try:
+                _copy_db_by_pages(src, dst, progress)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+    init_db(db_path)  # копия могла быть со старой схемой
+
+
+# ---------------- СЖАТИЕ ДОКУМЕНТОВ ----------------
+# Тексты документов от COMPRESS_MIN_BYTES хранятся в tabs.content сжатыми
+# (BLOB), а tabs.codec говорит чем. Сжатие — при записи изменённого
+# документа, распаковка при запуске — в фоновом потоке.
+
+COMPRESS_MIN_BYTES = 4 * 1024
+
+DOC_CODECS = {
+    "zlib": (lambda raw: zlib.compress(raw, 6), zlib.decompress),
+    # preset=1: почти как zlib по скорости распаковки, но плотнее на логах
+    "lzma": (lambda raw: lzma.compress(raw, preset=1), lzma.decompress),
+}
 
-# =====================
-# ЭКРАН "ЗАМЕТКИ"
-# =====================
 
-ctk.CTkLabel(frame_notes, text="📌 Мои заметки", font=title_font).pack(pady=10)
+def encode_content(text: str, codec: str | None = None) -> tuple:
+    """Текст -> (значение для tabs.content, codec)."""
+    codec = codec or settings.get("doc_compression", "zlib")
+    if codec not in DOC_CODECS:
+        return text, ""
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text, ""
+    packed = DOC_CODECS[codec][0](raw)
+    if len(packed) > len(raw) * 0.9:
+        return text, ""  # почти не сжимается — храним как есть
+    return packed, codec
 
-search_entry = ctk.CTkEntry(frame_notes, placeholder_text="🔍 Поиск по заметкам")
-search_entry.pack(fill="x", padx=20, pady=(0, 10))
 
-input_frame = ctk.CTkFrame(frame_notes)
-input_frame.pack(fill="x", padx=20)
+def decode_content(value, codec: str) -> str:
+    if not codec:
+        return value or ""
+    return DOC_CODECS[codec][1](value).decode("utf-8")
 
-note_entry = ctk.CTkTextbox(input_frame, height=80, font=get_notes_font())
-note_entry.pack(fill="x", padx=10, pady=(10, 5))
 
-# Включим undo/redo для Ctrl+Z / Ctrl+Y (если доступно во внутреннем Text)
-try:
-    note_entry._textbox.configure(undo=True, autoseparators=True, maxundo=-1)
-except Exception:
-    pass
+# ---------------- ЗАПИСЬ В БД ----------------
 
-# Дата + время (начало/конец)
-datetime_frame = ctk.CTkFrame(input_frame)
-datetime_frame.pack(fill="x", padx=10, pady=(0, 10))
 
-date_entry = ctk.CTkEntry(datetime_frame, placeholder_text="📅 Дата (ДД.ММ.ГГГГ)")
-date_entry.pack(side="left", fill="x", expand=True, padx=(0, 8))
-date_entry.insert(0, datetime.now().strftime("%d.%m.%Y"))
+@contextmanager
+def write_transaction(db_path: str | None = None):
+    """Транзакция записи с BEGIN IMMEDIATE: блокировка файла берётся сразу,
+    поэтому два окна пишут по очереди, а не падают посередине."""
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=10, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def log_change(conn, entity: str, key, op: str, origin: str | None = None):
+    conn.execute(
+        "INSERT INTO change_log(origin, entity, key, op) VALUES(?, ?, ?, ?)",
+        (origin or INSTANCE_ID, entity, str(key), op),
+    )
 
-time_start_entry = ctk.CTkEntry(datetime_frame, placeholder_text="⏱ Начало (ЧЧ:ММ)")
-time_start_entry.pack(side="left", fill="x", expand=True, padx=(0, 8))
 
-time_end_entry = ctk.CTkEntry(datetime_frame, placeholder_text="⏱ Конец (ЧЧ:ММ)")
-time_end_entry.pack(side="left", fill="x", expand=True)
+class NameAllocator:
+    """Свободные имена вида «база», «база (2)», «база (3)»…
 
-colors = {
-    "Серый": "#2b2b2b",
-    "Синий": "#1f4fff",
-    "Оранжевый": "#ff8c1a",
-    "Жёлтый": "#f5c542",
-    "Фиолетовый": "#7a3db8",
+    Для каждой базы помнит следующий суффикс, поэтому подбор имени не
+    перебирает занятые варианты заново: в среднем одна проверка taken().
+    """
+
+    _SUFFIX_RE = re.compile(r"^(.*) \((\d+)\)$")
+
+    def __init__(self, taken):
+        self.taken = taken
+        self.next_suffix: dict[str, int] = {}
+
+    def allocate(self, name: str, taken=None) -> str:
+        taken = taken or self.taken
+        if not taken(name):
+            self.note(name)
+            return name
+        suffix = self.next_suffix.get(name, 2)
+        while taken(f"{name} ({suffix})"):
+            suffix += 1
+        self.next_suffix[name] = suffix + 1
+        return f"{name} ({suffix})"
+
+    def note(self, name: str):
+        """Учитывает уже занятое имя «база (n)», чтобы не выдавать меньшие суффиксы повторно."""
+        match = self._SUFFIX_RE.match(name)
+        if match:
+            base, suffix = match.group(1), int(match.group(2))
+            if suffix >= self.next_suffix.get(base, 2):
+                self.next_suffix[base] = suffix + 1
+
+
+# Порядок вкладок хранится разреженными ключами position с шагом ORDER_STEP:
+# перенесённая вкладка получает ключ между соседями, и в БД меняется одна
+# строка. Перенумерация всех — только когда промежуток между соседями исчерпан.
+ORDER_STEP = 1024
+
+
+def order_key_between(before: int | None, after: int | None) -> int | None:
+    """Ключ между соседями (None — соседа с этой стороны нет); None — места нет."""
+    if before is None and after is None:
+        return ORDER_STEP
+    if after is None:
+        return before + ORDER_STEP
+    if before is None:
+        return after - ORDER_STEP
+    if after - before > 1:
+        return (before + after) // 2
+    return None
+
+
+def next_order_key(order: list, keys: dict) -> int:
+    return keys[order[-1]] + ORDER_STEP if order else ORDER_STEP
+
+
+def insert_ordered(order: list, keys: dict, name: str, key: int) -> int:
+    """Вставляет name в order по ключу и возвращает индекс. Поиск с конца:
+    новые вкладки почти всегда последние."""
+    index = len(order)
+    while index > 0 and keys[order[index - 1]] > key:
+        index -= 1
+    order.insert(index, name)
+    keys[name] = key
+    return index
+
+
+def move_ordered(order: list, keys: dict, name: str, new_index: int) -> list:
+    """Переносит name на место new_index. Возвращает имена со сменившимся ключом."""
+    order.remove(name)
+    new_index = max(0, min(new_index, len(order)))
+    order.insert(new_index, name)
+    before = keys[order[new_index - 1]] if new_index > 0 else None
+    after = keys[order[new_index + 1]] if new_index + 1 < len(order) else None
+    key = order_key_between(before, after)
+    if key is not None:
+        keys[name] = key
+        return [name]
+    for index, other in enumerate(order):
+        keys[other] = (index + 1) * ORDER_STEP
+    return list(order)
+
+
+# Последнее известное состояние строк в БД (после загрузки/сохранения/опроса).
+# Сохранение пишет только отличия от него, а версии строк ловят чужие правки.
+_tabs_saved: dict[int, tuple] = {}  # id -> (version, position, filepath, len, hash)
+_notes_saved: dict[int, tuple] = {}  # id -> (version, position, состояние note_state())
+_note_tabs_saved: dict[str, int] = {}  # имя -> position
+
+# Вкладки заметок, уже записанные в БД: имя <-> id
+note_tab_ids: dict[str, int] = {}
+note_tab_names: dict[int, str] = {}
+
+
+def remember_note_tab(name: str, tab_id: int):
+    note_tab_ids[name] = tab_id
+    note_tab_names[tab_id] = name
+
+
+def forget_note_tab(name: str):
+    tab_id = note_tab_ids.pop(name, None)
+    if tab_id is not None:
+        note_tab_names.pop(tab_id, None)
+
+
+def _content_state(content: str, filepath) -> tuple:
+    return (filepath, len(content), hash(content))
+
+
+_TAG_SEPARATORS_RE = re.compile(r"[\s,;]+")
+
+
+def normalize_tags(value) -> str:
+    """Теги из ввода («#Работа, дом») или списка -> «дом работа»:
+    нижний регистр, без #, без повторов, по алфавиту."""
+    if not value:
+        return ""
+    words = value if isinstance(value, (list, tuple)) else _TAG_SEPARATORS_RE.split(str(value))
+    tags = {str(word).strip().lstrip("#").lower() for word in words}
+    tags.discard("")
+    return " ".join(sorted(tags))
+
+
+def tags_label(tags: str) -> str:
+    return " ".join(f"#{tag}" for tag in (tags or "").split())
+
+
+def note_state(tab_id, note: dict) -> tuple:
+    """Версионируемые поля заметки (позиция хранится отдельно)."""
+    return (
+        tab_id,
+        note.get("text", ""),
+        1 if note.get("done") else 0,
+        1 if note.get("pinned") else 0,
+        note.get("date", ""),
+        note.get("color", ""),
+        note.get("time_start") or "",
+        note.get("time_end") or "",
+        note.get("tags") or "",
+    )
+
+
+NOTE_STATE_FIELDS = ("tab_id", "text", "done", "pinned", "date", "color", "time_start", "time_end", "tags")
+
+NOTE_COLUMNS = "id, version, position, " + ", ".join(NOTE_STATE_FIELDS)
+
+
+def note_from_row(row) -> dict:
+    """Заметка в памяти из строки SELECT NOTE_COLUMNS."""
+    note_id, version, _position, _tab_id, text, done, pinned, date, color, time_start, time_end, tags = row
+    return {
+        "id": note_id,
+        "version": version,
+        "text": text,
+        "done": bool(done),
+        "pinned": bool(pinned),
+        "date": date,
+        "color": color,
+        "time_start": time_start or "",
+        "time_end": time_end or "",
+        "tags": tags or "",
+    }
+
+
+def row_state(row) -> tuple:
+    """note_state() для строки SELECT NOTE_COLUMNS."""
+    tab_id, text, done, pinned, date, color, time_start, time_end, tags = row[3:]
+    return (tab_id, text, int(done), int(pinned), date, color, time_start or "", time_end or "", tags or "")
+
+
+def remember_note_row(row):
+    """Запоминает строку notes (SELECT NOTE_COLUMNS) как сохранённую."""
+    _notes_saved[row[0]] = (row[1], row[2], row_state(row))
+
+
+def remember_tab_row(tab_id: int, version: int, position: int, content: str, filepath):
+    _tabs_saved[tab_id] = (version, position) + _content_state(content, filepath)
+
+
+def save_all_to_db():
+    """Сохраняет вкладки в SQLite: пишутся только изменённые документы.
+
+    Строки документов адресуются по id, имя — обычное поле. Текст и filepath
+    защищены версией строки: если документ успели изменить в другом окне,
+    его версия сохраняется отдельной вкладкой, а не теряется.
+    Порядок вкладок — без версий (побеждает последнее сохранение); ключи
+    разреженные, поэтому перенос вкладки меняет position одной строки.
+    """
+    if bulk_io_busy():
+        return
+
+    conflict_copies = []
+    renamed = []
+    with write_transaction() as conn:
+        live = set()
+        for tab_name in tab_order:
+            tab_data = current_tabs.get(tab_name)
+            if not tab_data:
+                continue
+            position = tab_order_keys[tab_name]
+            tab_id = tab_data.get("id")
+            live.add(tab_id)
+            if tab_data.get("loading"):
+                continue  # текст ещё распаковывается
+            saved = _tabs_saved.get(tab_id)
+            if tab_data.get("unloaded"):
+                # текст выгружен и совпадает с БД — меняться может только порядок
+                if saved is not None and saved[1] != position:
+                    conn.execute("UPDATE tabs SET position=? WHERE id=?", (position, tab_id))
+                    _tabs_saved[tab_id] = (saved[0], position) + saved[2:]
+                    log_change(conn, "tab", tab_id, "move")
+                continue
+            content = tab_data["textbox"].get("1.0", "end-1c")
+            filepath = tab_data.get("filepath")
+            state = _content_state(content, filepath)
+
+            if saved is not None and saved[2:] == state:
+                if saved[1] != position:
+                    conn.execute("UPDATE tabs SET position=? WHERE id=?", (position, tab_id))
+                    _tabs_saved[tab_id] = (saved[0], position) + state
+                    log_change(conn, "tab", tab_id, "move")
+                continue
+
+            stored, codec = encode_content(content)
+            version = saved[0] if saved is not None else None
+            if version is not None:
+                cur = conn.execute(
+                    "UPDATE tabs SET position=?, content=?, codec=?, filepath=?, version=version+1 "
+                    "WHERE id=? AND version=?",
+                    (position, stored, codec, filepath, tab_id, version),
+                )
+                if cur.rowcount:
+                    remember_tab_row(tab_id, version + 1, position, content, filepath)
+                    log_change(conn, "tab", tab_id, "update")
+                    continue
+
+            remote = None
+            if tab_id is not None:
+                remote = conn.execute(
+                    "SELECT version, content, codec, filepath FROM tabs WHERE id=?", (tab_id,)
+                ).fetchone()
+            if remote is None:
+                # Новый документ (или удалённый в другом окне, но изменённый здесь)
+                name = tab_name
+                if conn.execute("SELECT 1 FROM tabs WHERE name=?", (name,)).fetchone():
+                    # имя успел занять документ из другого окна
+                    name = _free_tab_name(conn, tab_name)
+                    renamed.append((tab_name, name))
+                cur = conn.execute(
+                    "INSERT INTO tabs(id, position, name, content, codec, filepath, version) "
+                    "VALUES(?, ?, ?, ?, ?, ?, 1)",
+                    (tab_id, position, name, stored, codec, filepath),
+                )
+                tab_data["id"] = tab_id = cur.lastrowid
+                tab_names_by_id[tab_id] = tab_name
+                live.add(tab_id)
+                remember_tab_row(tab_id, 1, position, content, filepath)
+                log_change(conn, "tab", tab_id, "insert")
+                continue
+
+            # Документ изменён и здесь, и в другом окне: их версию — в копию
+            remote_version, remote_stored, remote_codec, remote_filepath = remote
+            remote_content = decode_content(remote_stored, remote_codec)
+            if remote_content != content:
+                copy_name = _free_tab_name(conn, f"{tab_name} (из другого окна)")
+                copy_position = next_order_key(tab_order, tab_order_keys) + len(conflict_copies) * ORDER_STEP
+                cur = conn.execute(
+                    "INSERT INTO tabs(position, name, content, codec, filepath, version) VALUES(?, ?, ?, ?, ?, 1)",
+                    (copy_position, copy_name, remote_stored, remote_codec, remote_filepath),
+                )
+                log_change(conn, "tab", cur.lastrowid, "insert")
+                conflict_copies.append((cur.lastrowid, copy_name, remote_content, remote_filepath, copy_position))
+            conn.execute(
+                "UPDATE tabs SET position=?, content=?, codec=?, filepath=?, version=? WHERE id=?",
+                (position, stored, codec, filepath, remote_version + 1, tab_id),
+            )
+            remember_tab_row(tab_id, remote_version + 1, position, content, filepath)
+            log_change(conn, "tab", tab_id, "update")
+
+        flush_undo_journals(conn)
+
+        for tab_id in [i for i in _tabs_saved if i not in live]:
+            version = _tabs_saved.pop(tab_id)[0]
+            tab_names_by_id.pop(tab_id, None)
+            cur = conn.execute("DELETE FROM tabs WHERE id=? AND version=?", (tab_id, version))
+            if cur.rowcount:
+                conn.execute("DELETE FROM undo_journal WHERE tab_id=?", (tab_id,))
+                conn.execute("DELETE FROM undo_heads WHERE tab_id=?", (tab_id,))
+                log_change(conn, "tab", tab_id, "delete")
+
+    trim_undo_memory()
+    for old_name, new_name in renamed:
+        rename_tab_ui(old_name, new_name)
+    for copy_id, copy_name, content, filepath, copy_position in conflict_copies:
+        add_tab_row(copy_id, copy_name, content, filepath, 1, copy_position)
+    if conflict_copies:
+        show_status("⚠ Документ изменён в другом окне — сохранена копия", 4000)
+
+
+def save_tab_positions(names):
+    """Пишет в БД только position перечисленных документов.
+
+    Документы, ещё не записанные в БД, пропускаются: их позицию запишет
+    обычное сохранение вместе с текстом.
+    """
+    if bulk_io_busy():
+        return
+    with write_transaction() as conn:
+        for tab_name in names:
+            tab_id = (current_tabs.get(tab_name) or {}).get("id")
+            saved = _tabs_saved.get(tab_id)
+            position = tab_order_keys[tab_name]
+            if saved is None or saved[1] == position:
+                continue
+            conn.execute("UPDATE tabs SET position=? WHERE id=?", (position, tab_id))
+            _tabs_saved[tab_id] = (saved[0], position) + saved[2:]
+            log_change(conn, "tab", tab_id, "move")
+
+
+def _free_tab_name(conn, name: str) -> str:
+    def taken(n):
+        return n in current_tabs or conn.execute("SELECT 1 FROM tabs WHERE name=?", (n,)).fetchone()
+
+    return document_allocator.allocate(name, taken)
+
+
+def load_from_db(db_path: str | None = None, raw: bool = False):
+    """Документы по порядку: (position, name, content, filepath, version, id).
+
+    raw=True — без распаковки: (position, name, stored, filepath, version, codec, id).
+    """
+    with sqlite3.connect(db_path or DB_PATH) as conn:
+        rows = conn.execute(
+            "SELECT position, name, content, filepath, version, codec, id FROM tabs ORDER BY position ASC"
+        ).fetchall()
+    if raw:
+        return rows
+    return [
+        (position, name, decode_content(stored, codec), filepath, version, tab_id)
+        for position, name, stored, filepath, version, codec, tab_id in rows
+    ]
+
+
+def _note_tabs_state() -> dict:
+    return {name: notes_tab_keys[name] for name in notes_tabs_order}
+
+
+def _save_note_tabs(conn):
+    """Вкладки заметок по id: пишутся только новые и перенесённые,
+    удалённые уходят после своих заметок."""
+    for name in notes_tabs_order:
+        position = notes_tab_keys[name]
+        tab_id = note_tab_ids.get(name)
+        if tab_id is not None:
+            if _note_tabs_saved.get(name) == position:
+                continue
+            if conn.execute("UPDATE note_tabs SET position=? WHERE id=?", (position, tab_id)).rowcount:
+                continue
+            forget_note_tab(name)  # удалена в другом окне — создаём заново
+        row = conn.execute("SELECT id FROM note_tabs WHERE name=?", (name,)).fetchone()
+        if row is not None:
+            # вкладку с тем же именем уже создало другое окно — это одна вкладка
+            conn.execute("UPDATE note_tabs SET position=? WHERE id=?", (position, row[0]))
+            remember_note_tab(name, row[0])
+        else:
+            cur = conn.execute("INSERT INTO note_tabs(position, name) VALUES(?, ?)", (position, name))
+            remember_note_tab(name, cur.lastrowid)
+
+
+def save_notes_to_db():
+    """Сохраняет вкладки заметок и заметки в SQLite: пишутся только отличия.
+
+    Каждая заметка — отдельная строка с версией. Если её успели изменить
+    в другом окне, поля сливаются: наши изменённые поля поверх чужих.
+    """
+    if bulk_io_busy():
+        return
+
+    merged = False
+    with write_transaction() as conn:
+        tabs_changed = _note_tabs_state() != _note_tabs_saved
+        if tabs_changed:
+            _save_note_tabs(conn)
+
+        live_ids = set()
+        for tab_name in notes_tabs_order:
+            tab_id = note_tab_ids[tab_name]
+            for position, note in enumerate(notes_by_tab.get(tab_name, [])):
+                state = note_state(tab_id, note)
+                note_id = note.get("id")
+                saved = _notes_saved.get(note_id) if note_id is not None else None
+
+                if saved is not None and saved[1:] == (position, state):
+                    live_ids.add(note_id)
+                    continue
+
+                # Перенос тоже новая версия: иначе другие окна его не увидят
+                if saved is not None:
+                    cur = conn.execute(
+                        "UPDATE notes SET position=?, tab_id=?, text=?, done=?, pinned=?, date=?, color=?, "
+                        "time_start=?, time_end=?, tags=?, version=version+1 WHERE id=? AND version=?",
+                        (position, *state, note_id, saved[0]),
+                    )
+                    if cur.rowcount:
+                        note["version"] = saved[0] + 1
+                        _notes_saved[note_id] = (note["version"], position, state)
+                        log_change(conn, "note", note_id, "update")
+                        live_ids.add(note_id)
+                        continue
+
+                remote = None
+                if note_id is not None:
+                    remote = conn.execute(
+                        f"SELECT {NOTE_COLUMNS} FROM notes WHERE id=?", (note_id,)
+                    ).fetchone()
+
+                if remote is None:
+                    # Новая заметка (или удалённая в другом окне, но изменённая здесь)
+                    cur = conn.execute(
+                        "INSERT INTO notes(id, position, tab_id, text, done, pinned, date, color, "
+                        "time_start, time_end, tags, version) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)",
+                        (note_id, position, *state),
+                    )
+                    note["id"] = note_id = cur.lastrowid
+                    note["version"] = 1
+                    _notes_saved[note_id] = (1, position, state)
+                    log_change(conn, "note", note_id, "insert")
+                    live_ids.add(note_id)
+                    continue
+
+                # Конфликт: трёхстороннее слияние полей (база — последнее известное)
+                base = saved[2] if saved is not None else state
+                remote_state = row_state(remote)
+                merged_state = tuple(
+                    local if local != was else theirs
+                    for local, was, theirs in zip(state, base, remote_state)
+                )
+                # Вкладка остаётся нашей: заметка уже лежит в её списке
+                merged_state = (tab_id,) + merged_state[1:]
+                version = remote[1] + 1
+                conn.execute(
+                    "UPDATE notes SET position=?, tab_id=?, text=?, done=?, pinned=?, date=?, color=?, "
+                    "time_start=?, time_end=?, tags=?, version=? WHERE id=?",
+                    (position, *merged_state, version, note_id),
+                )
+                for field, value in zip(NOTE_STATE_FIELDS[1:], merged_state[1:]):
+                    note[field] = bool(value) if field in ("done", "pinned") else value
+                note["version"] = version
+                _notes_saved[note_id] = (version, position, merged_state)
+                log_change(conn, "note", note_id, "update")
+                live_ids.add(note_id)
+                merged = True
+
+        for note_id in [i for i in _notes_saved if i not in live_ids]:
+            version = _notes_saved.pop(note_id)[0]
+            # Если заметку изменили в другом окне, удаление не проходит —
+            # её вернёт опрос изменений
+            cur = conn.execute("DELETE FROM notes WHERE id=? AND version=?", (note_id, version))
+            if cur.rowcount:
+                log_change(conn, "note", note_id, "delete")
+
+        if tabs_changed:
+            for name in [n for n in note_tab_ids if n not in notes_by_tab]:
+                # вкладку, в которую другое окно успело добавить заметки, не удаляем
+                tab_id = note_tab_ids[name]
+                conn.execute(
+                    "DELETE FROM note_tabs WHERE id=? AND NOT EXISTS (SELECT 1 FROM notes WHERE tab_id=?)",
+                    (tab_id, tab_id),
+                )
+                forget_note_tab(name)
+            _note_tabs_saved.clear()
+            _note_tabs_saved.update(_note_tabs_state())
+            log_change(conn, "note_tabs", "*", "update")
+
+    if merged:
+        emit("notes_reloaded", saved=True)
+        show_status("⚠ Объединено с изменениями из другого окна", 3000)
+
+
+def load_notes_from_db(db_path: str | None = None):
+    """(вкладки заметок (position, name, id), заметки SELECT NOTE_COLUMNS)."""
+    with sqlite3.connect(db_path or DB_PATH) as conn:
+        tab_rows = conn.execute(
+            "SELECT position, name, id FROM note_tabs ORDER BY position ASC"
+        ).fetchall()
+
+        note_rows = conn.execute(
+            f"SELECT {NOTE_COLUMNS} FROM notes ORDER BY tab_id ASC, position ASC, id ASC"
+        ).fetchall()
+
+    return tab_rows, note_rows
+
+
+def save_settings_to_db():
+    """Сохраняет настройки приложения в SQLite."""
+    with sqlite3.connect(DB_PATH) as conn:
+        for key, value in settings.items():
+            conn.execute(
+                "INSERT INTO app_settings(key, value) VALUES(?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                (key, str(value)),
+            )
+
+
+def load_settings_from_db():
+    """Загружает настройки приложения из SQLite (если есть)."""
+    with sqlite3.connect(DB_PATH) as conn:
+        rows = conn.execute("SELECT key, value FROM app_settings").fetchall()
+
+    for key, value in rows:
+        if key not in settings:
+            continue
+        if key in ("notes_font_size", "editor_font_size", "backup_interval_min", "memory_budget_mb",
+                   "undo_memory_mb"):
+            try:
+                settings[key] = int(value)
+            except Exception:
+                pass
+        elif key in ("always_on_top", "show_save_status", "backup_compress"):
+            settings[key] = str(value).lower() in ("1", "true", "yes", "on")
+        else:
+            settings[key] = value
+
+
+# ---------------- ЭКСПОРТ / ИМПОРТ ----------------
+# Экспорт читает курсоры SQLite построчно, импорт пишет пачками в отдельных
+# транзакциях — память не зависит от количества заметок.
+
+IMPORT_BATCH_SIZE = 5000
+PROGRESS_EVERY = 5000
+
+EXPORT_FORMATS = {".jsonl": "jsonl", ".md": "markdown", ".csv": "csv"}
+
+NOTES_CSV_FIELDS = ["tab_name", "text", "done", "pinned", "date", "color", "time_start", "time_end", "tags"]
+
+NOTE_META_FIELDS = ("date", "color", "time_start", "time_end", "pinned", "tags")
+
+
+def detect_export_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {ext or path} (нужен .jsonl, .md или .csv)")
+    return EXPORT_FORMATS[ext]
+
+
+def _iter_note_tabs(conn):
+    return conn.execute("SELECT position, name FROM note_tabs ORDER BY position ASC")
+
+
+def _iter_notes(conn):
+    """Заметки в порядке вкладок, затем позиций (курсор, без fetchall)."""
+    return conn.execute(
+        "SELECT COALESCE(t.name, 'Заметки'), n.text, n.done, n.pinned, n.date, n.color, n.time_start, n.time_end, "
+        "n.tags FROM notes n LEFT JOIN note_tabs t ON t.id = n.tab_id "
+        "ORDER BY t.position IS NULL, t.position, n.tab_id, n.position"
+    )
+
+
+def _iter_documents(conn):
+    for name, stored, codec, filepath in conn.execute(
+        "SELECT name, content, codec, filepath FROM tabs ORDER BY position ASC"
+    ):
+        yield name, decode_content(stored, codec), filepath
+
+
+def _note_record(row) -> dict:
+    tab_name, text, done, pinned, date, color, time_start, time_end, tags = row
+    return {
+        "tab": tab_name,
+        "text": text,
+        "done": bool(done),
+        "pinned": bool(pinned),
+        "date": date or "",
+        "color": color or "",
+        "time_start": time_start or "",
+        "time_end": time_end or "",
+        "tags": tags or "",
+    }
+
+
+class _Progress:
+    """Зовёт callback(count) раз в PROGRESS_EVERY записей и в конце;
+    тогда же проверяет cancel (threading.Event) и прерывает работу."""
+
+    def __init__(self, callback, cancel=None):
+        self.callback = callback
+        self.cancel = cancel
+        self.count = 0
+
+    def step(self):
+        self.count += 1
+        if self.count % PROGRESS_EVERY == 0:
+            if self.callback:
+                self.callback(self.count)
+            if self.cancel is not None and self.cancel.is_set():
+                raise InterruptedError("Операция отменена")
+
+    def finish(self) -> int:
+        if self.callback and (self.count == 0 or self.count % PROGRESS_EVERY):
+            self.callback(self.count)
+        return self.count
+
+
+def export_jsonl(conn, out, p: _Progress) -> int:
+    for position, name in _iter_note_tabs(conn):
+        out.write(json.dumps({"type": "note_tab", "name": name}, ensure_ascii=False) + "\n")
+        p.step()
+    for row in _iter_notes(conn):
+        record = {"type": "note", **_note_record(row)}
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        p.step()
+    for name, content, filepath in _iter_documents(conn):
+        record = {"type": "document", "name": name, "content": content, "filepath": filepath}
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        p.step()
+    return p.finish()
+
+
+def _md_fence(content: str) -> str:
+    """Забор из тильд длиннее любой серии тильд внутри текста."""
+    longest = 0
+    run = 0
+    for ch in content:
+        run = run + 1 if ch == "~" else 0
+        longest = max(longest, run)
+    return "~" * max(4, longest + 1)
+
+
+def _md_note_text(text: str) -> str:
+    """Текст заметки в одну строку Markdown: переносы — <br>, а & и < —
+    HTML-сущностями, чтобы «<br>» из самого текста не стал переносом."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\n", "<br>")
+
+
+def _md_note_text_back(body: str) -> str:
+    return body.replace("<br>", "\n").replace("&lt;", "<").replace("&amp;", "&")
+
+
+def export_markdown(conn, out, p: _Progress) -> int:
+    current_tab = None
+    exported_tabs = set()
+
+    for row in _iter_notes(conn):
+        note = _note_record(row)
+        if note["tab"] != current_tab:
+            current_tab = note["tab"]
+            exported_tabs.add(current_tab)
+            out.write(f"\n# 📌 {current_tab}\n\n")
+        box = "x" if note["done"] else " "
+        text = _md_note_text(note["text"])
+        meta = json.dumps({k: note[k] for k in NOTE_META_FIELDS}, ensure_ascii=False)
+        out.write(f"- [{box}] {text} <!-- {meta} -->\n")
+        p.step()
+
+    # Пустые вкладки заметок тоже сохраняем
+    for _position, name in _iter_note_tabs(conn):
+        if name not in exported_tabs:
+            out.write(f"\n# 📌 {name}\n\n")
+
+    for name, content, filepath in _iter_documents(conn):
+        fence = _md_fence(content)
+        out.write(f"\n# 📄 {name}\n\n")
+        out.write(f"<!-- {json.dumps({'filepath': filepath}, ensure_ascii=False)} -->\n")
+        out.write(f"{fence}\n{content}\n{fence}\n")
+        p.step()
+    return p.finish()
+
+
+def export_notes_csv(conn, out, p: _Progress) -> int:
+    writer = csv.writer(out)
+    writer.writerow(NOTES_CSV_FIELDS)
+    for row in _iter_notes(conn):
+        note = _note_record(row)
+        writer.writerow(
+            [note["tab"], note["text"], int(note["done"]), int(note["pinned"]),
+             note["date"], note["color"], note["time_start"], note["time_end"], note["tags"]]
+        )
+        p.step()
+    return p.finish()
+
+
+def export_data(path: str, db_path: str | None = None, progress=None, cancel=None) -> int:
+    """Экспортирует БД в файл (формат по расширению). Возвращает число записей."""
+    fmt = detect_export_format(path)
+    exporter = {"jsonl": export_jsonl, "markdown": export_markdown, "csv": export_notes_csv}[fmt]
+    newline = "" if fmt == "csv" else None
+    with sqlite3.connect(db_path or DB_PATH) as conn:
+        with open(path, "w", encoding="utf-8", newline=newline) as out:
+            return exporter(conn, out, _Progress(progress, cancel))
+
+
+class _Importer:
+    """Пишет записи в БД пачками по IMPORT_BATCH_SIZE (одна транзакция на пачку).
+
+    Каждая пачка попадает в change_log одной записью-диапазоном id, чтобы
+    открытые окна подхватили импорт, не перечитывая всю базу.
+    """
+
+    def __init__(self, conn, progress: _Progress):
+        self.conn = conn
+        self.progress = progress
+        self.batch = 0
+        self.first_id = None  # диапазон id заметок текущей пачки
+        self.last_id = None
+        self.tabs_added = False
+        self.committed = 0  # записей в уже закоммиченных пачках
+
+        self.note_tabs = dict(conn.execute("SELECT name, id FROM note_tabs"))  # имя -> id
+        self.next_tab_pos = conn.execute(
+            "SELECT COALESCE(MAX(position), 0) + ? FROM note_tabs", (ORDER_STEP,)
+        ).fetchone()[0]
+        self.next_note_pos = dict(
+            conn.execute("SELECT tab_id, MAX(position) + 1 FROM notes GROUP BY tab_id").fetchall()
+        )
+        self.doc_names = {name for (name,) in conn.execute("SELECT name FROM tabs")}
+        self.doc_allocator = NameAllocator(self.doc_names.__contains__)
+        for name in self.doc_names:
+            self.doc_allocator.note(name)
+        self.next_doc_pos = conn.execute(
+            "SELECT COALESCE(MAX(position), 0) + ? FROM tabs", (ORDER_STEP,)
+        ).fetchone()[0]
+
+    def _commit(self):
+        if self.first_id is not None:
+            log_change(self.conn, "note", f"{self.first_id}:{self.last_id}", "insert")
+            self.first_id = None
+        if self.tabs_added:
+            log_change(self.conn, "note_tabs", "*", "update")
+            self.tabs_added = False
+        self.conn.commit()
+        self.committed += self.batch
+        self.batch = 0
+
+    def _written(self):
+        self.batch += 1
+        if self.batch >= IMPORT_BATCH_SIZE:
+            self._commit()
+        self.progress.step()
+
+    def note_tab(self, name: str):
+        name = (name or "").strip() or "Заметки"
+        if name in self.note_tabs:
+            return name
+        cur = self.conn.execute("INSERT INTO note_tabs(position, name) VALUES(?, ?)", (self.next_tab_pos, name))
+        self.next_tab_pos += ORDER_STEP
+        self.note_tabs[name] = cur.lastrowid
+        self.tabs_added = True
+        return name
+
+    def note(self, record: dict):
+        tab_id = self.note_tabs[self.note_tab(record.get("tab") or record.get("tab_name"))]
+        position = self.next_note_pos.get(tab_id, 0)
+        self.next_note_pos[tab_id] = position + 1
+        cur = self.conn.execute(
+            "INSERT INTO notes(position, tab_id, text, done, pinned, date, color, time_start, time_end, tags) "
+            "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                position,
+                tab_id,
+                record.get("text", ""),
+                1 if _as_bool(record.get("done")) else 0,
+                1 if _as_bool(record.get("pinned")) else 0,
+                record.get("date") or "",
+                record.get("color") or "",
+                record.get("time_start") or "",
+                record.get("time_end") or "",
+                normalize_tags(record.get("tags")),
+            ),
+        )
+        if self.first_id is None:
+            self.first_id = cur.lastrowid
+        self.last_id = cur.lastrowid
+        self._written()
+
+    def document(self, name: str, content: str, filepath=None):
+        name = self.doc_allocator.allocate((name or "").strip() or "Документ")
+        stored, codec = encode_content(content or "")
+        cur = self.conn.execute(
+            "INSERT INTO tabs(position, name, content, codec, filepath) VALUES(?, ?, ?, ?, ?)",
+            (self.next_doc_pos, name, stored, codec, filepath),
+        )
+        self.next_doc_pos += ORDER_STEP
+        self.doc_names.add(name)
+        log_change(self.conn, "tab", cur.lastrowid, "insert")
+        self._written()
+
+    def finish(self) -> int:
+        self._commit()
+        return self.progress.finish()
+
+    def rollback(self) -> int:
+        """Откатывает открытую пачку. Возвращает число уже записанных записей."""
+        self.conn.rollback()
+        self.batch = 0
+        self.first_id = None
+        self.tabs_added = False
+        return self.committed
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on", "x")
+    return bool(value)
+
+
+def import_jsonl(src, importer: _Importer):
+    for line in src:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        kind = record.get("type", "note")
+        if kind == "note_tab":
+            importer.note_tab(record.get("name"))
+        elif kind == "note":
+            importer.note(record)
+        elif kind == "document":
+            importer.document(record.get("name"), record.get("content", ""), record.get("filepath"))
+
+
+def import_notes_csv(src, importer: _Importer):
+    for record in csv.DictReader(src):
+        importer.note(record)
+
+
+def import_markdown(src, importer: _Importer):
+    notes_tab = None
+    doc = None  # {"name", "filepath", "fence", "lines"}
+
+    for raw in src:
+        line = raw.rstrip("\n")
+
+        if doc is not None:
+            if doc["fence"] is None:
+                stripped = line.strip()
+                if stripped.startswith("<!--") and stripped.endswith("-->"):
+                    try:
+                        doc["filepath"] = json.loads(stripped[4:-3].strip()).get("filepath")
+                    except Exception:
+                        pass
+                elif stripped.startswith("~~~"):
+                    doc["fence"] = stripped
+                continue
+            if line == doc["fence"]:
+                importer.document(doc["name"], "\n".join(doc["lines"]), doc["filepath"])
+                doc = None
+            else:
+                doc["lines"].append(line)
+            continue
+
+        if line.startswith("# 📌 "):
+            notes_tab = importer.note_tab(line[len("# 📌 "):])
+        elif line.startswith("# 📄 "):
+            notes_tab = None
+            doc = {"name": line[len("# 📄 "):], "filepath": None, "fence": None, "lines": []}
+        elif line.startswith(("- [ ] ", "- [x] ", "- [X] ")):
+            record = {"tab": notes_tab, "done": line[3] in "xX"}
+            body = line[6:]
+            meta_at = body.rfind(" <!-- ")
+            if meta_at != -1 and body.endswith(" -->"):
+                try:
+                    record.update(json.loads(body[meta_at + 6:-4]))
+                    body = body[:meta_at]
+                except Exception:
+                    pass
+            record["text"] = _md_note_text_back(body)
+            importer.note(record)
+
+
+def import_data(path: str, db_path: str | None = None, progress=None, cancel=None) -> int:
+    """Импортирует файл в БД (добавляя к существующим данным). Возвращает число записей."""
+    fmt = detect_export_format(path)
+    reader = {"jsonl": import_jsonl, "markdown": import_markdown, "csv": import_notes_csv}[fmt]
+    newline = "" if fmt == "csv" else None
+    init_db(db_path)
+    with sqlite3.connect(db_path or DB_PATH) as conn:
+        importer = _Importer(conn, _Progress(progress, cancel))
+        with open(path, "r", encoding="utf-8", newline=newline) as src:
+            try:
+                reader(src, importer)
+            except InterruptedError:
+                importer.finish()  # при отмене прочитанное остаётся в БД
+                raise
+            except Exception as e:
+                # Ошибка в файле: недописанную пачку откатываем, целые уже в БД
+                committed = importer.rollback()
+                raise ValueError(f"{e} (до ошибки импортировано записей: {committed})") from e
+            count = importer.finish()
+    return count
+
+
+# ---------------- КОМАНДНАЯ СТРОКА ----------------
+# python versio_programm_two.py --cli <команда> ... — работа с БД без окна Tk.
+
+
+def _cli_progress(count: int):
+    print(f"  ... {count}", file=sys.stderr)
+
+
+def _note_line(tab_name, position, text, done, pinned, date, time_start, time_end, tags="") -> str:
+    flags = ("x" if done else " ") + ("📌" if pinned else "")
+    times = "-".join(t for t in (time_start, time_end) if t)
+    meta = " ".join(m for m in (date, times, tags_label(tags)) if m)
+    return f"[{flags}] {tab_name}#{position}: {text}" + (f"  ({meta})" if meta else "")
+
+
+def _cli_iter_notes(conn, tab: str | None):
+    sql = (
+        "SELECT t.name, n.position, n.text, n.done, n.pinned, n.date, n.time_start, n.time_end, n.tags "
+        "FROM notes n JOIN note_tabs t ON t.id = n.tab_id {where} ORDER BY t.position, n.position"
+    )
+    if tab:
+        return conn.execute(sql.format(where="WHERE t.name = ?"), (tab,))
+    return conn.execute(sql.format(where=""))
+
+
+def cli_add_note(conn, args) -> int:
+    color = colors.get(args.color, args.color) if args.color else colors["Серый"]
+    importer = _Importer(conn, _Progress(None))
+    importer.note(
+        {
+            "tab": args.tab,
+            "text": args.text,
+            "pinned": args.pinned,
+            "date": args.date or datetime.now().strftime("%d.%m.%Y"),
+            "color": color,
+            "time_start": args.start,
+            "time_end": args.end,
+            "tags": args.tags,
+        }
+    )
+    importer.finish()
+    print("✓ Заметка сохранена")
+    return 0
+
+
+def cli_notes(conn, args) -> int:
+    tag = normalize_tags(args.tag)
+    rows = _cli_iter_notes(conn, args.tab)
+    if tag:
+        rows = (row for row in rows if tag in row[8].split())
+    for count, row in enumerate(rows):
+        if args.limit and count >= args.limit:
+            break
+        print(_note_line(*row))
+    return 0
+
+
+def cli_search(conn, args) -> int:
+    # Как и поиск в окне: подстрока без учёта регистра (lower() и для кириллицы)
+    needle = args.query.lower()
+    found = 0
+    for row in _cli_iter_notes(conn, args.tab):
+        if needle in (row[2] or "").lower():
+            print(_note_line(*row))
+            found += 1
+            if args.limit and found >= args.limit:
+                break
+    return 0 if found else 1
+
+
+def cli_tabs(conn, args) -> int:
+    print("Документы:")
+    for name, size, codec, filepath in conn.execute(
+        "SELECT name, LENGTH(CAST(content AS BLOB)), codec, filepath FROM tabs ORDER BY position"
+    ):
+        stored = f"{size} байт" + (f", {codec}" if codec else "")
+        print(f"  {name}  ({stored})" + (f"  → {filepath}" if filepath else ""))
+
+    print("Вкладки заметок:")
+    for name, count in conn.execute(
+        "SELECT t.name, COUNT(n.rowid) FROM note_tabs t "
+        "LEFT JOIN notes n ON n.tab_id = t.id GROUP BY t.id ORDER BY t.position"
+    ):
+        print(f"  {name}  ({count} заметок)")
+    return 0
+
+
+def cli_add_tab(conn, args) -> int:
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            content = f.read()
+    else:
+        content = args.text or ""
+    importer = _Importer(conn, _Progress(None))
+    importer.document(args.name, content, os.path.abspath(args.file) if args.file else None)
+    importer.finish()
+    print("✓ Документ сохранён")
+    return 0
+
+
+def cli_show(conn, args) -> int:
+    row = conn.execute("SELECT content, codec FROM tabs WHERE name = ?", (args.name,)).fetchone()
+    if row is None:
+        print(f"Ошибка: нет документа {args.name!r}", file=sys.stderr)
+        return 1
+    content = decode_content(*row)
+    # текст из окна хранится без последнего перевода строки — дописываем его,
+    # чтобы вывод был нормальным текстовым файлом для конвейеров и diff
+    if content and not content.endswith("\n"):
+        content += "\n"
+    sys.stdout.write(content)
+    return 0
+
+
+def compact_db(db_path: str | None = None) -> tuple[int, int]:
+    """VACUUM + ANALYZE. Возвращает размер файла до и после."""
+    path = db_path or DB_PATH
+    before = os.path.getsize(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return before, os.path.getsize(path)
+
+
+def cli_compact(_conn, args) -> int:
+    before, after = compact_db(args.db)
+    print(f"✓ Сжато: {before / 1024:.1f} КБ → {after / 1024:.1f} КБ")
+    return 0
+
+
+def run_storage_benchmark(notes: int, tabs: int, doc_kb: int, out=sys.stdout) -> dict:
+    """Замеры хранилища на синтетической БД во временной папке."""
+    results: dict = {}
+
+    def timed(label: str, fn):
+        started = time.perf_counter()
+        value = fn()
+        results[label] = time.perf_counter() - started
+        print(f"  {label:<28} {results[label] * 1000:10.1f} мс", file=out)
+        return value
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.sqlite3")
+
+        print(f"Заметок: {notes}, вкладок: {tabs}, документ: {doc_kb} КБ", file=out)
+        timed("вставка", lambda: build_synthetic_db(db, notes, tabs, doc_kb))
+        timed("загрузка заметок", lambda: load_notes_from_db(db))
+        timed("загрузка документов", lambda: load_from_db(db))
+
+        def search():
+            with sqlite3.connect(db) as conn:
+                return sum(1 for row in _cli_iter_notes(conn, None) if "9" in row[2].lower())
+
+        timed("поиск", search)
+        timed("экспорт jsonl", lambda: export_data(os.path.join(tmp, "bench.jsonl"), db))
+        timed("compact", lambda: compact_db(db))
+        results["size_bytes"] = os.path.getsize(db)
+        print(f"  {'размер файла':<28} {results['size_bytes'] / 1024:10.1f} КБ", file=out)
+    return results
+
+
+def run_compression_benchmark(body: str, rounds: int = 3, out=sys.stdout) -> dict:
+    """Размер и время записи/чтения одного документа через БД для каждого кодека."""
+    results: dict = {}
+    print(f"Документ: {len(body.encode('utf-8')) / 1024:.0f} КБ, повторов: {rounds}", file=out)
+    print(f"  {'кодек':<6} {'в БД, КБ':>10} {'доля':>6} {'запись, мс':>11} {'чтение, мс':>11}", file=out)
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in ("off", "zlib", "lzma"):
+            db = os.path.join(tmp, f"{codec}.sqlite3")
+            init_db(db)
+            write_s = read_s = 0.0
+            for _ in range(rounds):
+                started = time.perf_counter()
+                with sqlite3.connect(db) as conn:
+                    stored, used = encode_content(body, codec)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO tabs(position, name, content, codec) VALUES(0, 'bench', ?, ?)",
+                        (stored, used),
+                    )
+                write_s += time.perf_counter() - started
+
+                started = time.perf_counter()
+                (_position, _name, content, _filepath, _version, _id), = load_from_db(db)
+                read_s += time.perf_counter() - started
+                assert content == body
+
+            with sqlite3.connect(db) as conn:
+                size = conn.execute("SELECT LENGTH(CAST(content AS BLOB)) FROM tabs").fetchone()[0]
+            results[codec] = {
+                "bytes": size,
+                "write_s": write_s / rounds,
+                "read_s": read_s / rounds,
+            }
+            ratio = size / max(1, len(body.encode("utf-8")))
+            print(
+                f"  {codec:<6} {size / 1024:10.1f} {ratio:6.2f} "
+                f"{results[codec]['write_s'] * 1000:11.1f} {results[codec]['read_s'] * 1000:11.1f}",
+                file=out,
+            )
+    return results
+
+
+# ---------------- СЦЕНАРИИ ДЕЙСТВИЙ (ЗАМЕР ЗАДЕРЖЕК) ----------------
+# Сценарий — .jsonl: первая строка {"type": "trace", ...} (версия и размер
+# синтетической БД, под которую он писался), далее по строке на действие
+# пользователя {"action": ..., "t": секунды от начала, ...аргументы}
+# (у note_action кнопка заметки — в "button").
+# Сценарий записывает окно (--record), генерирует make-trace, а окно с
+# --replay проигрывает его на копии/синтетической БД и меряет каждое действие.
+
+TRACE_VERSION = 1
+
+# Доли действий в сгенерированном сценарии
+TRACE_MIX = {
+    "add_note": 20,
+    "note_action": 35,
+    "search": 15,
+    "filter": 5,
+    "select_notes_tab": 8,
+    "new_notes_tab": 1,
+    "show_screen": 4,
+    "select_tab": 5,
+    "new_tab": 1,
+    "save": 6,
+}
+TRACE_NOTE_ACTIONS = ("pin", "done", "up", "down", "delete")
+TRACE_WORDS = ("купить", "позвонить", "отчёт", "встреча", "идея", "код", "счёт", "план", "спорт", "книга")
+TRACE_TAGS = ("дом", "работа", "учёба", "срочно", "идеи")
+
+
+def build_synthetic_db(db: str, notes: int, tabs: int, doc_kb: int = 16, seed: int = 1):
+    """Синтетическая БД: notes заметок во вкладках «Заметки 0..tabs-1» и tabs документов."""
+    rnd = random.Random(seed)
+    init_db(db)
+    body = ("Строка журнала с данными 0123456789\n" * (doc_kb * 1024 // 64 + 1))[: doc_kb * 1024]
+    color_values = list(colors.values())
+    with sqlite3.connect(db) as conn:
+        importer = _Importer(conn, _Progress(None))
+        for i in range(notes):
+            importer.note({
+                "tab": f"Заметки {i % tabs}",
+                "text": f"{rnd.choice(TRACE_WORDS)} {i}",
+                "done": i % 3 == 0,
+                "pinned": i % 50 == 0,
+                "date": f"{1 + i % 28:02d}.{1 + i // 28 % 12:02d}.2026",
+                "color": rnd.choice(color_values),
+                "tags": rnd.sample(TRACE_TAGS, rnd.randint(0, 2)),
+            })
+        for i in range(tabs):
+            importer.document(f"Документ {i}", body)
+        importer.finish()
+
+
+def generate_trace(path: str, actions: int, notes: int, tabs: int, seed: int = 1) -> int:
+    """Пишет сценарий из actions случайных действий (детерминированно по seed)."""
+    rnd = random.Random(seed)
+    kinds, weights = list(TRACE_MIX), list(TRACE_MIX.values())
+    per_tab = max(1, notes // max(1, tabs))
+    with open(path, "w", encoding="utf-8") as out:
+        header = {"type": "trace", "version": TRACE_VERSION, "notes": notes, "tabs": tabs, "seed": seed}
+        out.write(json.dumps(header, ensure_ascii=False) + "\n")
+        steps = [{"action": "show_screen", "screen": "notes"}]
+        while len(steps) < actions:
+            kind = rnd.choices(kinds, weights)[0]
+            tab = f"Заметки {rnd.randrange(tabs)}"
+            if kind == "add_note":
+                step = {"tab": tab, "text": f"{rnd.choice(TRACE_WORDS)} {rnd.randrange(10_000)}",
+                        "color": rnd.choice(list(colors)), "tags": rnd.choice(("",) + TRACE_TAGS)}
+            elif kind == "note_action":
+                step = {"tab": tab, "index": rnd.randrange(per_tab), "button": rnd.choice(TRACE_NOTE_ACTIONS)}
+            elif kind == "search":
+                step = {"text": rnd.choice(("",) + TRACE_WORDS)[: rnd.randint(0, 6)]}
+            elif kind == "filter":
+                step = {"tags": rnd.choice(("",) * 3 + TRACE_TAGS), "state": rnd.choice((None, "active", "done"))}
+            elif kind == "select_notes_tab":
+                step = {"name": tab}
+            elif kind == "new_notes_tab":
+                step = {"name": f"Сценарий {len(steps)}"}
+            elif kind == "show_screen":
+                step = {"screen": rnd.choice(("notes", "blocknot", "notes"))}
+            elif kind == "select_tab":
+                step = {"name": f"Документ {rnd.randrange(tabs)}"}
+            elif kind == "new_tab":
+                step = {"name": f"Сценарий {len(steps)}"}
+            else:
+                step = {}
+            steps.append({"action": kind, **step})
+        for step in steps[:actions]:
+            out.write(json.dumps(step, ensure_ascii=False) + "\n")
+    return min(actions, len(steps))
+
+
+def read_trace(path: str) -> tuple[dict, list[dict]]:
+    """(заголовок, действия) сценария."""
+    header: dict = {}
+    steps: list[dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("type") == "trace":
+                header = record
+            elif record.get("action"):
+                steps.append(record)
+    return header, steps
+
+
+def latency_report(samples: dict) -> dict:
+    """{действие: [секунды]} -> {действие: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}; "*" — все."""
+    report = {}
+    everything = [value for values in samples.values() for value in values]
+    for kind, values in sorted(samples.items()) + [("*", everything)]:
+        if not values:
+            continue
+        ordered = sorted(values)
+
+        def pick(q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+        report[kind] = {
+            "count": len(ordered),
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": ordered[-1] * 1000,
+        }
+    return report
+
+
+def print_latency_report(report: dict, previous: dict | None = None, out=sys.stdout):
+    """Таблица задержек; с previous — ещё изменение p50/p95 относительно прошлого замера."""
+    title = f"  {'действие':<18} {'раз':>6} {'сред.':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'макс.':>9}"
+    print(title + ("  Δp50    Δp95" if previous else ""), file=out)
+    for kind, stats in report.items():
+        line = (
+            f"  {kind:<18} {stats['count']:>6} {stats['mean_ms']:8.2f} {stats['p50_ms']:8.2f} "
+            f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['max_ms']:9.2f}"
+        )
+        before = (previous or {}).get(kind)
+        if before:
+            changes = []
+            for key in ("p50_ms", "p95_ms"):
+                base = before.get(key) or 0.0
+                changes.append(f"{(stats[key] - base) / base * 100:+6.0f}%" if base else "     —")
+            line += "  " + "  ".join(changes)
+        print(line, file=out)
+
+
+def cli_maintain(_conn, args) -> int:
+    report = run_db_maintenance(args.db, integrity=True, force=args.force)
+    print(f"Страниц: {report['pages']}, свободных: {report['freelist']}")
+    if report["full_vacuum"]:
+        print("✓ Выполнен VACUUM (включён auto_vacuum=INCREMENTAL)")
+    elif report["vacuumed_pages"]:
+        print(f"✓ incremental_vacuum: освобождено страниц {report['vacuumed_pages']}")
+    if report["analyzed"]:
+        print("✓ ANALYZE")
+    print(f"Проверка целостности: {report['integrity']}")
+    return 0 if report["integrity"] == "ok" else 1
+
+
+def cli_backup(_conn, args) -> int:
+    path = backup_db(args.db, dest_dir=args.dir, compress=args.compress)
+    print(f"✓ Копия: {path} ({os.path.getsize(path) / 1024:.1f} КБ)")
+    if args.dir is None:
+        removed = rotate_backups(args.db, args.keep)
+        if removed:
+            print(f"Удалено старых копий: {removed}")
+    return 0
+
+
+def cli_backups(_conn, args) -> int:
+    for path, mtime, size in list_backups(args.db):
+        stamp = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"  {stamp}  {size / 1024:10.1f} КБ  {path}")
+    return 0
+
+
+def cli_restore(_conn, args) -> int:
+    restore_db(args.path, args.db)
+    print(f"✓ База восстановлена из {args.path}")
+    return 0
+
+
+def cli_bench(_conn, args) -> int:
+    run_storage_benchmark(args.notes, args.tabs, args.doc_kb)
+    return 0
+
+
+def cli_bench_compression(_conn, args) -> int:
+    if args.file:
+        with open(args.file, "r", encoding="utf-8", errors="replace") as f:
+            body = f.read()
+    else:
+        body = ("Строка журнала с данными 0123456789\n" * (args.kb * 1024 // 64 + 1))[: args.kb * 1024]
+    run_compression_benchmark(body, args.rounds)
+    return 0
+
+
+def cli_make_trace(_conn, args) -> int:
+    count = generate_trace(args.path, args.actions, args.notes, args.tabs, args.seed)
+    print(f"✓ Сценарий: {count} действий → {args.path}")
+    print(f"  воспроизведение: python {os.path.basename(sys.argv[0])} --replay {args.path} --report отчёт.json")
+    return 0
+
+
+def cli_export(_conn, args) -> int:
+    count = export_data(args.path, args.db, progress=_cli_progress)
+    print(f"Экспортировано записей: {count}")
+    return 0
+
+
+def cli_import(_conn, args) -> int:
+    count = import_data(args.path, args.db, progress=_cli_progress)
+    print(f"Импортировано записей: {count}")
+    return 0
+
+
+def run_cli(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog="versio_programm_two.py --cli",
+        description="Твой личный блокнот: операции с базой без графического интерфейса",
+    )
+    parser.add_argument("--db", default=DB_PATH, help="путь к notebook.sqlite3")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("add-note", help="добавить заметку")
+    p.add_argument("text")
+    p.add_argument("--tab", default="Заметки")
+    p.add_argument("--date", help="ДД.ММ.ГГГГ (по умолчанию сегодня)")
+    p.add_argument("--start", default="", help="время начала ЧЧ:ММ")
+    p.add_argument("--end", default="", help="время конца ЧЧ:ММ")
+    p.add_argument("--color", help=f"{', '.join(colors)} или #rrggbb")
+    p.add_argument("--pinned", action="store_true")
+    p.add_argument("--tags", default="", help="теги через пробел или запятую")
+    p.set_defaults(handler=cli_add_note)
+
+    p = commands.add_parser("notes", help="список заметок")
+    p.add_argument("--tab")
+    p.add_argument("--tag", help="только заметки с этим тегом")
+    p.add_argument("--limit", type=int, default=0)
+    p.set_defaults(handler=cli_notes)
+
+    p = commands.add_parser("search", help="поиск по тексту заметок")
+    p.add_argument("query")
+    p.add_argument("--tab")
+    p.add_argument("--limit", type=int, default=0)
+    p.set_defaults(handler=cli_search)
+
+    p = commands.add_parser("tabs", help="список документов и вкладок заметок")
+    p.set_defaults(handler=cli_tabs)
+
+    p = commands.add_parser("add-tab", help="добавить документ")
+    p.add_argument("name")
+    source = p.add_mutually_exclusive_group()
+    source.add_argument("--file", help="взять текст из файла")
+    source.add_argument("--text")
+    p.set_defaults(handler=cli_add_tab)
+
+    p = commands.add_parser("show", help="вывести текст документа")
+    p.add_argument("name")
+    p.set_defaults(handler=cli_show)
+
+    p = commands.add_parser("export", help="экспорт в .jsonl, .md или .csv (csv — только заметки)")
+    p.add_argument("path")
+    p.set_defaults(handler=cli_export)
+
+    p = commands.add_parser("import", help="импорт из .jsonl, .md или .csv")
+    p.add_argument("path")
+    p.set_defaults(handler=cli_import)
+
+    p = commands.add_parser("compact", help="VACUUM + ANALYZE")
+    p.set_defaults(handler=cli_compact)
+
+    p = commands.add_parser("maintain", help="обслуживание: vacuum по порогу, ANALYZE, quick_check")
+    p.add_argument("--force", action="store_true", help="сжать и переанализировать без порога")
+    p.set_defaults(handler=cli_maintain)
+
+    p = commands.add_parser("backup", help="резервная копия базы")
+    p.add_argument("--dir", help="папка для копии (по умолчанию backups рядом с базой, с ротацией)")
+    p.add_argument("--compress", action="store_true", help="сжать копию gzip")
+    p.add_argument("--keep", type=int, default=BACKUP_KEEP, help="сколько копий хранить")
+    p.set_defaults(handler=cli_backup)
+
+    p = commands.add_parser("backups", help="список резервных копий")
+    p.set_defaults(handler=cli_backups)
+
+    p = commands.add_parser("restore", help="восстановить базу из копии")
+    p.add_argument("path")
+    p.set_defaults(handler=cli_restore)
+
+    p = commands.add_parser("bench", help="замер скорости хранилища на синтетической БД")
+    p.add_argument("--notes", type=int, default=100_000)
+    p.add_argument("--tabs", type=int, default=10)
+    p.add_argument("--doc-kb", type=int, default=256)
+    p.set_defaults(handler=cli_bench)
+
+    p = commands.add_parser("bench-compression", help="сравнение кодеков сжатия документов")
+    p.add_argument("--file", help="текст для замера (по умолчанию — синтетический журнал)")
+    p.add_argument("--kb", type=int, default=4096, help="размер синтетического текста")
+    p.add_argument("--rounds", type=int, default=3)
+    p.set_defaults(handler=cli_bench_compression)
+
+    p = commands.add_parser("make-trace", help="сценарий действий окна для --replay (замер задержек)")
+    p.add_argument("path")
+    p.add_argument("--actions", type=int, default=10_000)
+    p.add_argument("--notes", type=int, default=10_000, help="заметок в синтетической БД для воспроизведения")
+    p.add_argument("--tabs", type=int, default=10)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(handler=cli_make_trace)
+
+    args = parser.parse_args(argv)
+
+    try:
+        init_db(args.db)
+        with sqlite3.connect(args.db) as conn:
+            return args.handler(conn, args)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+
+def parse_app_args(argv: list[str]):
+    """Ключи запуска окна (без --cli)."""
+    parser = argparse.ArgumentParser(prog="versio_programm_two.py", description="Твой личный блокнот")
+    parser.add_argument("--record", metavar="СЦЕНАРИЙ", help="записывать действия в сценарий .jsonl")
+    parser.add_argument("--replay", metavar="СЦЕНАРИЙ", help="проиграть сценарий и вывести задержки действий")
+    parser.add_argument("--db", help="для --replay: база, копия которой используется (иначе синтетическая)")
+    parser.add_argument("--report", help="для --replay: сохранить задержки в .json")
+    parser.add_argument("--compare", help="для --replay: отчёт .json прошлого замера для сравнения")
+    parser.add_argument("--show", action="store_true", help="для --replay: не прятать окно")
+    args, _unknown = parser.parse_known_args(argv)
+    return args
+
+
+def prepare_replay_db(args) -> str:
+    """Временная БД для --replay: копия --db или синтетическая под заголовок сценария."""
+    folder = tempfile.mkdtemp(prefix="notebook-replay-")
+    db = os.path.join(folder, "notebook.sqlite3")
+    if args.db:
+        # только чтение: исходная база (и её WAL) не меняется даже при закрытии
+        src = sqlite3.connect(f"file:{os.path.abspath(args.db)}?mode=ro", uri=True)
+        dst = sqlite3.connect(db)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+    else:
+        header, _steps = read_trace(args.replay)
+        build_synthetic_db(db, header.get("notes", 10_000), header.get("tabs", 10))
+    return db
+
+
+if len(sys.argv) > 1 and sys.argv[1] == "--cli":
+    sys.exit(run_cli(sys.argv[2:]))
+
+# Запуск окна; сценарий проигрывается только на временной БД, рабочая не трогается
+app_args = parse_app_args(sys.argv[1:])
+if app_args.replay:
+    DB_PATH = prepare_replay_db(app_args)
+
+# ---------------- НАСТРОЙКИ ----------------
+ctk.set_appearance_mode("dark")
+ctk.set_default_color_theme("dark-blue")
+
+# ---------------- ОКНО ----------------
+app = ctk.CTk()
+app.title("Твой личный блокнот")
+app.geometry("1100x800")
+app.resizable(False, False)
+
+# ---------------- ШРИФТЫ / НАСТРОЙКИ ----------------
+emoji_font = ("Arial Unicode MS", 16)
+title_font = ("Segoe UI", 24)
+
+def _focused_text_like_widget():
+    """Возвращает виджет с фокусом, если это поле ввода (Entry/Text)."""
+    try:
+        w = app.focus_get()
+    except Exception:
+        return None
+
+    if w is None:
+        return None
+
+    try:
+        cls = w.winfo_class()
+    except Exception:
+        return None
+
+    # Tk классы для ввода
+    if cls in ("Text", "Entry"):
+        return w
+    return None
+
+
+def _event_generate_on_focused(sequence: str):
+    w = _focused_text_like_widget()
+    if not w:
+        return
+    try:
+        w.event_generate(sequence)
+    except Exception:
+        pass
+
+
+def _select_all_on_focused():
+    w = _focused_text_like_widget()
+    if not w:
+        return
+    try:
+        if w.winfo_class() == "Text":
+            w.tag_add("sel", "1.0", "end-1c")
+            w.mark_set("insert", "1.0")
+            w.see("insert")
+        elif w.winfo_class() == "Entry":
+            w.selection_range(0, "end")
+            w.icursor(0)
+    except Exception:
+        pass
+
+
+def _undo_on_focused():
+    w = _focused_text_like_widget()
+    if not w:
+        return
+    try:
+        if w.winfo_class() == "Text":
+            w.edit_undo()
+    except Exception:
+        pass
+
+
+def _redo_on_focused():
+    w = _focused_text_like_widget()
+    if not w:
+        return
+    try:
+        if w.winfo_class() == "Text":
+            w.edit_redo()
+    except Exception:
+        pass
+
+
+def _bind_edit_hotkeys_to_app():
+    """Глобальные горячие клавиши для копирования/вставки/вырезания и т.п."""
+    # Не используем bind_all, чтобы избежать дублирования событий
+    pass
+
+
+# Общие именованные шрифты: все виджеты ссылаются на один объект, поэтому
+# смена размера/семейства — это один configure() вместо обхода виджетов.
+notes_font = ctk.CTkFont(family=settings["font_family"], size=settings["notes_font_size"])
+editor_font = ctk.CTkFont(family="Consolas", size=settings["editor_font_size"])
+
+
+def get_notes_font():
+    return notes_font
+
+
+def get_editor_font():
+    return editor_font
+
+# ---------------- ОСНОВНОЙ КОНТЕЙНЕР ----------------
+content_frame = ctk.CTkFrame(app)
+content_frame.grid(row=2, column=0, columnspan=4, sticky="nsew", padx=20, pady=(0, 20))
+
+app.grid_columnconfigure((0, 1, 2, 3), weight=1)
+app.grid_rowconfigure(2, weight=1)
+
+content_frame.grid_rowconfigure(0, weight=1)
+content_frame.grid_columnconfigure(0, weight=1)
+
+# ---------------- TOOLBAR ДЛЯ БЛОКНОТА ----------------
+toolbar = ctk.CTkFrame(app)
+toolbar.grid(row=1, column=0, columnspan=4, sticky="ew", padx=20, pady=(0, 10))
+
+# Переменные для работы с вкладками
+tab_counter = 1
+current_tabs = {}  # Словарь для хранения данных вкладок
+tab_order = []
+tab_order_keys: dict[str, int] = {}  # имя -> ключ порядка (position в БД)
+tab_names_by_id: dict[int, str] = {}  # id документа в БД -> имя вкладки
+document_allocator = NameAllocator(lambda name: name in current_tabs)
+
+# Данные заметок (вкладки внутри "Заметок")
+notes_search_text = ""
+notes_tabs_order: list[str] = []
+notes_by_tab: dict[str, list[dict]] = {}
+notes_tab_keys: dict[str, int] = {}  # имя -> ключ порядка (position в БД)
+notes_frames: dict[str, ctk.CTkScrollableFrame] = {}
+notes_tab_allocator = NameAllocator(lambda name: name in notes_by_tab)
+
+# ---------------- ХРАНИЛИЩЕ ЗАМЕТОК ----------------
+# Заметки и их вкладки правятся через store_* (и функции вкладок заметок):
+# каждая правка публикует событие. События копятся и один раз за такт
+# простоя (after_idle) уходят подписчикам пачкой — сохранение в БД, индекс
+# поиска и экран заметок обрабатывают только то, что изменилось.
+# saved=True — изменение уже в БД (пришло из другого окна или записано сразу).
+
+_store_listeners: list = []
+_store_pending: list[dict] = []
+_store_flush_id = None
+
+
+def subscribe(listener):
+    """listener(events) получает пачку событий: dict с kind, saved и данными."""
+    _store_listeners.append(listener)
+
+
+def emit(kind: str, saved: bool = False, **data):
+    global _store_flush_id
+    _store_pending.append({"kind": kind, "saved": saved, **data})
+    if _store_flush_id is None:
+        _store_flush_id = app.after_idle(flush_store_events)
+
+
+def flush_store_events():
+    """Раздаёт накопленные события подписчикам одной пачкой."""
+    global _store_flush_id
+    if _store_flush_id is not None:
+        try:
+            app.after_cancel(_store_flush_id)
+        except Exception:
+            pass
+        _store_flush_id = None
+    events = _store_pending[:]
+    _store_pending.clear()
+    if not events:
+        return
+    for listener in list(_store_listeners):
+        try:
+            listener(events)
+        except Exception as e:
+            show_status(f"❌ {e}", 4000, priority=2)
+
+
+def store_add_note(tab_name: str, note: dict, index: int | None = None) -> dict:
+    ensure_notes_tab(tab_name, switch_to=False)
+    tab_notes = notes_by_tab[tab_name]
+    tab_notes.insert(len(tab_notes) if index is None else index, note)
+    emit("note_added", tab=tab_name, note=note)
+    return note
+
+
+def store_update_note(tab_name: str, note: dict, **fields):
+    note.update(fields)
+    emit("note_updated", tab=tab_name, note=note, fields=frozenset(fields))
+
+
+def store_move_note(tab_name: str, note: dict, new_index: int):
+    tab_notes = notes_by_tab[tab_name]
+    old_index = tab_notes.index(note)
+    new_index = max(0, min(new_index, len(tab_notes) - 1))
+    if new_index == old_index:
+        return
+    tab_notes.insert(new_index, tab_notes.pop(old_index))
+    emit("note_moved", tab=tab_name, note=note, index=new_index)
+
+
+def store_remove_note(tab_name: str, note: dict):
+    notes_by_tab[tab_name].remove(note)
+    emit("note_removed", tab=tab_name, note=note)
+
+
+def store_clear_notes_tab(tab_name: str):
+    removed = notes_by_tab.get(tab_name, [])
+    notes_by_tab[tab_name] = []
+    for note in removed:
+        emit("note_removed", tab=tab_name, note=note)
+
+
+def store_set_search(text: str):
+    global notes_search_text
+    if text != notes_search_text:
+        notes_search_text = text
+        emit("search_changed", saved=True)
+
+
+# Индекс поиска: текст заметки в нижнем регистре по id() объекта заметки
+notes_text_index: dict[int, str] = {}
+
+
+def note_search_text(note: dict) -> str:
+    text = notes_text_index.get(id(note))
+    if text is None:
+        text = notes_text_index[id(note)] = note.get("text", "").lower()
+    return text
+
+
+# Превью длинной заметки: начало первой строки (до NOTE_PREVIEW_CHARS) с «…».
+# Считается один раз и хранится вместе со строкой, из которой получено:
+# правка текста даёт новую строку, и устаревшее превью узнаётся по is.
+# В списке рисуется превью; весь текст — только у развёрнутых заметок.
+NOTE_PREVIEW_CHARS = 120
+
+note_previews: dict[int, tuple[str, str]] = {}
+expanded_notes: set[int] = set()  # id() развёрнутых заметок
+
+
+def note_preview(note: dict) -> str:
+    text = note.get("text", "")
+    if len(text) <= NOTE_PREVIEW_CHARS and "\n" not in text:
+        return text
+    cached = note_previews.get(id(note))
+    if cached is not None and cached[0] is text:
+        return cached[1]
+    head = text[:NOTE_PREVIEW_CHARS]
+    preview = head.split("\n", 1)[0].rstrip() + " …"
+    note_previews[id(note)] = (text, preview)
+    return preview
+
+
+def note_is_long(note: dict) -> bool:
+    return note_preview(note) is not note.get("text", "")
+
+
+def _index_notes(events):
+    for event in events:
+        kind = event["kind"]
+        if kind == "notes_reloaded":
+            notes_text_index.clear()  # заметки заменены на месте — пересоберётся по запросу
+            note_previews.clear()
+            if expanded_notes:
+                expanded_notes.intersection_update(
+                    id(note) for tab_notes in notes_by_tab.values() for note in tab_notes
+                )
+        elif kind == "note_removed":
+            notes_text_index.pop(id(event["note"]), None)
+            note_previews.pop(id(event["note"]), None)
+            expanded_notes.discard(id(event["note"]))
+        elif kind == "note_added" or (kind == "note_updated" and "text" in event["fields"]):
+            notes_text_index[id(event["note"])] = event["note"].get("text", "").lower()
+
+
+def _persist_notes(events):
+    # Одна запись на пачку; изменения из БД обратно не пишем
+    if any(not event["saved"] for event in events):
+        save_notes_to_db()
+
+
+subscribe(_index_notes)
+subscribe(_persist_notes)
+
+# ---------------- ФИЛЬТРЫ ЗАМЕТОК ----------------
+# Фильтр экрана заметок: теги (нужны все указанные), цвет, состояние и
+# диапазон дат. Под него в памяти держатся обратные индексы «значение ->
+# множество id() заметок»: по тегу, цвету, дню (дни ещё и отсортированы для
+# поиска диапазона бисекцией), выполненным и закреплённым. Подписчик событий
+# хранилища правит индексы точечно, так что сочетание условий — пересечение
+# нескольких множеств от самого маленького, без прохода по всем заметкам.
+
+NOTE_STATE_FILTERS = {"Все": None, "Активные": "active", "Выполненные": "done", "Закреплённые": "pinned"}
+ALL_COLORS = "Все цвета"
+FILTER_FIELDS = frozenset({"tags", "color", "done", "pinned", "date"})
+
+_notes_filter: dict = {"tags": "", "color": None, "state": None, "date_from": None, "date_to": None}
+
+_filter_index: dict = {
+    "stale": True,   # пересобрать при следующем запросе (заметки заменены целиком)
+    "keys": {},      # id(заметки) -> (теги, цвет, done, pinned, день) на момент индексации
+    "tag": {},       # тег -> set(id)
+    "color": {},     # цвет -> set(id)
+    "day": {},       # номер дня (toordinal) -> set(id)
+    "days": [],      # отсортированные ключи "day"
+    "done": set(),
+    "pinned": set(),
+    "all": set(),
+}
+_filter_cache: dict = {"filter": None, "ids": None}
+
+
+def _filter_keys(note: dict) -> tuple:
+    day = _note_day(note.get("date") or "")
+    return (
+        tuple((note.get("tags") or "").split()),
+        note.get("color") or "",
+        bool(note.get("done")),
+        bool(note.get("pinned")),
+        day.toordinal() if day else None,
+    )
+
+
+def _index_note(note: dict):
+    index = _filter_index
+    key = id(note)
+    tags, color, done, pinned, day = index["keys"][key] = _filter_keys(note)
+    index["all"].add(key)
+    for tag in tags:
+        index["tag"].setdefault(tag, set()).add(key)
+    index["color"].setdefault(color, set()).add(key)
+    if done:
+        index["done"].add(key)
+    if pinned:
+        index["pinned"].add(key)
+    if day is not None:
+        if day not in index["day"]:
+            index["day"][day] = set()
+            bisect.insort(index["days"], day)
+        index["day"][day].add(key)
+
+
+def _drop_from(mapping: dict, value, key: int) -> bool:
+    """Убирает key из mapping[value]; True, если множество опустело и удалено."""
+    bucket = mapping.get(value)
+    if bucket is None:
+        return False
+    bucket.discard(key)
+    if bucket:
+        return False
+    del mapping[value]
+    return True
+
+
+def _unindex_note(key: int):
+    index = _filter_index
+    keys = index["keys"].pop(key, None)
+    if keys is None:
+        return
+    tags, color, _done, _pinned, day = keys
+    index["all"].discard(key)
+    for tag in tags:
+        _drop_from(index["tag"], tag, key)
+    _drop_from(index["color"], color, key)
+    index["done"].discard(key)
+    index["pinned"].discard(key)
+    if day is not None and _drop_from(index["day"], day, key):
+        days = index["days"]
+        del days[bisect.bisect_left(days, day)]
+
+
+def rebuild_filter_index():
+    index = _filter_index
+    for name in ("keys", "tag", "color", "day"):
+        index[name].clear()
+    for name in ("done", "pinned", "all"):
+        index[name].clear()
+    index["days"].clear()
+    for tab_notes in notes_by_tab.values():
+        for note in tab_notes:
+            _index_note(note)
+    index["stale"] = False
+    _filter_cache["ids"] = None
+
+
+def _filter_index_on_events(events):
+    index = _filter_index
+    for event in events:
+        kind = event["kind"]
+        if kind == "notes_reloaded":
+            index["stale"] = True
+        elif index["stale"]:
+            continue  # всё равно пересоберётся целиком
+        elif kind == "note_removed":
+            _unindex_note(id(event["note"]))
+        elif kind == "note_added" or (kind == "note_updated" and event["fields"] & FILTER_FIELDS):
+            _unindex_note(id(event["note"]))
+            _index_note(event["note"])
+        else:
+            continue
+        _filter_cache["ids"] = None
+
+
+subscribe(_filter_index_on_events)
+
+
+def notes_filter_active() -> bool:
+    return any(_notes_filter.values())
+
+
+def filtered_note_ids() -> set | None:
+    """id() заметок, проходящих фильтр; None — фильтр не задан."""
+    if not notes_filter_active():
+        return None
+    index = _filter_index
+    if index["stale"]:
+        rebuild_filter_index()
+    if _filter_cache["ids"] is not None and _filter_cache["filter"] == _notes_filter:
+        return _filter_cache["ids"]
+
+    wanted = _notes_filter
+    sets = [index["tag"].get(tag, set()) for tag in wanted["tags"].split()]
+    if wanted["color"]:
+        sets.append(index["color"].get(wanted["color"], set()))
+    if wanted["state"] in ("done", "pinned"):
+        sets.append(index[wanted["state"]])
+    if wanted["date_from"] is not None or wanted["date_to"] is not None:
+        days = index["days"]
+        low = 0 if wanted["date_from"] is None else bisect.bisect_left(days, wanted["date_from"])
+        high = len(days) if wanted["date_to"] is None else bisect.bisect_right(days, wanted["date_to"])
+        sets.append(set().union(*(index["day"][day] for day in days[low:high])))
+
+    if sets:
+        sets.sort(key=len)
+        ids = sets[0].intersection(*sets[1:])
+    else:
+        ids = set(index["all"])
+    if wanted["state"] == "active":
+        ids -= index["done"]
+
+    _filter_cache["filter"] = dict(wanted)
+    _filter_cache["ids"] = ids
+    return ids
+
+
+def store_set_filter(**fields):
+    changed = {name: value for name, value in fields.items() if _notes_filter.get(name) != value}
+    if changed:
+        _notes_filter.update(changed)
+        emit("filter_changed", saved=True)
+
+
+def _filter_day(text: str) -> int | None:
+    day = _note_day(text or "")
+    return day.toordinal() if day else None
+
+
+# Виджеты панели фильтра (пусто, пока экран заметок не построен)
+_filter_widgets: dict = {}
+
+
+def build_notes_filter_bar(parent):
+    draft = _notes_draft.get("filter", {})
+
+    tags_entry = ctk.CTkEntry(parent, placeholder_text="🏷 Теги")
+    tags_entry.pack(side="left", fill="x", expand=True, padx=(10, 8), pady=8)
+    from_entry = ctk.CTkEntry(parent, width=110, placeholder_text="📅 С")
+    from_entry.pack(side="left", padx=(0, 8))
+    to_entry = ctk.CTkEntry(parent, width=110, placeholder_text="📅 По")
+    to_entry.pack(side="left", padx=(0, 8))
+    for entry, name in ((tags_entry, "tags"), (from_entry, "from"), (to_entry, "to")):
+        if draft.get(name):
+            entry.insert(0, draft[name])
+        entry.bind("<KeyRelease>", apply_notes_filter)
+
+    color_var = ctk.StringVar(value=draft.get("color") or ALL_COLORS)
+    ctk.CTkOptionMenu(
+        parent, values=[ALL_COLORS] + list(colors.keys()), variable=color_var, width=130,
+        command=lambda _value: apply_notes_filter(),
+    ).pack(side="left", padx=(0, 8))
+    state_var = ctk.StringVar(value=draft.get("state") or "Все")
+    ctk.CTkOptionMenu(
+        parent, values=list(NOTE_STATE_FILTERS), variable=state_var, width=140,
+        command=lambda _value: apply_notes_filter(),
+    ).pack(side="left", padx=(0, 8))
+
+    ctk.CTkButton(parent, text="✖", width=40, command=reset_notes_filter).pack(side="left", padx=(0, 10))
+
+    _filter_widgets.update(tags=tags_entry, date_from=from_entry, date_to=to_entry, color=color_var, state=state_var)
+
+
+def teardown_notes_filter_bar():
+    widgets = _filter_widgets
+    try:
+        _notes_draft["filter"] = {
+            "tags": widgets["tags"].get(),
+            "from": widgets["date_from"].get(),
+            "to": widgets["date_to"].get(),
+            "color": widgets["color"].get(),
+            "state": widgets["state"].get(),
+        }
+    except Exception:
+        pass
+    widgets.clear()
+
+
+def apply_notes_filter(event=None):
+    widgets = _filter_widgets
+    if not widgets:
+        return
+    wanted = {
+        "tags": normalize_tags(widgets["tags"].get()),
+        "color": colors.get(widgets["color"].get()),
+        "state": NOTE_STATE_FILTERS.get(widgets["state"].get()),
+        "date_from": _filter_day(widgets["date_from"].get()),
+        "date_to": _filter_day(widgets["date_to"].get()),
+    }
+    if wanted != _notes_filter:
+        record_action("filter", **wanted)
+    store_set_filter(**wanted)
+
+
+def reset_notes_filter():
+    widgets = _filter_widgets
+    try:
+        for name in ("tags", "date_from", "date_to"):
+            widgets[name].delete(0, "end")
+        widgets["color"].set(ALL_COLORS)
+        widgets["state"].set("Все")
+    except Exception:
+        pass
+    _notes_draft.pop("filter", None)
+    if notes_filter_active():
+        record_action("filter", tags="", color=None, state=None, date_from=None, date_to=None)
+    store_set_filter(tags="", color=None, state=None, date_from=None, date_to=None)
+
+
+def edit_note_tags(tab_name: str, note: dict):
+    current = tags_label(note.get("tags"))
+    dialog = ctk.CTkInputDialog(
+        title="Теги заметки",
+        text=f"Теги через пробел (сейчас: {current or 'нет'}).\nПусто — убрать все:",
+    )
+    value = dialog.get_input()
+    if value is None:
+        return
+    tags = normalize_tags(value)
+    if tags != (note.get("tags") or ""):
+        index = notes_by_tab[tab_name].index(note)
+        record_action("note_action", tab=tab_name, index=index, button="tags", tags=tags)
+        store_update_note(tab_name, note, tags=tags)
+
+# ---------------- СТАТУС СОХРАНЕНИЯ (В TOOLBAR) ----------------
+
+
+class StatusNotifier:
+    """Очередь коротких сообщений для статусной строки с одним таймером.
+
+    Одинаковые сообщения подряд склеиваются ("✓ Сохранено ×12"), сообщения
+    с общим key (например, прогресс импорта) заменяют друг друга, сообщения
+    с большим приоритетом вытесняют текущее. post() можно вызывать из любого
+    потока: сообщения из фоновых потоков забирает тик таймера в потоке Tk.
+    """
+
+    TICK_MS = 150
+
+    def __init__(self, root, label):
+        self._root = root
+        self._label = label
+        self._incoming: queue.SimpleQueue = queue.SimpleQueue()
+        self._pending: list = []  # куча (-priority, seq, item)
+        self._seq = 0
+        self._current: dict | None = None
+        self._shown_text = ""
+        self._after_id = root.after(self.TICK_MS, self._tick)
+
+    def post(self, message: str, ms: int = 1600, priority: int = 0, key: str | None = None):
+        """Ставит сообщение в очередь (потокобезопасно)."""
+        self._incoming.put((message, ms, priority, key))
+        if threading.current_thread() is threading.main_thread():
+            self._process()
+
+    def clear(self):
+        self._pending.clear()
+        self._current = None
+        self._render("")
+
+    @staticmethod
+    def _merge(item: dict, message: str, key: str | None) -> bool:
+        """Вливает сообщение в item, если это повтор или то же key."""
+        if key is not None and item["key"] == key:
+            item["message"] = message
+            return True
+        if item["message"] == message:
+            item["count"] += 1
+            return True
+        return False
+
+    def _enqueue(self, message: str, ms: int, priority: int, key: str | None):
+        now = time.monotonic()
+        current = self._current
+
+        # Повтор текущего сообщения — только счётчик и продление показа
+        if current is not None and self._merge(current, message, key):
+            current["started"] = now
+            current["ms"] = max(current["ms"], ms)
+            return
+
+        for _prio, _seq, item in self._pending:
+            if self._merge(item, message, key):
+                return
+
+        item = {"message": message, "ms": ms, "priority": priority, "key": key, "count": 1, "started": now}
+        if current is not None and priority > current["priority"]:
+            # Более важное сообщение показываем сразу, текущее досмотрим позже
+            self._push(current)
+            self._current = item
+            return
+        self._push(item)
+
+    def _push(self, item: dict):
+        self._seq += 1
+        heapq.heappush(self._pending, (-item["priority"], self._seq, item))
+
+    def _process(self):
+        while True:
+            try:
+                message, ms, priority, key = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            self._enqueue(message, ms, priority, key)
+
+        now = time.monotonic()
+        current = self._current
+        if current is not None and (now - current["started"]) * 1000 >= current["ms"]:
+            current = self._current = None
+
+        if current is None and self._pending:
+            current = self._current = heapq.heappop(self._pending)[2]
+            current["started"] = now
+
+        if current is None:
+            self._render("")
+            return
+
+        # Анимация исчезновения точками: message, message., .., ... и пусто
+        text = current["message"]
+        if current["count"] > 1:
+            text = f"{text} ×{current['count']}"
+        elapsed_ms = (now - current["started"]) * 1000
+        dots = min(3, int(elapsed_ms * 4 // max(1, current["ms"])))
+        self._render(text + "." * dots)
+
+    def _render(self, text: str):
+        if text == self._shown_text:
+            return
+        self._shown_text = text
+        try:
+            self._label.configure(text=text)
+        except Exception:
+            pass
+
+    def _tick(self):
+        self._process()
+        self._after_id = self._root.after(self.TICK_MS, self._tick)
+
+
+status_notifier: StatusNotifier | None = None
+
+
+def show_status(
+    message: str = "✓ Сохранено", ms: int = 1600, priority: int | None = None, key: str | None = None
+):
+    """Показывает краткий статус справа и затем скрывает (потокобезопасно)."""
+    if not settings.get("show_save_status", True):
+        return
+    if status_notifier is None:
+        return
+
+    if priority is None:
+        priority = 1 if message.startswith("❌") else 0
+    status_notifier.post(message, ms, priority, key)
+
+# ---------------- ФОНОВЫЕ ЗАДАЧИ ----------------
+BACKGROUND_POLL_MS = 100
+
+
+def run_in_background(work, on_done=None) -> threading.Thread:
+    """Выполняет work() в отдельном потоке.
+
+    on_done(result, error) вызывается уже в потоке Tk: завершение потока
+    проверяется опросом через app.after, без вызовов Tk из фона.
+    """
+    box: dict = {}
+
+    def runner():
+        try:
+            box["result"] = work()
+        except BaseException as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+
+    def poll():
+        if thread.is_alive():
+            app.after(BACKGROUND_POLL_MS, poll)
+        elif on_done is not None:
+            on_done(box.get("result"), box.get("error"))
+
+    app.after(BACKGROUND_POLL_MS, poll)
+    return thread
+
+
+# ---------------- ПОДСВЕТКА СИНТАКСИСА ----------------
+# Лексеры построчные: lex(line, state) -> (tokens, state), где state —
+# состояние на конце строки (открытый ``` или """). После правки заново
+# разбираются только задетые строки и дальше — пока состояние на конце
+# строки не совпадёт с прежним. Разбор идёт в фоновом потоке, теги Tk
+# ставятся в потоке окна: сначала видимые строки, остальное — пачками.
+
+HIGHLIGHT_DEBOUNCE_MS = 30
+HIGHLIGHT_POLL_MS = 15
+HIGHLIGHT_CHUNK_LINES = 2000  # строк на одно задание лексеру
+HIGHLIGHT_TAG_BATCH = 300     # строк на одну пачку тегов вне экрана
+
+HIGHLIGHT_COLORS = {
+    "dark": {
+        "hl_keyword": "#c792ea",
+        "hl_string": "#c3e88d",
+        "hl_comment": "#7f86a8",
+        "hl_number": "#f78c6c",
+        "hl_name": "#82aaff",
+        "hl_heading": "#ffcb6b",
+        "hl_code": "#89ddff",
+        "hl_link": "#82aaff",
+        "hl_error": "#ff5370",
+        "hl_warning": "#ffcb6b",
+        "hl_muted": "#7f86a8",
+    },
+    "light": {
+        "hl_keyword": "#7c4dff",
+        "hl_string": "#2e7d32",
+        "hl_comment": "#8d8d8d",
+        "hl_number": "#e65100",
+        "hl_name": "#1565c0",
+        "hl_heading": "#b26a00",
+        "hl_code": "#00838f",
+        "hl_link": "#1565c0",
+        "hl_error": "#d32f2f",
+        "hl_warning": "#b26a00",
+        "hl_muted": "#8d8d8d",
+    },
+}
+
+HIGHLIGHT_TAGS = tuple(HIGHLIGHT_COLORS["dark"])
+
+
+def _scan(pattern, tags: dict, line: str, pos: int, tokens: list) -> list:
+    for m in pattern.finditer(line, pos):
+        tokens.append((tags[m.lastgroup], m.start(), m.end()))
+    return tokens
+
+
+_PY_TOKEN = re.compile(
+    r"(?P<comment>\#.*)"
+    r"|(?P<triple>[rRbBuUfF]{0,2}(?:'''|\"\"\"))"
+    r"|(?P<string>[rRbBuUfF]{0,2}(?:'(?:\\.|[^'\\])*'?|\"(?:\\.|[^\"\\])*\"?))"
+    r"|(?P<decorator>@[\w.]+)"
+    r"|(?P<defname>(?<=\bdef\s)\w+|(?<=\bclass\s)\w+)"
+    r"|(?P<keyword>\b(?:" + "|".join(keyword.kwlist) + r")\b)"
+    r"|(?P<number>\b0[xXoObB][\da-fA-F_]+\b|\b\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?j?\b)"
+)
+_PY_TAGS = {
+    "comment": "hl_comment",
+    "string": "hl_string",
+    "decorator": "hl_name",
+    "defname": "hl_name",
+    "keyword": "hl_keyword",
+    "number": "hl_number",
+}
+
+
+def lex_python(line: str, state):
+    """state — открытые тройные кавычки (''' или \"\"\") или None."""
+    tokens = []
+    pos = 0
+    while True:
+        if state:
+            end = line.find(state, pos)
+            if end < 0:
+                tokens.append(("hl_string", pos, len(line)))
+                return tokens, state
+            tokens.append(("hl_string", pos, end + 3))
+            pos, state = end + 3, None
+        m = _PY_TOKEN.search(line, pos)
+        if m is None:
+            return tokens, None
+        if m.lastgroup == "triple":
+            state = m.group()[-3:]
+            tokens.append(("hl_string", m.start(), m.end()))
+            pos = m.end()
+            continue
+        tokens.append((_PY_TAGS[m.lastgroup], m.start(), m.end()))
+        pos = m.end()
+
+
+_MD_FENCE = re.compile(r"\s{0,3}(`{3,}|~{3,})")
+_MD_BLOCK = re.compile(
+    r"(?P<heading>#{1,6}\s.*)|(?P<quote>\s{0,3}>.*)|(?P<bullet>\s*(?:[-*+]|\d+[.)])\s(?:\[[ xX]\]\s)?)"
+)
+_MD_INLINE = re.compile(
+    r"(?P<code>`[^`]+`)"
+    r"|(?P<strong>\*\*[^*]+\*\*|__[^_]+__)"
+    r"|(?P<em>\*[^*\s][^*]*\*|\b_[^_\s][^_]*_\b)"
+    r"|(?P<link>\[[^\]]*\]\([^)]*\)|https?://\S+)"
+    r"|(?P<comment><!--.*?-->)"
+)
+_MD_TAGS = {
+    "code": "hl_code",
+    "strong": "hl_heading",
+    "em": "hl_string",
+    "link": "hl_link",
+    "comment": "hl_muted",
+}
+
+
+def lex_markdown(line: str, state):
+    """state — открывающая ограда блока кода (``` или ~~~) или None."""
+    fence = _MD_FENCE.match(line)
+    if state:
+        if fence and fence.group(1)[0] == state[0] and len(fence.group(1)) >= len(state):
+            return [("hl_muted", 0, len(line))], None
+        return [("hl_code", 0, len(line))], state
+    if fence:
+        return [("hl_muted", 0, len(line))], fence.group(1)
+
+    tokens = []
+    pos = 0
+    block = _MD_BLOCK.match(line)
+    if block:
+        if block.lastgroup == "heading":
+            return [("hl_heading", 0, len(line))], None
+        if block.lastgroup == "quote":
+            return [("hl_comment", 0, len(line))], None
+        tokens.append(("hl_keyword", block.start(), block.end()))
+        pos = block.end()
+    return _scan(_MD_INLINE, _MD_TAGS, line, pos, tokens), None
+
+
+_JSON_TOKEN = re.compile(
+    r"(?P<key>\"(?:\\.|[^\"\\])*\"(?=\s*:))"
+    r"|(?P<string>\"(?:\\.|[^\"\\])*\"?)"
+    r"|(?P<number>-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b)"
+    r"|(?P<keyword>\b(?:true|false|null)\b)"
+)
+_JSON_TAGS = {"key": "hl_name", "string": "hl_string", "number": "hl_number", "keyword": "hl_keyword"}
+
+
+def lex_json(line: str, state):
+    return _scan(_JSON_TOKEN, _JSON_TAGS, line, 0, []), state
+
+
+_LOG_TOKEN = re.compile(
+    r"(?P<time>\d{4}-\d\d-\d\d[ T]\d\d:\d\d(?::\d\d(?:[.,]\d+)?)?|\b\d\d:\d\d:\d\d(?:[.,]\d+)?\b)"
+    r"|(?P<error>\b(?:ERROR|CRITICAL|FATAL|Traceback|\w*Exception|\w*Error)\b)"
+    r"|(?P<warning>\bWARN(?:ING)?\b)"
+    r"|(?P<level>\b(?:INFO|DEBUG|TRACE)\b)"
+    r"|(?P<string>\"[^\"]*\"|'[^']*')"
+    r"|(?P<number>\b\d+(?:\.\d+)?\b)"
+)
+_LOG_TAGS = {
+    "time": "hl_muted",
+    "error": "hl_error",
+    "warning": "hl_warning",
+    "level": "hl_name",
+    "string": "hl_string",
+    "number": "hl_number",
+}
+
+
+def lex_log(line: str, state):
+    return _scan(_LOG_TOKEN, _LOG_TAGS, line, 0, []), state
+
+
+LEXERS = {
+    "python": lex_python,
+    "markdown": lex_markdown,
+    "json": lex_json,
+    "log": lex_log,
+}
+
+LANGUAGE_BY_EXT = {
+    ".py": "python",
+    ".pyw": "python",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".json": "json",
+    ".jsonl": "json",
+    ".log": "log",
+}
+
+# Если ни путь, ни имя вкладки не подсказали язык — смотрим на начало текста
+_LANGUAGE_SNIFF = [
+    (re.compile(r"\A\s*[\[{]\s*[\"\[{\d\]}]"), "json"),
+    (re.compile(r"^\S*\d{4}-\d\d-\d\d[ T]\d\d:\d\d", re.M), "log"),
+    (re.compile(r"^(?:def|class|import|from)\s+\w", re.M), "python"),
+    (re.compile(r"^(?:#{1,6}\s|```|\s*- \[[ xX]\]\s)", re.M), "markdown"),
+]
+
+
+def detect_language(name: str, filepath, sample: str):
+    for candidate in (filepath, name):
+        if candidate:
+            language = LANGUAGE_BY_EXT.get(os.path.splitext(candidate)[1].lower())
+            if language:
+                return language
+    for pattern, language in _LANGUAGE_SNIFF:
+        if pattern.search(sample):
+            return language
+    return None
+
+
+# Один поток-лексер на все вкладки: задания и результаты — через очереди,
+# результаты забираются опросом через app.after, пока есть незавершённые.
+_highlight_jobs: queue.SimpleQueue = queue.SimpleQueue()
+_highlight_results: queue.SimpleQueue = queue.SimpleQueue()
+_highlight_worker = {"thread": None, "pending": 0, "polling": False}
+
+_UNKNOWN_STATE = object()  # строка ещё не разобрана
+
+
+def _highlight_worker_loop():
+    while True:
+        highlighter, generation, first, state, text, lex = _highlight_jobs.get()
+        try:
+            out = []
+            for line in text.split("\n"):
+                tokens, state = lex(line, state)
+                out.append((tokens, state))
+        except Exception:
+            out = None
+        _highlight_results.put((highlighter, generation, first, out))
+
+
+def _submit_highlight_job(job):
+    if _highlight_worker["thread"] is None:
+        thread = threading.Thread(target=_highlight_worker_loop, daemon=True)
+        thread.start()
+        _highlight_worker["thread"] = thread
+    _highlight_jobs.put(job)
+    _highlight_worker["pending"] += 1
+    if not _highlight_worker["polling"]:
+        _highlight_worker["polling"] = True
+        app.after(HIGHLIGHT_POLL_MS, _poll_highlight_results)
+
+
+def _poll_highlight_results():
+    while True:
+        try:
+            highlighter, generation, first, out = _highlight_results.get_nowait()
+        except queue.Empty:
+            break
+        _highlight_worker["pending"] -= 1
+        highlighter.on_result(generation, first, out)
+    if _highlight_worker["pending"] > 0:
+        app.after(HIGHLIGHT_POLL_MS, _poll_highlight_results)
+    else:
+        _highlight_worker["polling"] = False
+
+
+def _line_of(index: str) -> int:
+    return int(str(index).split(".")[0])
+
+
+class Highlighter:
+    """Инкрементальная подсветка одного текстового поля.
+
+    О правках сообщает прокси UndoJournal (edited: первая задетая строка).
+    Без прокси правка определяется по <<Modified>>: изменение числа строк и
+    позиция курсора дают диапазон задетых строк — весь документ не перечитывается.
+    """
+
+    def __init__(self, textbox, language: str):
+        self.text = textbox._textbox
+        self.language = language
+        self.states: list = []  # состояние лексера на конце каждой строки
+        self.line_count = 1
+        self.dirty = None  # (первая, последняя) строки к разбору, с 1
+        self.generation = 0
+        self.busy = None  # диапазон строк, отданный лексеру
+        self.closed = False
+        self.exact = False  # о правках сообщает прокси журнала — курсор не нужен
+        self._kick_after_id = None
+        self._tag_batches: list = []
+        self._tag_after_id = None
+
+        restyle_highlight_tags(self.text)
+        self._bind_id = self.text.bind("<<Modified>>", self._on_modified, add="+")
+        self.text.edit_modified(False)
+        self.invalidate_all()
+
+    def close(self):
+        self.closed = True
+        for after_id in (self._kick_after_id, self._tag_after_id):
+            if after_id is not None:
+                try:
+                    app.after_cancel(after_id)
+                except Exception:
+                    pass
+        try:
+            self.text.unbind("<<Modified>>", self._bind_id)
+            for tag in HIGHLIGHT_TAGS:
+                self.text.tag_remove(tag, "1.0", "end")
+        except Exception:
+            pass
+
+    def _count_lines(self) -> int:
+        return _line_of(self.text.index("end-1c"))
+
+    def invalidate_all(self):
+        """Разобрать документ заново (после замены текста целиком)."""
+        self.line_count = self._count_lines()
+        self.states = [_UNKNOWN_STATE] * self.line_count
+        self.generation += 1
+        self._drop_pending(0)
+        self._mark(1, self.line_count)
+
+    def _mark(self, first: int, last: int, delay: int = HIGHLIGHT_DEBOUNCE_MS):
+        if self.dirty is not None:
+            first, last = min(first, self.dirty[0]), max(last, self.dirty[1])
+        self.dirty = (min(max(1, first), self.line_count), min(last, self.line_count))
+        if self._kick_after_id is None:
+            self._kick_after_id = app.after(delay, self._kick)
+
+    def _drop_pending(self, shift: int):
+        """Отданное лексеру и ещё не расставленное — снова в очередь разбора:
+        строки могли сдвинуться, поэтому диапазон расширяем на сдвиг."""
+        ranges = [(first, first + len(lines) - 1) for first, lines in self._tag_batches]
+        if self.busy is not None:
+            ranges.append(self.busy)
+        self._tag_batches = []
+        for first, last in ranges:
+            self._mark(first, last + shift)
+
+    def _on_modified(self, _event=None):
+        if self.closed or not self.text.edit_modified():
+            return
+        self.text.edit_modified(False)
+        if self.exact:
+            return  # правки уже учтены в edited()
+        # догадка: правка кончается у курсора
+        delta = self._count_lines() - self.line_count
+        self._shift(_line_of(self.text.index("insert")) - max(delta, 0))
+
+    def edited(self, first: int):
+        """Правка текста, начиная со строки first (вызывается сразу после неё)."""
+        if self.closed:
+            return
+        self.exact = True
+        self._shift(first)
+
+    def _shift(self, first: int):
+        """Сдвигает состояния строк под новое число строк и помечает задетые."""
+        count = self._count_lines()
+        delta = count - self.line_count
+        first = min(max(1, first), self.line_count)
+        line = first + max(delta, 0)
+        if delta > 0:
+            self.states[first - 1:first - 1] = [_UNKNOWN_STATE] * delta
+        elif delta < 0:
+            del self.states[first:first - delta]
+        self.line_count = count
+        self.generation += 1
+        if self.dirty is not None and self.dirty[1] >= first:
+            self.dirty = (self.dirty[0], self.dirty[1] + max(delta, 0))
+        self._drop_pending(abs(delta))
+        self._mark(first, line)
+
+    def _kick(self):
+        self._kick_after_id = None
+        if self.closed or self.busy is not None or self.dirty is None:
+            return
+        first, last = self.dirty
+        # разбор начинается с известного состояния предыдущей строки
+        while first > 1 and self.states[first - 2] is _UNKNOWN_STATE:
+            first -= 1
+        chunk_last = min(last, first + HIGHLIGHT_CHUNK_LINES - 1)
+        self.dirty = (chunk_last + 1, last) if chunk_last < last else None
+        state = self.states[first - 2] if first > 1 else None
+        text = self.text.get(f"{first}.0", f"{chunk_last}.end")
+        self.busy = (first, chunk_last)
+        _submit_highlight_job((self, self.generation, first, state, text, LEXERS[self.language]))
+
+    def on_result(self, generation: int, first: int, out):
+        self.busy = None
+        if self.closed:
+            return
+        if out is None or generation != self.generation:
+            # текст успел измениться — диапазон уже снова помечен в _on_modified
+            self._kick()
+            return
+
+        last = first + len(out) - 1
+        old_end = self.states[last - 1]
+        for offset, (_tokens, state) in enumerate(out):
+            self.states[first - 1 + offset] = state
+        self._schedule_tags(first, [tokens for tokens, _state in out])
+
+        if last < self.line_count and out[-1][1] != old_end:
+            # состояние на конце изменилось (открыли ``` или \"\"\") — разбираем дальше
+            self._mark(last + 1, last + HIGHLIGHT_CHUNK_LINES, delay=0)
+        self._kick()
+
+    def _visible_lines(self) -> tuple:
+        try:
+            top = _line_of(self.text.index("@0,0"))
+            bottom = _line_of(self.text.index(f"@0,{self.text.winfo_height()}"))
+            return top, bottom
+        except Exception:
+            return 1, 0
+
+    def _schedule_tags(self, first: int, token_lines: list):
+        last = first + len(token_lines) - 1
+        top, bottom = self._visible_lines()
+        lo, hi = max(first, top), min(last, bottom)
+        if lo <= hi:
+            self._tag_lines(lo, token_lines[lo - first:hi - first + 1])
+            rest = [(first, lo - 1), (hi + 1, last)]
+        else:
+            rest = [(first, last)]
+        for a, b in rest:
+            for start in range(a, b + 1, HIGHLIGHT_TAG_BATCH):
+                end = min(b, start + HIGHLIGHT_TAG_BATCH - 1)
+                self._tag_batches.append((start, token_lines[start - first:end - first + 1]))
+        if self._tag_batches and self._tag_after_id is None:
+            self._tag_after_id = app.after_idle(self._drain_tags)
+
+    def _drain_tags(self):
+        self._tag_after_id = None
+        if self.closed or not self._tag_batches:
+            return
+        first, token_lines = self._tag_batches.pop(0)
+        self._tag_lines(first, token_lines)
+        if self._tag_batches:
+            self._tag_after_id = app.after_idle(self._drain_tags)
+
+    def _tag_lines(self, first: int, token_lines: list):
+        last = first + len(token_lines) - 1
+        for tag in HIGHLIGHT_TAGS:
+            self.text.tag_remove(tag, f"{first}.0", f"{last}.end")
+        # один вызов tag_add на тег: Tk принимает сразу много диапазонов
+        ranges: dict = {}
+        for offset, tokens in enumerate(token_lines):
+            line = first + offset
+            for tag, start, end in tokens:
+                ranges.setdefault(tag, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for tag, indexes in ranges.items():
+            self.text.tag_add(tag, *indexes)
+
+
+def restyle_highlight_tags(text):
+    colors = HIGHLIGHT_COLORS.get(settings.get("theme"), HIGHLIGHT_COLORS["dark"])
+    try:
+        for tag, color in colors.items():
+            text.tag_configure(tag, foreground=color)
+        text.tag_raise("sel")
+    except Exception:
+        pass
+
+
+def attach_highlighter(tab_name: str):
+    """Подключает подсветку вкладки по пути, имени или началу текста.
+
+    Вызывается и после замены текста целиком: тогда документ разбирается заново.
+    """
+    tab_data = current_tabs.get(tab_name)
+    if tab_data is None:
+        return
+    textbox = tab_data["textbox"]
+    language = detect_language(tab_name, tab_data.get("filepath"), textbox.get("1.0", "40.end"))
+    old = tab_data.get("highlighter")
+    if old is not None and old.language == language:
+        old.invalidate_all()
+        return
+    if old is not None:
+        old.close()
+    tab_data["highlighter"] = Highlighter(textbox, language) if language else None
+
+
+def restyle_highlighters():
+    for tab_data in current_tabs.values():
+        if tab_data.get("highlighter") is not None:
+            restyle_highlight_tags(tab_data["highlighter"].text)
+
+
+# ---------------- РЕЕСТР ЭКРАНОВ ----------------
+# Экраны строятся при первом показе: пока пользователь не откроет "Заметки",
+# "В разработке" или "Настройки", их виджеты не создаются вовсе.
+
+screen_builders: dict = {}
+screen_teardowns: dict = {}
+screens: dict[str, ctk.CTkFrame] = {}
+current_screen: str | None = None
+_screen_teardown_after_ids: dict[str, str] = {}
+
+# Через сколько мс долго скрытый "тяжёлый" экран разбирается целиком
+SCREEN_TEARDOWN_MS = 5 * 60 * 1000
+
+
+def register_screen(name: str, builder, teardown=None):
+    """Регистрирует экран.
+
+    builder(frame) наполняет пустой фрейм виджетами при первом показе.
+    teardown() (необязательно) вызывается перед разборкой экрана, который
+    долго был скрыт, — после неё экран будет построен заново при показе.
+    """
+    screen_builders[name] = builder
+    if teardown is not None:
+        screen_teardowns[name] = teardown
+
+
+def get_screen(name: str) -> ctk.CTkFrame:
+    """Возвращает фрейм экрана, строя его при первом обращении."""
+    frame = screens.get(name)
+    if frame is None:
+        frame = ctk.CTkFrame(content_frame)
+        screens[name] = frame
+        screen_builders[name](frame)
+    return frame
+
+
+def destroy_screen(name: str):
+    """Разбирает построенный экран (данные остаются в памяти)."""
+    _screen_teardown_after_ids.pop(name, None)
+    if name == current_screen:
+        return
+    frame = screens.pop(name, None)
+    if frame is None:
+        return
+
+    teardown = screen_teardowns.get(name)
+    if teardown is not None:
+        try:
+            teardown()
+        except Exception:
+            pass
+    frame.destroy()
+
+
+# ---------------- ФУНКЦИЯ ПЕРЕКЛЮЧЕНИЯ ----------------
+def show_frame(name: str):
+    global current_screen
+
+    record_action("show_screen", screen=name)
+    toolbar.grid_remove()  # Скрываем toolbar по умолчанию
+    for other_name, f in screens.items():
+        if other_name != name:
+            f.grid_forget()
+
+    # Вернулись на экран до его разборки — отменяем её
+    after_id = _screen_teardown_after_ids.pop(name, None)
+    if after_id:
+        try:
+            app.after_cancel(after_id)
+        except Exception:
+            pass
+
+    frame = get_screen(name)
+    frame.grid(sticky="nsew")
+
+    previous = current_screen
+    current_screen = name
+
+    # Скрытый "тяжёлый" экран разберём, если к нему долго не возвращаются
+    if previous and previous != name and previous in screen_teardowns and previous in screens:
+        _screen_teardown_after_ids[previous] = app.after(
+            SCREEN_TEARDOWN_MS, lambda n=previous: destroy_screen(n)
+        )
+
+    # Показываем toolbar только для блокнота
+    if name == "blocknot":
+        toolbar.grid(row=1, column=0, columnspan=4, sticky="ew", padx=20, pady=(0, 20))
+
+# ---------------- ПЕРЕТАСКИВАНИЕ И ПЕРЕИМЕНОВАНИЕ ВКЛАДОК ----------------
+# Кнопки вкладок CTkTabview перетаскиваются мышью, двойной щелчок —
+# переименование. Обработчики задаются у самой вкладки: tabview.on_tab_move(имя,
+# новый индекс) и tabview.on_tab_rename(имя). CTkTabview пересоздаёт кнопку
+# при move/rename, поэтому привязки ставятся заново после каждой операции.
+
+TAB_DRAG_THRESHOLD = 12  # пикселей: меньше — обычный щелчок
+
+_tab_drag: dict = {"tabview": None, "name": None, "x": 0, "moved": False}
+
+
+def bind_tab_button(tabview, name: str):
+    try:
+        button = tabview._segmented_button._buttons_dict[name]
+    except Exception:
+        return
+
+    def press(event):
+        _tab_drag.update(tabview=tabview, name=name, x=event.x_root, moved=False)
+
+    def motion(event):
+        if _tab_drag["name"] == name and abs(event.x_root - _tab_drag["x"]) >= TAB_DRAG_THRESHOLD:
+            _tab_drag["moved"] = True
+
+    def double_click(_event):
+        if getattr(tabview, "on_tab_rename", None) is not None:
+            tabview.on_tab_rename(name)
+
+    try:
+        button.bind("<ButtonPress-1>", press)
+        button.bind("<B1-Motion>", motion)
+        button.bind("<ButtonRelease-1>", _on_tab_button_release)
+        button.bind("<Double-Button-1>", double_click)
+    except Exception:
+        pass
+
+
+def _on_tab_button_release(event):
+    tabview, name, moved = _tab_drag["tabview"], _tab_drag["name"], _tab_drag["moved"]
+    _tab_drag.update(tabview=None, name=None, moved=False)
+    if tabview is None or not moved or getattr(tabview, "on_tab_move", None) is None:
+        return
+    try:
+        segmented = tabview._segmented_button
+        others = [other for other in segmented._value_list if other != name]
+        index = len(others)
+        for i, other in enumerate(others):
+            button = segmented._buttons_dict[other]
+            if event.x_root < button.winfo_rootx() + button.winfo_width() // 2:
+                index = i
+                break
+    except Exception:
+        return
+    tabview.on_tab_move(name, index)
+
+
+def move_tabview_tab(tabview, name: str, index: int):
+    """Переставляет кнопку вкладки (CTkTabview.move не обновляет свой список имён)."""
+    try:
+        current = tabview.get()
+        tabview.move(index, name)
+        tabview._name_list.remove(name)
+        tabview._name_list.insert(index, name)
+        if current:
+            tabview.set(current)  # кнопка пересоздана без выделения
+    except Exception:
+        pass
+    bind_tab_button(tabview, name)
+
+
+def rename_tabview_tab(tabview, old_name: str, new_name: str):
+    try:
+        was_current = tabview.get() == old_name
+        tabview.rename(old_name, new_name)
+        if was_current:
+            tabview.set(new_name)
+    except Exception:
+        pass
+    bind_tab_button(tabview, new_name)
+
+
+def ask_tab_name(title: str, current: str) -> str | None:
+    """Новое имя вкладки из диалога; None — отмена или имя не изменилось."""
+    dialog = ctk.CTkInputDialog(title=title, text=f"Новое имя для «{current}»:")
+    name = (dialog.get_input() or "").strip()
+    if not name or name == current:
+        return None
+    return name
+
+
+# ---------------- ЭКРАНЫ ----------------
+
+# ---------- Экран 1: Блокнот ----------
+
+
+def build_blocknot_screen(frame):
+    # TabView для вкладок
+    # Экран строится раньше, чем объявлен обработчик, — вызываем его через lambda
+    tabs = ctk.CTkTabview(frame, command=lambda: on_blocknot_tab_clicked())
+    tabs.pack(fill="both", expand=True, padx=5, pady=5)
+    tabs.on_tab_move = lambda name, index: move_document_tab(name, index)
+    tabs.on_tab_rename = lambda name: rename_document_tab(name)
+
+    frame.tabs = tabs
+
+    # Сделать "шапку" вкладок выше/крупнее
+    if hasattr(tabs, "_segmented_button"):
+        try:
+            tabs._segmented_button.configure(height=42, font=("Segoe UI", 16))
+        except Exception:
+            pass
+
+
+register_screen("blocknot", build_blocknot_screen)
+
+# Блокнот — стартовый экран, вкладки восстанавливаются в него сразу
+frame_blocknot = get_screen("blocknot")
+
+# ---------- Экран 3: В разработке ----------
+
+
+def build_dev_screen(frame):
+    # Большая надпись по центру для экрана "В разработке"
+    ctk.CTkLabel(
+        frame,
+        text="🚧 В РАЗРАБОТКЕ 🚧",
+        font=("Segoe UI", 48),
+        text_color="#aaaaaa",
+    ).place(relx=0.5, rely=0.5, anchor="center")
+
+
+register_screen("dev", build_dev_screen)
+
+
+# =====================
+# ЭКРАН "ЗАМЕТКИ"
+# =====================
+
+# Виджеты экрана заметок (None, пока экран не построен или после его разборки)
+search_entry = None
+note_entry = None
+date_entry = None
+time_start_entry = None
+time_end_entry = None
+tags_entry = None
+color_var = None
+notes_tabview = None
+
+# Активная вкладка заметок и недописанный ввод переживают разборку экрана
+notes_active_tab = ""
+_notes_draft: dict = {}
+
+
+def build_notes_screen(frame):
+    global search_entry, note_entry, date_entry, time_start_entry, time_end_entry
+    global tags_entry, color_var, notes_tabview
+
+    ctk.CTkLabel(frame, text="📌 Мои заметки", font=title_font).pack(pady=10)
+
+    search_entry = ctk.CTkEntry(frame, placeholder_text="🔍 Поиск по заметкам")
+    search_entry.pack(fill="x", padx=20, pady=(0, 10))
+    if _notes_draft.get("search"):
+        search_entry.insert(0, _notes_draft["search"])
+    search_entry.bind("<KeyRelease>", update_search)
+
+    filter_frame = ctk.CTkFrame(frame)
+    filter_frame.pack(fill="x", padx=20, pady=(0, 10))
+    build_notes_filter_bar(filter_frame)
+
+    input_frame = ctk.CTkFrame(frame)
+    input_frame.pack(fill="x", padx=20)
+
+    note_entry = ctk.CTkTextbox(input_frame, height=80, font=get_notes_font())
+    note_entry.pack(fill="x", padx=10, pady=(10, 5))
+    if _notes_draft.get("text"):
+        note_entry.insert("1.0", _notes_draft["text"])
+
+    # Включим undo/redo для Ctrl+Z / Ctrl+Y (если доступно во внутреннем Text)
+    try:
+        note_entry._textbox.configure(undo=True, autoseparators=True, maxundo=NOTE_ENTRY_MAXUNDO)
+    except Exception:
+        pass
+
+    # Дата + время (начало/конец)
+    datetime_frame = ctk.CTkFrame(input_frame)
+    datetime_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+    date_entry = ctk.CTkEntry(datetime_frame, placeholder_text="📅 Дата (ДД.ММ.ГГГГ)")
+    date_entry.pack(side="left", fill="x", expand=True, padx=(0, 8))
+    date_entry.insert(0, _notes_draft.get("date") or datetime.now().strftime("%d.%m.%Y"))
+
+    time_start_entry = ctk.CTkEntry(datetime_frame, placeholder_text="⏱ Начало (ЧЧ:ММ)")
+    time_start_entry.pack(side="left", fill="x", expand=True, padx=(0, 8))
+    if _notes_draft.get("time_start"):
+        time_start_entry.insert(0, _notes_draft["time_start"])
+
+    time_end_entry = ctk.CTkEntry(datetime_frame, placeholder_text="⏱ Конец (ЧЧ:ММ)")
+    time_end_entry.pack(side="left", fill="x", expand=True)
+    if _notes_draft.get("time_end"):
+        time_end_entry.insert(0, _notes_draft["time_end"])
+
+    color_var = ctk.StringVar(value=_notes_draft.get("color") or "Серый")
+
+    meta_frame = ctk.CTkFrame(input_frame, fg_color="transparent")
+    meta_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+    ctk.CTkOptionMenu(
+        meta_frame,
+        values=list(colors.keys()),
+        variable=color_var,
+    ).pack(side="left", padx=(0, 8))
+
+    tags_entry = ctk.CTkEntry(meta_frame, placeholder_text="🏷 Теги через пробел")
+    tags_entry.pack(side="left", fill="x", expand=True)
+    if _notes_draft.get("tags"):
+        tags_entry.insert(0, _notes_draft["tags"])
+
+    notes_controls = ctk.CTkFrame(frame)
+    notes_controls.pack(fill="x", padx=20, pady=(0, 10))
+
+    ctk.CTkButton(
+        notes_controls,
+        text="✨ Новая вкладка",
+        height=40,
+        font=emoji_font,
+        command=new_notes_tab,
+    ).pack(side="left")
+
+    ctk.CTkButton(
+        notes_controls,
+        text="🗑 Удалить вкладку",
+        height=40,
+        font=emoji_font,
+        command=delete_current_notes_tab,
+    ).pack(side="left", padx=10)
+
+    ctk.CTkButton(
+        notes_controls,
+        text="✏ Переименовать",
+        height=40,
+        font=emoji_font,
+        command=lambda: rename_notes_tab(get_current_notes_tab()),
+    ).pack(side="left")
+
+    ctk.CTkButton(
+        notes_controls,
+        text="💾 Сохранить заметку",
+        height=40,
+        font=emoji_font,
+        command=add_note,
+    ).pack(side="left", padx=10)
+
+    notes_tabview = ctk.CTkTabview(frame)
+    notes_tabview.pack(fill="both", expand=True, padx=20, pady=(0, 20))
+    move_tabview_tabs_to_bottom(notes_tabview)
+    notes_tabview.configure(command=on_notes_tab_changed)
+    notes_tabview.on_tab_move = move_notes_tab
+    notes_tabview.on_tab_rename = rename_notes_tab
+
+    # Данные уже в памяти — строим только UI вкладок
+    for name in notes_tabs_order:
+        _add_notes_tab_ui(name)
+    if notes_active_tab in notes_frames:
+        notes_tabview.set(notes_active_tab)
+    elif notes_tabs_order:
+        notes_tabview.set(notes_tabs_order[0])
+    redraw_notes()
+
+
+def teardown_notes_screen():
+    """Сохраняет ввод и забывает виджеты экрана заметок перед его разборкой."""
+    global search_entry, note_entry, date_entry, time_start_entry, time_end_entry
+    global tags_entry, color_var, notes_tabview, notes_active_tab
+
+    notes_active_tab = get_current_notes_tab()
+    try:
+        _notes_draft.update(
+            search=search_entry.get(),
+            text=note_entry.get("1.0", "end-1c"),
+            date=date_entry.get(),
+            time_start=time_start_entry.get(),
+            time_end=time_end_entry.get(),
+            tags=tags_entry.get(),
+            color=color_var.get(),
+        )
+    except Exception:
+        pass
+    teardown_notes_filter_bar()
+
+    notes_frames.clear()
+    _canvas_layouts.clear()
+    search_entry = note_entry = date_entry = time_start_entry = time_end_entry = tags_entry = None
+    color_var = None
+    notes_tabview = None
+
+
+register_screen("notes", build_notes_screen, teardown=teardown_notes_screen)
+
+
+def add_note():
+    text = note_entry.get("1.0", "end-1c").strip()
+    if not text:
+        return
+
+    date_str = (date_entry.get() or "").strip() or datetime.now().strftime("%d.%m.%Y")
+    time_start = (time_start_entry.get() or "").strip()
+    time_end = (time_end_entry.get() or "").strip()
+    record_action(
+        "add_note", tab=get_current_notes_tab(), text=text, date=date_str, time_start=time_start,
+        time_end=time_end, color=color_var.get(), tags=tags_entry.get(),
+    )
+
+    store_add_note(
+        get_current_notes_tab(),
+        {
+            "text": text,
+            "done": False,
+            "pinned": False,
+            "date": date_str,
+            "color": colors[color_var.get()],
+            "time_start": time_start,
+            "time_end": time_end,
+            "tags": normalize_tags(tags_entry.get()),
+        },
+    )
+
+    note_entry.delete("1.0", "end")
+    time_start_entry.delete(0, "end")
+    time_end_entry.delete(0, "end")
+    show_status("✓ Заметка сохранена")
+
+
+def move_tabview_tabs_to_bottom(tabview: ctk.CTkTabview):
+    """Пытается перенести кнопки вкладок вниз (если внутренности доступны)."""
+    try:
+        if hasattr(tabview, "_segmented_button") and hasattr(tabview, "_tab_frame"):
+            tabview.grid_rowconfigure(0, weight=1)
+            tabview.grid_rowconfigure(1, weight=0)
+            tabview._tab_frame.grid_forget()
+            tabview._segmented_button.grid_forget()
+            tabview._tab_frame.grid(row=0, column=0, sticky="nsew")
+            tabview._segmented_button.grid(row=1, column=0, sticky="ew", pady=(8, 0))
+    except Exception:
+        pass
+
+
+def get_current_notes_tab() -> str:
+    if notes_tabview is None:
+        return notes_active_tab
+    return notes_tabview.get()
+
+
+def _add_notes_tab_ui(name: str):
+    """Создаёт вкладку в notes_tabview (если экран заметок построен)."""
+    if notes_tabview is None or name in notes_frames:
+        return
+
+    notes_tabview.add(name)
+    tab_frame = notes_tabview.tab(name)
+    if uses_notes_canvas():
+        notes_frames[name] = build_notes_canvas(tab_frame)
+    else:
+        scroll = ctk.CTkScrollableFrame(tab_frame)
+        scroll.pack(fill="both", expand=True, padx=0, pady=0)
+        notes_frames[name] = scroll
+    bind_tab_button(notes_tabview, name)
+
+
+def set_current_notes_tab(name: str):
+    global notes_active_tab
+    notes_active_tab = name
+    if notes_tabview is not None:
+        notes_tabview.set(name)
+
+
+def ensure_notes_tab(name: str, switch_to: bool = True, position: int | None = None):
+    """position — ключ порядка из БД (None — в конец)."""
+    if name not in notes_by_tab:
+        notes_by_tab[name] = []
+        if position is None:
+            position = next_order_key(notes_tabs_order, notes_tab_keys)
+        index = insert_ordered(notes_tabs_order, notes_tab_keys, name, position)
+        _add_notes_tab_ui(name)
+        if index != len(notes_tabs_order) - 1 and notes_tabview is not None:
+            move_tabview_tab(notes_tabview, name, index)
+
+    if switch_to:
+        set_current_notes_tab(name)
+
+
+def new_notes_tab(name: str | None = None):
+    """name=None — имя спрашивается у пользователя."""
+    if name is None:
+        dialog = ctk.CTkInputDialog(title="Новая вкладка", text="Название вкладки заметок:")
+        name = (dialog.get_input() or "").strip()
+    if not name:
+        name = f"Заметки {len(notes_tabs_order) + 1}"
+
+    name = notes_tab_allocator.allocate(name)
+    record_action("new_notes_tab", name=name)
+    ensure_notes_tab(name, switch_to=True)
+    emit("tab_changed", tab=name, change="added")
+
+
+def delete_current_notes_tab():
+    tab_name = get_current_notes_tab()
+
+    # Нельзя удалить последнюю вкладку — тогда просто очищаем
+    if len(notes_tabs_order) <= 1:
+        store_clear_notes_tab(tab_name)
+        show_status("✓ Вкладка очищена")
+        return
+
+    remove_notes_tab(tab_name)
+    emit("tab_changed", tab=tab_name, change="removed")
+    show_status("✓ Вкладка удалена")
+
+
+def remove_notes_tab(tab_name: str):
+    """Убирает вкладку заметок из данных и UI и переключается на соседнюю."""
+    was_current = tab_name == get_current_notes_tab()
+
+    # Выбираем вкладку, на которую переключимся после удаления
+    try:
+        idx = notes_tabs_order.index(tab_name)
+    except ValueError:
+        idx = 0
+
+    next_tab = None
+    if idx > 0:
+        next_tab = notes_tabs_order[idx - 1]
+    elif idx + 1 < len(notes_tabs_order):
+        next_tab = notes_tabs_order[idx + 1]
+
+    # Удаляем данные и UI; заметки — через хранилище, чтобы подписчики
+    # (индексы, напоминания) получили note_removed по каждой
+    if tab_name in notes_by_tab:
+        store_clear_notes_tab(tab_name)
+        del notes_by_tab[tab_name]
+    if tab_name in notes_frames:
+        _canvas_layouts.pop(notes_frames.pop(tab_name), None)
+    if tab_name in notes_tabs_order:
+        notes_tabs_order.remove(tab_name)
+    notes_tab_keys.pop(tab_name, None)
+
+    if notes_tabview is not None:
+        try:
+            notes_tabview.delete(tab_name)
+        except Exception:
+            pass
+
+    if not notes_tabs_order:
+        ensure_notes_tab("Заметки", switch_to=True)
+    elif was_current:
+        set_current_notes_tab(next_tab or notes_tabs_order[0])
+
+
+def move_notes_tab(name: str, new_index: int):
+    """Перенос вкладки заметок: в БД меняется position только у неё."""
+    if name not in notes_by_tab or notes_tabs_order.index(name) == new_index:
+        return
+    move_ordered(notes_tabs_order, notes_tab_keys, name, new_index)
+    if notes_tabview is not None:
+        move_tabview_tab(notes_tabview, name, notes_tabs_order.index(name))
+    emit("tab_changed", tab=name, change="moved")
+
+
+def _set_notes_tab_key(name: str, key: int):
+    notes_tabs_order.remove(name)
+    index = insert_ordered(notes_tabs_order, notes_tab_keys, name, key)
+    if notes_tabview is not None:
+        move_tabview_tab(notes_tabview, name, index)
+
+
+def rename_notes_tab_ui(old_name: str, new_name: str):
+    """Меняет имя вкладки заметок в памяти и UI; id в БД остаётся прежним."""
+    global notes_active_tab
+    notes_by_tab[new_name] = notes_by_tab.pop(old_name)
+    notes_tabs_order[notes_tabs_order.index(old_name)] = new_name
+    notes_tab_keys[new_name] = notes_tab_keys.pop(old_name)
+    if old_name in _note_tabs_saved:
+        _note_tabs_saved[new_name] = _note_tabs_saved.pop(old_name)
+    tab_id = note_tab_ids.pop(old_name, None)
+    if tab_id is not None:
+        remember_note_tab(new_name, tab_id)
+    if old_name in notes_frames:
+        notes_frames[new_name] = notes_frames.pop(old_name)
+    if notes_active_tab == old_name:
+        notes_active_tab = new_name
+    notes_tab_allocator.note(new_name)
+    if notes_tabview is not None:
+        rename_tabview_tab(notes_tabview, old_name, new_name)
+
+
+def rename_notes_tab(name: str):
+    if name not in notes_by_tab:
+        return
+    new_name = ask_tab_name("Переименовать вкладку", name)
+    if new_name is None:
+        return
+    if new_name in notes_by_tab:
+        show_status("❌ Вкладка с таким именем уже есть", 2500)
+        return
+
+    tab_id = note_tab_ids.get(name)
+    if tab_id is not None:
+        try:
+            with write_transaction() as conn:
+                conn.execute("UPDATE note_tabs SET name=? WHERE id=?", (new_name, tab_id))
+                log_change(conn, "note_tabs", "*", "update")
+        except sqlite3.IntegrityError:
+            show_status("❌ Имя занято вкладкой из другого окна", 3000)
+            return
+    rename_notes_tab_ui(name, new_name)
+    emit("tab_changed", tab=new_name, change="renamed", saved=tab_id is not None)
+    show_status("✓ Вкладка переименована")
+
+
+def on_notes_tab_changed(_value=None):
+    global notes_active_tab
+    notes_active_tab = get_current_notes_tab()
+    record_action("select_notes_tab", name=notes_active_tab)
+    redraw_notes()
+
+
+def visible_notes(tab_name: str) -> list:
+    """Заметки вкладки в порядке показа: закреплённые сверху, с учётом фильтра и поиска."""
+    tab_notes = notes_by_tab.get(tab_name, [])
+    allowed = filtered_note_ids()
+    if allowed is not None:
+        tab_notes = [note for note in tab_notes if id(note) in allowed]
+    return [
+        note for note in sorted(tab_notes, key=lambda n: not n.get("pinned", False))
+        if not notes_search_text or notes_search_text in note_search_text(note)
+    ]
+
+
+def redraw_notes():
+    tab_name = get_current_notes_tab()
+    frame = notes_frames.get(tab_name)
+    if not frame:
+        return
+
+    if isinstance(frame, ctk.CTkCanvas):
+        draw_notes_canvas(frame, tab_name, visible_notes(tab_name))
+        return
+
+    for widget in frame.winfo_children():
+        widget.destroy()
+    for number, note in enumerate(visible_notes(tab_name), 1):
+        create_note_widget(number, note)
+
+
+def _redraw_on_events(events):
+    # Перерисовываем экран один раз на пачку и только если она его касается
+    # (перенос вкладки карточек не меняет; после переименования у карточек старое имя вкладки)
+    current = get_current_notes_tab()
+    for event in events:
+        if event["kind"] in ("notes_reloaded", "search_changed", "filter_changed"):
+            break
+        if event["kind"] == "tab_changed" and event["change"] == "moved":
+            continue
+        if event["kind"] == "tab_changed" or event.get("tab") == current:
+            break
+    else:
+        return
+    redraw_notes()
+
+
+subscribe(_redraw_on_events)
+
+
+def update_search(event=None):
+    text = search_entry.get().lower()
+    if text != notes_search_text:
+        record_action("search", text=text)
+    store_set_search(text)
+
+
+def note_display_text(number: int, note: dict) -> str:
+    date_str = note.get("date", "")
+    time_start = (note.get("time_start") or "").strip()
+    time_end = (note.get("time_end") or "").strip()
+
+    time_part = ""
+    if time_start or time_end:
+        if time_start and time_end:
+            time_part = f" {time_start}-{time_end}"
+        elif time_start:
+            time_part = f" {time_start}"
+        else:
+            time_part = f" {time_end}"
+
+    meta = f"{date_str}{time_part}".strip()
+    tags = tags_label(note.get("tags"))
+    if tags:
+        meta = f"{meta}  {tags}".strip()
+    # Длинная заметка в списке — превью; весь текст только у развёрнутой
+    text = note.get("text", "") if id(note) in expanded_notes else note_preview(note)
+    if meta:
+        return f"{number}. {text}  ({meta})"
+    return f"{number}. {text}"
+
+
+def toggle_note_expanded(note: dict):
+    """Разворачивает/сворачивает длинную заметку (короткие не меняются)."""
+    if not note_is_long(note):
+        return
+    if id(note) in expanded_notes:
+        expanded_notes.discard(id(note))
+    else:
+        expanded_notes.add(id(note))
+    redraw_notes()
+
+
+def note_text_color(note: dict) -> str | None:
+    """Если закреплено — оранжевый текст, если выполнено — зелёный, иначе None (цвет темы)."""
+    if note.get("pinned"):
+        return "#ff8c1a"
+    if note.get("done"):
+        return "#00ff7f"
+    return None
+
+
+def note_action(tab_name: str, note: dict, action: str):
+    """Кнопки заметки: up, down, pin, done, tags, delete."""
+    if action != "tags":  # теги пишутся после ввода, в edit_note_tags
+        record_action("note_action", tab=tab_name, index=notes_by_tab[tab_name].index(note), button=action)
+    if action == "done":
+        store_update_note(tab_name, note, done=not note.get("done", False))
+    elif action == "pin":
+        store_update_note(tab_name, note, pinned=not note.get("pinned", False))
+    elif action == "up":
+        store_move_note(tab_name, note, notes_by_tab[tab_name].index(note) - 1)
+    elif action == "down":
+        store_move_note(tab_name, note, notes_by_tab[tab_name].index(note) + 1)
+    elif action == "tags":
+        edit_note_tags(tab_name, note)
+    elif action == "delete":
+        store_remove_note(tab_name, note)
+
+
+def create_note_widget(number, note):
+    tab_name = get_current_notes_tab()
+    parent = notes_frames.get(tab_name)
+    if not parent:
+        return
+
+    frame = ctk.CTkFrame(parent, fg_color=note.get("color", "#2b2b2b"))
+    frame.pack(fill="x", pady=5)
+
+    label = ctk.CTkLabel(
+        frame, text=note_display_text(number, note), font=get_notes_font(), anchor="w", justify="left",
+        wraplength=NOTE_WRAP_PX if id(note) in expanded_notes else 0,
+    )
+    label.pack(side="left", padx=10, fill="x", expand=True)
+    if note_is_long(note):
+        label.bind("<Button-1>", lambda _e: toggle_note_expanded(note))
+    label.configure(text_color=note_text_color(note) or theme_color("CTkLabel", "text_color", "gray84"))
+
+    for txt, action in NOTE_ACTIONS:
+        ctk.CTkButton(
+            frame, text=txt, width=40, height=32, command=lambda a=action: note_action(tab_name, note, a)
+        ).pack(side="right", padx=3)
+
+
+# ---------------- ОТРИСОВКА ЗАМЕТОК НА ХОЛСТЕ ----------------
+# Список заметок вкладки рисуется на одном Canvas: у заметки прямоугольник
+# её цвета, текст и строка значков действий — три элемента холста вместо
+# фрейма, надписи и пяти кнопок. Действие по клику находится по координатам
+# (строка — бинарным поиском по верхним краям, значок — по смещению в строке
+# значков). Цвета темы берутся из кэша, а не из ThemeManager для каждой заметки.
+# Длинная заметка рисуется превью; клик по её тексту разворачивает/сворачивает.
+# settings["notes_renderer"] = "widgets" возвращает прежние карточки.
+
+NOTES_RENDERERS = {"Холст": "canvas", "Виджеты": "widgets"}
+NOTE_CARD_PAD = 10
+NOTE_CARD_GAP = 10
+NOTE_ACTIONS = [("⬆️", "up"), ("⬇️", "down"), ("📌", "pin"), ("✔️", "done"), ("🏷", "tags"), ("🗑", "delete")]
+NOTE_ACTIONS_SEP = "   "
+NOTE_WRAP_PX = 640  # ширина переноса развёрнутой заметки в карточке-виджете
+
+_theme_colors: dict = {}
+# холст -> (вкладка, верхние края строк, строки (низ, заметка), границы значков)
+_canvas_layouts: dict = {}
+_canvas_redraw: dict = {"after_id": None}
+
+
+def theme_color(widget: str, key: str, fallback: str) -> str:
+    """Цвет темы для текущего режима оформления (пары [светлый, тёмный] разворачиваются)."""
+    mode = ctk.get_appearance_mode()
+    color = _theme_colors.get((widget, key, mode))
+    if color is None:
+        value = ctk.ThemeManager.theme.get(widget, {}).get(key)
+        if isinstance(value, (list, tuple)):
+            value = value[1 if mode == "Dark" else 0]
+        color = _theme_colors[(widget, key, mode)] = (
+            value if isinstance(value, str) and value != "transparent" else fallback
+        )
+    return color
+
+
+def uses_notes_canvas() -> bool:
+    return settings.get("notes_renderer", "canvas") == "canvas"
+
+
+def build_notes_canvas(parent) -> ctk.CTkCanvas:
+    holder = ctk.CTkFrame(parent, fg_color="transparent")
+    holder.pack(fill="both", expand=True)
+    canvas = ctk.CTkCanvas(holder, highlightthickness=0, bd=0, yscrollincrement=20,
+                           bg=theme_color("CTkFrame", "fg_color", "gray17"))
+    scrollbar = ctk.CTkScrollbar(holder, command=canvas.yview)
+    scrollbar.pack(side="right", fill="y")
+    canvas.pack(side="left", fill="both", expand=True)
+    canvas.configure(yscrollcommand=scrollbar.set)
+
+    canvas.bind("<Button-1>", _on_notes_canvas_click)
+    canvas.bind("<Configure>", _on_notes_canvas_resize)
+    canvas.bind("<MouseWheel>", lambda e: canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+    canvas.bind("<Button-4>", lambda e: canvas.yview_scroll(-1, "units"))
+    canvas.bind("<Button-5>", lambda e: canvas.yview_scroll(1, "units"))
+    return canvas
+
+
+def _note_actions_bounds(text: str) -> list:
+    """Правые края значков в строке text (в пикселях от её начала)."""
+    bounds = []
+    prefix = ""
+    for index, (icon, action) in enumerate(NOTE_ACTIONS):
+        prefix += (NOTE_ACTIONS_SEP if index else "") + icon
+        # клик в промежутке относим к значку слева от середины промежутка
+        bounds.append((notes_font.measure(prefix + NOTE_ACTIONS_SEP[:len(NOTE_ACTIONS_SEP) // 2]), action))
+    return bounds
+
+
+def draw_notes_canvas(canvas, tab_name: str, notes: list):
+    canvas.delete("all")
+    canvas.configure(bg=theme_color("CTkFrame", "fg_color", "gray17"))
+    width = canvas.winfo_width()
+    if width < 100:
+        width = 600  # ещё не показан — перерисуется по <Configure>
+
+    icons = NOTE_ACTIONS_SEP.join(icon for icon, _action in NOTE_ACTIONS)
+    icons_width = notes_font.measure(icons)
+    line_height = notes_font.metrics("linespace")
+    text_width = max(width - icons_width - 4 * NOTE_CARD_PAD, 50)
+    text_color = theme_color("CTkLabel", "text_color", "gray84")
+
+    tops, rows = [], []
+    y = NOTE_CARD_GAP // 2
+    for number, note in enumerate(notes, 1):
+        text_id = canvas.create_text(
+            2 * NOTE_CARD_PAD, y + NOTE_CARD_PAD, text=note_display_text(number, note),
+            anchor="nw", width=text_width, font=notes_font, fill=note_text_color(note) or text_color,
+        )
+        bbox = canvas.bbox(text_id)
+        text_bottom = bbox[3] if bbox else y + NOTE_CARD_PAD + line_height
+        bottom = max(text_bottom, y + NOTE_CARD_PAD + line_height) + NOTE_CARD_PAD
+        card = canvas.create_rectangle(0, y, width, bottom, fill=note.get("color", "#2b2b2b"), outline="")
+        canvas.tag_lower(card, text_id)
+        canvas.create_text(width - NOTE_CARD_PAD, (y + bottom) / 2, text=icons, anchor="e",
+                           font=notes_font, fill=text_color)
+        tops.append(y)
+        rows.append((bottom, note))
+        y = bottom + NOTE_CARD_GAP
+
+    canvas.configure(scrollregion=(0, 0, width, y))
+    _canvas_layouts[canvas] = (tab_name, tops, rows, width - NOTE_CARD_PAD - icons_width, _note_actions_bounds(icons))
+
+
+def _on_notes_canvas_click(event):
+    canvas = event.widget
+    layout = _canvas_layouts.get(canvas)
+    if layout is None:
+        return
+    tab_name, tops, rows, icons_left, bounds = layout
+    x, y = canvas.canvasx(event.x), canvas.canvasy(event.y)
+    index = bisect.bisect_right(tops, y) - 1
+    if index < 0 or y > rows[index][0]:
+        return
+    if x < icons_left:
+        toggle_note_expanded(rows[index][1])  # клик по тексту
+        return
+    offset = x - icons_left
+    for right, action in bounds:
+        if offset <= right:
+            note_action(tab_name, rows[index][1], action)
+            return
+
+
+def _on_notes_canvas_resize(event):
+    layout = _canvas_layouts.get(event.widget)
+    if layout is None or _canvas_redraw["after_id"] is not None:
+        return
+    if layout[0] != get_current_notes_tab():
+        return  # невидимая вкладка перерисуется при выборе
+
+    def run():
+        _canvas_redraw["after_id"] = None
+        redraw_notes()
+
+    _canvas_redraw["after_id"] = app.after_idle(run)
+
+
+# ---------------- НАПОМИНАНИЯ ----------------
+# Срок заметки — дата + время начала (или окончания, если начала нет).
+# Ближайшие сроки лежат в куче, на её вершину взведён один app.after.
+# Добавление/правка заметки кладёт в кучу новую запись за O(log n); старая
+# запись остаётся и пропускается при выемке — актуальный seq заметки хранится
+# в _reminder_due. Когда устаревших записей больше, чем живых, куча
+# пересобирается. Заметки не опрашиваются: изменения приходят событиями хранилища.
+
+REMINDER_MAX_WAIT_MS = 60 * 60 * 1000  # таймер перевзводится не реже раза в час (сон, перевод часов)
+REMINDER_TOAST_MS = 60 * 1000
+REMINDER_TOAST_LINES = 5
+REMINDER_FIELDS = frozenset({"date", "time_start", "time_end", "done", "text"})
+
+_TIME_RE = re.compile(r"^(\d{1,2})(?:[:.](\d{2}))?$")
+
+_reminder_heap: list = []  # куча (срок, seq, заметка)
+_reminder_due: dict = {}  # id(заметки) -> (seq, срок, заметка)
+_reminders: dict = {"seq": 0, "after_id": None, "armed": None, "toast": None, "toast_after_id": None, "lines": []}
+
+
+@functools.lru_cache(maxsize=4096)
+def _note_day(date_str: str) -> datetime | None:
+    # strptime медленный, а дат у заметок немного — разбор кэшируется
+    try:
+        return datetime.strptime(date_str.strip(), "%d.%m.%Y")
+    except ValueError:
+        return None
+
+
+def note_due_time(date_str: str, time_start: str, time_end: str) -> float | None:
+    """Срок по полям заметки (timestamp) или None, если время не задано/не разобрано."""
+    match = _TIME_RE.match(time_start) or _TIME_RE.match(time_end)
+    if match is None:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    day = _note_day(date_str)
+    if day is None or hour > 23 or minute > 59:
+        return None
+    return day.replace(hour=hour, minute=minute).timestamp()
+
+
+def note_due(note: dict) -> float | None:
+    if note.get("done"):
+        return None
+    return note_due_time(
+        note.get("date") or "", (note.get("time_start") or "").strip(), (note.get("time_end") or "").strip()
+    )
+
+
+def _next_reminder_seq() -> int:
+    _reminders["seq"] += 1
+    return _reminders["seq"]
+
+
+def schedule_reminder(note: dict):
+    """Ставит (или переставляет) напоминание заметки; прошедшие сроки не ставятся."""
+    due = note_due(note)
+    if due is None or due <= time.time():
+        unschedule_reminder(note)
+        return
+    entry = _reminder_due.get(id(note))
+    if entry is not None and entry[1] == due:
+        return
+    seq = _next_reminder_seq()
+    _reminder_due[id(note)] = (seq, due, note)
+    heapq.heappush(_reminder_heap, (due, seq, note))
+    if len(_reminder_heap) > 2 * len(_reminder_due) + 64:
+        rebuild_reminder_heap()
+
+
+def unschedule_reminder(note: dict):
+    # запись в куче станет устаревшей и отбросится при выемке
+    _reminder_due.pop(id(note), None)
+
+
+def rebuild_reminder_heap():
+    _reminder_heap[:] = [(due, seq, note) for seq, due, note in _reminder_due.values()]
+    heapq.heapify(_reminder_heap)
+
+
+def rebuild_reminders():
+    """Все сроки заново (после загрузки или изменений из другого окна) — O(n)."""
+    _reminder_due.clear()
+    now = time.time()
+    for tab_notes in notes_by_tab.values():
+        for note in tab_notes:
+            due = note_due(note)
+            if due is not None and due > now:
+                _reminder_due[id(note)] = (_next_reminder_seq(), due, note)
+    rebuild_reminder_heap()
+
+
+def _reminder_is_live(entry: tuple) -> bool:
+    current = _reminder_due.get(id(entry[2]))
+    return current is not None and current[0] == entry[1]
+
+
+def arm_reminders():
+    """Взводит единственный таймер на ближайший срок."""
+    while _reminder_heap and not _reminder_is_live(_reminder_heap[0]):
+        heapq.heappop(_reminder_heap)
+    due = _reminder_heap[0][0] if _reminder_heap else None
+    if due == _reminders["armed"] and _reminders["after_id"] is not None:
+        return
+    if _reminders["after_id"] is not None:
+        try:
+            app.after_cancel(_reminders["after_id"])
+        except Exception:
+            pass
+        _reminders["after_id"] = None
+    _reminders["armed"] = due
+    if due is not None:
+        delay = min(max(0, int((due - time.time()) * 1000)), REMINDER_MAX_WAIT_MS)
+        _reminders["after_id"] = app.after(delay, fire_reminders)
+
+
+def fire_reminders():
+    _reminders["after_id"] = _reminders["armed"] = None
+    now = time.time()
+    fired = []
+    while _reminder_heap and _reminder_heap[0][0] <= now:
+        entry = heapq.heappop(_reminder_heap)
+        if _reminder_is_live(entry):
+            del _reminder_due[id(entry[2])]
+            fired.append(entry[2])
+    if fired:
+        show_reminders(fired)
+    arm_reminders()
+
+
+def _reminders_on_events(events):
+    if any(event["kind"] == "notes_reloaded" for event in events):
+        rebuild_reminders()
+    else:
+        for event in events:
+            kind = event["kind"]
+            if kind == "note_removed":
+                unschedule_reminder(event["note"])
+            elif kind == "note_added" or (kind == "note_updated" and event["fields"] & REMINDER_FIELDS):
+                schedule_reminder(event["note"])
+    arm_reminders()
+
+
+subscribe(_reminders_on_events)
+
+
+def _note_tab_name(note: dict) -> str | None:
+    for tab_name, tab_notes in notes_by_tab.items():
+        if any(n is note for n in tab_notes):
+            return tab_name
+    return None
+
+
+def open_note_tab(note: dict):
+    tab_name = _note_tab_name(note)
+    show_frame("notes")
+    if tab_name is not None:
+        set_current_notes_tab(tab_name)
+
+
+def _close_reminder_toast():
+    toast = _reminders["toast"]
+    if _reminders["toast_after_id"] is not None:
+        try:
+            app.after_cancel(_reminders["toast_after_id"])
+        except Exception:
+            pass
+    _reminders["toast"] = _reminders["toast_after_id"] = None
+    _reminders["lines"] = []
+    if toast is not None:
+        try:
+            toast.destroy()
+        except Exception:
+            pass
+
+
+def show_reminders(notes: list):
+    """Окошко поверх приложения со сработавшими напоминаниями (последние REMINDER_TOAST_LINES)."""
+    for note in notes:
+        when = (note.get("time_start") or note.get("time_end") or "").strip()
+        _reminders["lines"].append((f"⏰ {when}  {note_preview(note)}", note))
+        show_status(f"⏰ {note_preview(note)}", 5000, priority=2, key="reminder")
+    del _reminders["lines"][:-REMINDER_TOAST_LINES]
+    try:
+        app.bell()
+    except Exception:
+        pass
+
+    toast = _reminders["toast"]
+    try:
+        if toast is None or not toast.winfo_exists():
+            toast = _reminders["toast"] = ctk.CTkToplevel(app)
+            toast.title("Напоминание")
+            toast.attributes("-topmost", True)
+            toast.protocol("WM_DELETE_WINDOW", _close_reminder_toast)
+            toast.geometry(f"+{app.winfo_rootx() + max(app.winfo_width() - 420, 0)}+{app.winfo_rooty() + 80}")
+        for widget in toast.winfo_children():
+            widget.destroy()
+        for text, note in _reminders["lines"]:
+            ctk.CTkButton(
+                toast, text=text, anchor="w", font=emoji_font, width=380,
+                fg_color="transparent", command=lambda n=note: (_close_reminder_toast(), open_note_tab(n)),
+            ).pack(fill="x", padx=10, pady=(8, 0))
+        ctk.CTkButton(toast, text="Закрыть", command=_close_reminder_toast).pack(pady=10)
+    except Exception:
+        return  # окно не создалось — остаётся сообщение в статусе
+
+    if _reminders["toast_after_id"] is not None:
+        try:
+            app.after_cancel(_reminders["toast_after_id"])
+        except Exception:
+            pass
+    _reminders["toast_after_id"] = app.after(REMINDER_TOAST_MS, _close_reminder_toast)
+
+
+# ---------------- ИСТОРИЯ ПРАВОК ДОКУМЕНТОВ ----------------
+# Встроенный стек undo у Text без ограничения растёт и пропадает при
+# перезапуске. Вместо него команда Text-виджета подменяется прокси: вставки
+# и удаления пишутся в UndoJournal вкладки, "edit undo/redo/separator"
+# (Ctrl+Z, <<Undo>> и т.п.) обслуживает журнал.
+# Шаг истории — группа операций ("i"/"d", начало, конец, текст). В памяти
+# лежат последние шаги всех документов в пределах settings["undo_memory_mb"];
+# при сохранении документа его журнал дописывается в undo_journal той же
+# транзакцией, а старые шаги из памяти выбрасываются — при Ctrl+Z они
+# дочитываются из БД. undo_heads хранит версию документа, на которой журнал
+# кончается: если документ менялся в другом окне, старая история не
+# применяется.
+
+UNDO_GROUP_MS = 1000       # пауза, после которой ввод начинает новый шаг
+UNDO_MAX_STEPS = 5000      # шагов одного документа в БД
+UNDO_LOAD_STEPS = 200      # шагов, дочитываемых из БД за раз
+UNDO_OP_BYTES = 100        # оценка накладных расходов на операцию
+UNDO_BYTES_PER_CHAR = 2
+UNDO_SPILL_DELAY_MS = 2000
+NOTE_ENTRY_MAXUNDO = 100   # поле ввода заметки — обычный стек Text с пределом
+UNDO_MEMORY_CHOICES = {"1 МБ": 1, "4 МБ": 4, "16 МБ": 16, "64 МБ": 64}
+
+undo_journals: list = []
+_undo_spill: dict = {"after_id": None}
+
+
+def _op_size(text: str) -> int:
+    return len(text) * UNDO_BYTES_PER_CHAR + UNDO_OP_BYTES
+
+
+def pack_undo_ops(ops: list) -> bytes:
+    return zlib.compress(json.dumps(ops, ensure_ascii=False).encode("utf-8"))
+
+
+def unpack_undo_ops(blob: bytes) -> list:
+    return [tuple(op) for op in json.loads(zlib.decompress(blob).decode("utf-8"))]
+
+
+def _group(ops: list, seq: int | None = None) -> dict:
+    return {"ops": ops, "size": sum(_op_size(op[3]) for op in ops), "seq": seq}
+
+
+def _continues(prev: tuple, op: tuple) -> bool:
+    """op продолжает ввод prev: та же операция в том же месте."""
+    if op[0] != prev[0]:
+        return False
+    if op[0] == "i":
+        return op[1] == prev[2]
+    return op[2] == prev[1] or op[1] == prev[1]  # Backspace / Delete
+
+
+def _merged(prev: tuple, op: tuple) -> tuple | None:
+    """Непрерывный ввод и Backspace сливаются в одну операцию."""
+    if op[0] == "i":
+        return ("i", prev[1], op[2], prev[3] + op[3])
+    if op[2] == prev[1]:
+        return ("d", op[1], prev[2], op[3] + prev[3])
+    return None
+
+
+class UndoJournal:
+    """История правок одной вкладки документа.
+
+    undo/redo — стеки шагов {"ops", "size", "seq"}; seq — номер строки в
+    undo_journal (None — шаг ещё не записан). Записанные шаги всегда внизу
+    стека undo, незаписанные — сверху.
+    """
+
+    def __init__(self, tab_data: dict):
+        self.tab_data = tab_data
+        self.text = tab_data["textbox"]._textbox
+        self.undo: list[dict] = []
+        self.redo: list[dict] = []
+        self.size = 0
+        self.open = False          # верхний шаг ещё принимает ввод
+        self.last_time = 0.0
+        self.dropped: list[int] = []  # записанные шаги, отменённые после записи
+        self.redo_dirty = False
+        self.redo_on_disk = False  # стек redo из БД ещё не прочитан
+        self.dirty = False
+        self.base_version = None   # версия документа, на которой кончается журнал в БД
+        self.tracking = True
+        self.replaying = False
+        self.edits = 0             # счётчик правок пользователя (сверка с файлом на диске)
+        self._widget = str(self.text)
+        self._orig = self._widget + "_orig"
+        self._callback = None
+        try:
+            self._install()
+        except Exception:
+            pass  # без прокси правки просто не попадают в историю
+        undo_journals.append(self)
+
+    # --- прокси команды виджета ---
+
+    def _install(self):
+        tk = self.text.tk
+        self._callback = self.text.register(self._dispatch)
+        tk.call("rename", self._widget, self._orig)
+        # Ошибку Tcl возвращаем кодом, а не исключением из колбэка:
+        # привязки Tk ловят её через catch, как у обычного виджета
+        tk.call("proc", self._widget, "args",
+                f"lassign [{self._callback} {{*}}$args] code result\nreturn -code $code $result")
+
+    def close(self):
+        if self in undo_journals:
+            undo_journals.remove(self)
+        if self._callback is None:
+            return
+        try:
+            tk = self.text.tk
+            tk.call("rename", self._widget, "")
+            tk.call("rename", self._orig, self._widget)
+            self.text.deletecommand(self._callback)
+        except Exception:
+            pass
+        self._callback = None
+
+    def _call(self, *args):
+        return self.text.tk.call(self._orig, *args)
+
+    def _dispatch(self, *args):
+        try:
+            return 0, self.handle(args)
+        except Exception as e:
+            return 1, str(e)
+
+    def handle(self, args: tuple):
+        if not args:
+            return self._call()
+        op = args[0]
+        if op == "edit" and len(args) > 1:
+            sub = args[1]
+            if sub == "undo":
+                return self.undo_step()
+            if sub == "redo":
+                return self.redo_step()
+            if sub == "separator":
+                self.open = False
+                return ""
+            if sub == "reset":
+                self.forget()
+                return ""
+            if sub == "canundo":
+                return int(bool(self.undo) or self._disk_usable())
+            if sub == "canredo":
+                return int(bool(self.redo) or self.redo_on_disk)
+        if op not in ("insert", "delete", "replace") or str(self._call("cget", "-state")) == "disabled":
+            return self._call(*args)
+        if not self.tracking or self.replaying:
+            return self._modify(*args)
+        if op == "insert":
+            return self._insert(args[1], args[2:])
+        if op == "delete":
+            return self._delete(args[1:])
+        # replace = удаление и вставка одним шагом
+        start = self._call("index", args[1])
+        self.open = False
+        self._delete(args[1:3])
+        result = self._insert(start, args[3:], join=True)
+        self.open = False
+        return result
+
+    def _index(self, index) -> str:
+        return str(self._call("index", index))
+
+    def _modify(self, *args):
+        """insert/delete/replace в виджет; подсветке — первая задетая строка."""
+        indices = args[1:] if args[0] == "delete" else args[1:2]
+        first = min(_line_of(self._index(index)) for index in indices)
+        result = self._call(*args)
+        highlighter = self.tab_data.get("highlighter")
+        if highlighter is not None:
+            highlighter.edited(first)
+        return result
+
+    def _compare(self, a, op: str, b) -> bool:
+        return self.text.tk.getboolean(self._call("compare", a, op, b))
+
+    def _insert(self, index, chunks: tuple, join: bool = False):
+        text = "".join(str(chunk) for chunk in chunks[::2])
+        start = self._index(index)
+        if self._compare(start, "==", "end"):
+            start = self._index("end-1c")  # Tk вставляет перед последним переводом строки
+        # метка с правой гравитацией уезжает в конец вставленного текста
+        self._call("mark", "set", "undo_end", start)
+        result = self._modify("insert", start, *chunks)
+        if text:
+            self._record(("i", start, self._index("undo_end"), text), join)
+        return result
+
+    def _delete(self, indices: tuple):
+        if len(indices) > 2:
+            # несколько диапазонов: удаляем с конца, чтобы индексы не съезжали
+            ranges = [(self._index(indices[i]), indices[i + 1] if i + 1 < len(indices) else None)
+                      for i in range(0, len(indices), 2)]
+            ranges.sort(key=lambda r: tuple(int(p) for p in r[0].split(".")), reverse=True)
+            for start, end in ranges:
+                self._delete((start,) if end is None else (start, end))
+            return ""
+        start = self._index(indices[0])
+        end = self._index(indices[1]) if len(indices) > 1 else self._index(f"{start}+1c")
+        if self._compare(end, ">", "end-1c"):
+            end = self._index("end-1c")  # последний перевод строки Tk не удаляет
+        if not self._compare(start, "<", end):
+            return ""
+        text = str(self._call("get", start, end))
+        result = self._modify("delete", start, end)
+        self._record(("d", start, end, text))
+        return result
+
+    # --- стеки ---
+
+    @property
+    def active(self) -> bool:
+        return self._callback is not None
+
+    def _record(self, op: tuple, join: bool = False):
+        now = time.monotonic()
+        self.edits += 1
+        if self.redo or self.redo_on_disk:
+            self.size -= sum(group["size"] for group in self.redo)
+            self.redo = []
+            self.redo_on_disk = False
+            self.redo_dirty = True
+
+        group = self.undo[-1] if self.open and self.undo and self.undo[-1]["seq"] is None else None
+        auto = self.text.tk.getboolean(self._call("cget", "-autoseparators"))
+        if group is not None and auto and not join:
+            prev = group["ops"][-1]
+            if now - self.last_time > UNDO_GROUP_MS / 1000 or not _continues(prev, op):
+                group = None
+            else:
+                merged = _merged(prev, op)
+                if merged is not None:
+                    group["ops"][-1] = merged
+                    group["size"] += len(op[3]) * UNDO_BYTES_PER_CHAR
+                    self.size += len(op[3]) * UNDO_BYTES_PER_CHAR
+                    self._finish(now)
+                    return
+        if group is None:
+            group = _group([])
+            self.undo.append(group)
+            self.open = True
+        group["ops"].append(op)
+        group["size"] += _op_size(op[3])
+        self.size += _op_size(op[3])
+        self._finish(now)
+
+    def _finish(self, now: float):
+        self.last_time = now
+        self.dirty = True
+        if undo_memory_total() > settings.get("undo_memory_mb", 0) * 1024 * 1024:
+            schedule_undo_spill()
+
+    def _replay(self, ops: list, undo: bool):
+        where = None
+        self.replaying = True
+        try:
+            for kind, start, end, text in (reversed(ops) if undo else ops):
+                if (kind == "i") == undo:
+                    self._modify("delete", start, end)
+                    where = start
+                else:
+                    self._modify("insert", start, text)
+                    where = end
+        finally:
+            self.replaying = False
+        if where is not None:
+            self._call("mark", "set", "insert", where)
+            self._call("see", "insert")
+
+    def undo_step(self):
+        self.open = False
+        if str(self._call("cget", "-state")) == "disabled":
+            return ""
+        if self.redo_on_disk:
+            self._load_redo()
+        if not self.undo:
+            self._load_undo()
+        if not self.undo:
+            return ""
+        group = self.undo.pop()
+        self.edits += 1
+        if group["seq"] is not None:
+            self.dropped.append(group["seq"])
+            group["seq"] = None
+        self._replay(group["ops"], undo=True)
+        self.redo.append(group)
+        self.redo_dirty = self.dirty = True
+        return ""
+
+    def redo_step(self):
+        self.open = False
+        if str(self._call("cget", "-state")) == "disabled":
+            return ""
+        if self.redo_on_disk:
+            self._load_redo()
+        if not self.redo:
+            return ""
+        group = self.redo.pop()
+        self.edits += 1
+        self._replay(group["ops"], undo=False)
+        self.undo.append(group)
+        self.redo_dirty = self.dirty = True
+        return ""
+
+    def reset(self, version: int | None):
+        """Текст заменён версией version из БД: история в памяти сбрасывается,
+        история в БД остаётся доступной, если кончается на той же версии."""
+        self.undo, self.redo, self.dropped = [], [], []
+        self.size = 0
+        self.open = self.dirty = self.redo_dirty = False
+        self.base_version = version
+        self.redo_on_disk = version is not None
+
+    def forget(self):
+        """edit reset: история больше не относится к тексту — и в БД тоже."""
+        self.reset(None)
+        self.base_version = -1  # не совпадёт с undo_heads — журнал перепишется
+        self.redo_on_disk = False
+        self.dirty = True
+
+    @contextmanager
+    def untracked(self):
+        """Правки внутри блока (загрузка текста) не попадают в историю."""
+        self.tracking = False
+        try:
+            yield
+        finally:
+            self.tracking = True
+
+    # --- БД ---
+
+    def _disk_usable(self) -> bool:
+        return self.tab_data.get("id") is not None and self.base_version not in (None, -1)
+
+    def _read(self, query: str, params: tuple) -> list:
+        tab_id = self.tab_data.get("id")
+        with sqlite3.connect(DB_PATH, timeout=10) as conn:
+            head = conn.execute("SELECT version FROM undo_heads WHERE tab_id=?", (tab_id,)).fetchone()
+            if head is None or head[0] != self.base_version:
+                return []  # документ менялся без этого журнала — история не подходит
+            return conn.execute(query, (tab_id,) + params).fetchall()
+
+    def _load_undo(self):
+        if not self._disk_usable():
+            return
+        rows = self._read(
+            "SELECT seq, ops FROM undo_journal WHERE tab_id=? AND stack='undo' ORDER BY seq DESC LIMIT ?",
+            (UNDO_LOAD_STEPS + len(self.dropped),),
+        )
+        rows = [row for row in rows if row[0] not in self.dropped][:UNDO_LOAD_STEPS]
+        for seq, blob in reversed(rows):
+            group = _group(unpack_undo_ops(blob), seq)
+            self.undo.append(group)
+            self.size += group["size"]
+
+    def _load_redo(self):
+        self.redo_on_disk = False
+        if not self._disk_usable():
+            return
+        rows = self._read("SELECT ops FROM undo_journal WHERE tab_id=? AND stack='redo' ORDER BY seq", ())
+        for (blob,) in rows:
+            group = _group(unpack_undo_ops(blob))
+            self.redo.append(group)
+            self.size += group["size"]
+
+    def flush(self, conn, tab_id: int, version: int):
+        """Дописывает журнал в БД в транзакции сохранения документа version."""
+        head = conn.execute("SELECT version FROM undo_heads WHERE tab_id=?", (tab_id,)).fetchone()
+        if (head[0] if head else None) != self.base_version:
+            # в БД чужая или устаревшая история — заменяем своей
+            conn.execute("DELETE FROM undo_journal WHERE tab_id=?", (tab_id,))
+            for group in self.undo:
+                group["seq"] = None
+            self.dropped = []
+            self.redo_dirty = True
+            self.redo_on_disk = False
+        conn.executemany(
+            "DELETE FROM undo_journal WHERE tab_id=? AND stack='undo' AND seq=?",
+            [(tab_id, seq) for seq in self.dropped],
+        )
+        top = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM undo_journal WHERE tab_id=? AND stack='undo'", (tab_id,)
+        ).fetchone()[0]
+        top = max([top] + [group["seq"] for group in self.undo if group["seq"] is not None])
+        rows = []
+        for group in self.undo:
+            if group["seq"] is None:
+                top += 1
+                group["seq"] = top
+                rows.append((tab_id, top, pack_undo_ops(group["ops"])))
+        conn.executemany("INSERT INTO undo_journal(tab_id, stack, seq, ops) VALUES(?, 'undo', ?, ?)", rows)
+        if self.redo_dirty:
+            conn.execute("DELETE FROM undo_journal WHERE tab_id=? AND stack='redo'", (tab_id,))
+            conn.executemany(
+                "INSERT INTO undo_journal(tab_id, stack, seq, ops) VALUES(?, 'redo', ?, ?)",
+                [(tab_id, index, pack_undo_ops(group["ops"])) for index, group in enumerate(self.redo)],
+            )
+        # старше UNDO_MAX_STEPS шагов не храним
+        conn.execute(
+            "DELETE FROM undo_journal WHERE tab_id=? AND stack='undo' AND seq <= ?",
+            (tab_id, top - UNDO_MAX_STEPS),
+        )
+        while self.undo and self.undo[0]["seq"] <= top - UNDO_MAX_STEPS:
+            self.size -= self.undo.pop(0)["size"]
+        conn.execute(
+            "INSERT INTO undo_heads(tab_id, version) VALUES(?, ?) "
+            "ON CONFLICT(tab_id) DO UPDATE SET version=excluded.version",
+            (tab_id, version),
+        )
+        self.base_version = version
+        self.dropped = []
+        self.open = self.dirty = self.redo_dirty = False
+
+    def spill(self) -> bool:
+        """Выбрасывает из памяти самый старый записанный шаг (он остаётся в БД)."""
+        if not self.undo or self.undo[0]["seq"] is None:
+            return False
+        self.size -= self.undo.pop(0)["size"]
+        return True
+
+
+def undo_memory_total() -> int:
+    return sum(journal.size for journal in undo_journals)
+
+
+def flush_undo_journals(conn):
+    """Часть save_all_to_db: журналы сохранённых документов — в ту же транзакцию."""
+    for tab_data in current_tabs.values():
+        journal = tab_data.get("journal")
+        saved = _tabs_saved.get(tab_data.get("id"))
+        if journal is None or saved is None or tab_data.get("loading"):
+            continue
+        if journal.dirty or journal.base_version != saved[0]:
+            journal.flush(conn, tab_data["id"], saved[0])
+
+
+def trim_undo_memory():
+    """Держит историю в памяти в пределах settings["undo_memory_mb"]."""
+    budget = settings.get("undo_memory_mb", 0) * 1024 * 1024
+    journals = sorted(undo_journals, key=lambda journal: journal.size, reverse=True)
+    total = undo_memory_total()
+    for journal in journals:
+        while total > budget and journal.spill():
+            total = undo_memory_total()
+
+
+def schedule_undo_spill():
+    """История в памяти выросла сверх предела: скоро сохраняем документы,
+    после записи в БД старые шаги можно выбросить из памяти."""
+    if _undo_spill["after_id"] is not None:
+        return
+
+    def run():
+        _undo_spill["after_id"] = None
+        save_all_to_db()
+
+    _undo_spill["after_id"] = app.after(UNDO_SPILL_DELAY_MS, run)
+
+
+def reset_undo_history(tab_data: dict, version: int | None):
+    journal = tab_data.get("journal")
+    if journal is not None:
+        journal.reset(version)
+
+
+@contextmanager
+def untracked_edits(tab_data: dict):
+    journal = tab_data.get("journal")
+    if journal is None:
+        yield
+        return
+    with journal.untracked():
+        yield
+
+
+# ----------------ФУНКЦИИ БЛОКНОТА ----------------
+
+
+def create_tab(tab_name: str, text: str = "", filepath: str | None = None, switch_to: bool = True,
+               tab_id: int | None = None, position: int | None = None):
+    """Создаёт вкладку в UI и регистрирует её в current_tabs/tab_order.
+
+    tab_id — id строки в БД (None — документ ещё не сохранялся),
+    position — ключ порядка из БД (None — в конец).
+    """
+    tab_name = document_allocator.allocate(tab_name)
+
+    frame_blocknot.tabs.add(tab_name)
+    tab_frame = frame_blocknot.tabs.tab(tab_name)
+
+    textbox = ctk.CTkTextbox(tab_frame, font=get_editor_font())
+    textbox.pack(fill="both", expand=True, padx=10, pady=10)
+
+    # Ctrl+Z / Ctrl+Y обслуживает UndoJournal, встроенный стек Text не нужен
+    try:
+        textbox._textbox.configure(undo=False)
+    except Exception:
+        pass
+
+    if text:
+        textbox.insert("1.0", text)
+
+    tab_data = {"textbox": textbox, "filepath": filepath, "id": tab_id, "last_used": time.monotonic()}
+    tab_data["journal"] = UndoJournal(tab_data)
+    current_tabs[tab_name] = tab_data
+    if position is None:
+        position = next_order_key(tab_order, tab_order_keys)
+    index = insert_ordered(tab_order, tab_order_keys, tab_name, position)
+    bind_tab_button(frame_blocknot.tabs, tab_name)
+    if index != len(tab_order) - 1:
+        move_tabview_tab(frame_blocknot.tabs, tab_name, index)
+    if tab_id is not None:
+        tab_names_by_id[tab_id] = tab_name
+    attach_highlighter(tab_name)
+    if switch_to:
+        frame_blocknot.tabs.set(tab_name)
+    return tab_name
+
+
+def rename_tab_ui(old_name: str, new_name: str):
+    """Меняет имя вкладки документа в окне; id и строка в БД остаются прежними."""
+    tab_data = current_tabs.pop(old_name)
+    current_tabs[new_name] = tab_data
+    tab_order[tab_order.index(old_name)] = new_name
+    tab_order_keys[new_name] = tab_order_keys.pop(old_name)
+    if tab_data.get("id") is not None:
+        tab_names_by_id[tab_data["id"]] = new_name
+    document_allocator.note(new_name)
+    rename_tabview_tab(frame_blocknot.tabs, old_name, new_name)
+
+
+def rename_document_tab(name: str):
+    """Переименование документа: в БД меняется только имя его строки."""
+    tab_data = current_tabs.get(name)
+    if tab_data is None:
+        return
+    new_name = ask_tab_name("Переименовать вкладку", name)
+    if new_name is None:
+        return
+    if new_name in current_tabs:
+        show_status("❌ Вкладка с таким именем уже есть", 2500)
+        return
+
+    tab_id = tab_data.get("id")
+    if tab_id is not None:
+        try:
+            with write_transaction() as conn:
+                conn.execute("UPDATE tabs SET name=? WHERE id=?", (new_name, tab_id))
+                log_change(conn, "tab", tab_id, "rename")
+        except sqlite3.IntegrityError:
+            show_status("❌ Имя занято документом из другого окна", 3000)
+            return
+    rename_tab_ui(name, new_name)
+    attach_highlighter(new_name)  # язык мог смениться по расширению в имени
+    show_status("✓ Вкладка переименована")
+
+
+def move_document_tab(name: str, new_index: int):
+    """Перенос вкладки документа: в БД меняется position только у неё."""
+    if name not in current_tabs or tab_order.index(name) == new_index:
+        return
+    moved = move_ordered(tab_order, tab_order_keys, name, new_index)
+    move_tabview_tab(frame_blocknot.tabs, name, tab_order.index(name))
+    save_tab_positions(moved)
+
+
+def _set_tab_order_key(name: str, key: int):
+    tab_order.remove(name)
+    index = insert_ordered(tab_order, tab_order_keys, name, key)
+    move_tabview_tab(frame_blocknot.tabs, name, index)
+
+def new_tab(user_title: str | None = None):
+    global tab_counter
+
+    # Спрашиваем имя для новой вкладки (если не передано)
+    if user_title is None:
+        dialog = ctk.CTkInputDialog(title="Новая вкладка", text="Название вкладки:")
+        user_title = dialog.get_input()
+    user_title = (user_title or "").strip()
+
+    # Если пользователь отменил/ничего не ввёл — даём стандартное имя
+    if not user_title:
+        tab_name = f"Документ {tab_counter}"
+        tab_counter += 1
+    else:
+        tab_name = user_title
+
+    # Уникальность имени обеспечивает create_tab
+    tab_name = create_tab(tab_name, text="", filepath=None, switch_to=True)
+    record_action("new_tab", name=tab_name)
+
+def get_current_textbox():
+    tab_name = frame_blocknot.tabs.get()
+    if tab_name in current_tabs:
+        return current_tabs[tab_name]["textbox"], tab_name
+    return None, None
+
+def save_file():
+    # "Сохранить" сохраняет ВСЁ в SQLite
+    record_action("save")
+    save_all_to_db()
+    save_notes_to_db()
+    show_status("✓ Сохранено")
+
+def save_file_as():
+    textbox, tab_name = get_current_textbox()
+    if textbox is None:
+        return
+    
+    path = filedialog.asksaveasfilename(
+        defaultextension=".txt",
+        filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+    )
+    
+    if not path:
+        return
+    
+    tab_data = current_tabs[tab_name]
+    if path == tab_data.get("filepath") and file_changed_on_disk(path):
+        if not messagebox.askyesno(
+            "Файл изменён",
+            f"«{os.path.basename(path)}» изменён другой программой после открытия.\n"
+            "Перезаписать его текстом вкладки?",
+        ):
+            return
+
+    tab_data["filepath"] = path
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(textbox.get("1.0", "end-1c"))
+    remember_file(path)  # своя запись — не внешнее изменение
+    mark_file_synced(tab_data)
+    attach_highlighter(tab_name)  # язык мог смениться по расширению
+
+    # Дополнительно фиксируем состояние в SQLite
+    save_all_to_db()
+    save_notes_to_db()
+    show_status("✓ Сохранено")
+
+def clear_textbox():
+    textbox, tab_name = get_current_textbox()
+    if textbox:
+        textbox.delete("1.0", "end")
+
+def close_tab():
+    remove_tab(frame_blocknot.tabs.get())
+
+
+def remove_tab(tab_name: str):
+    if tab_name in current_tabs:
+        if tab_name in tab_order:
+            tab_order.remove(tab_name)
+        tab_order_keys.pop(tab_name, None)
+        if current_tabs[tab_name].get("highlighter") is not None:
+            current_tabs[tab_name]["highlighter"].close()
+        if current_tabs[tab_name].get("journal") is not None:
+            current_tabs[tab_name]["journal"].close()
+        tab_names_by_id.pop(current_tabs[tab_name].get("id"), None)
+        del current_tabs[tab_name]
+        frame_blocknot.tabs.delete(tab_name)
+        if not current_tabs:
+            create_tab("Документ 1", text="", filepath=None, switch_to=True)
+        on_blocknot_tab_changed()  # вместо закрытой могла открыться выгруженная
+
+
+def on_app_close():
+    finish_bulk_io_now()
+    save_all_to_db()
+    save_notes_to_db()
+    save_settings_to_db()
+    app.destroy()
+
+
+# Настройки, уже применённые к UI (для применения только изменившегося)
+_applied_settings: dict = {}
+_apply_settings_after_id = None
+
+
+def apply_settings():
+    """Применяет к UI только те настройки, что изменились с прошлого раза."""
+    global _apply_settings_after_id
+    _apply_settings_after_id = None
+
+    def changed(*keys):
+        return any(_applied_settings.get(k) != settings.get(k) for k in keys)
+
+    if changed("theme"):
+        try:
+            ctk.set_appearance_mode(settings["theme"])
+        except Exception:
+            pass
+        restyle_highlighters()
+
+    if changed("always_on_top"):
+        try:
+            app.attributes("-topmost", bool(settings.get("always_on_top", False)))
+        except Exception:
+            pass
+
+    # Виджеты подхватывают изменения шрифта сами — перерисовка не нужна
+    if changed("font_family", "notes_font_size"):
+        try:
+            notes_font.configure(family=settings["font_family"], size=settings["notes_font_size"])
+        except Exception:
+            pass
+
+    if changed("editor_font_size"):
+        try:
+            editor_font.configure(size=settings["editor_font_size"])
+        except Exception:
+            pass
+
+    # Холст раскладывает заметки по размерам шрифта, цвета темы у карточек из кэша
+    if changed("theme") or (uses_notes_canvas() and changed("font_family", "notes_font_size")):
+        redraw_notes()
+
+    _applied_settings.update(settings)
+
+
+def request_apply_settings():
+    """Откладывает apply_settings() до простоя: серия изменений настроек
+    (например, быстрый перебор размеров шрифта) применяется один раз."""
+    global _apply_settings_after_id
+    if _apply_settings_after_id is None:
+        _apply_settings_after_id = app.after_idle(apply_settings)
+
+# ---------------- ПОИСК И ЗАМЕНА ----------------
+# Поиск идёт в фоновом потоке по снимку текстов вкладок; вкладки, чей текст
+# ещё не в окне (распаковывается), читаются прямо из SQLite. Совпадения
+# приходят пачками: список результатов и подсветка растут по мере поиска.
+
+FIND_BATCH = 200         # совпадений в одной пачке из потока
+FIND_MAX_ROWS = 2000     # строк в списке результатов (считаем все)
+FIND_POLL_MS = 30
+
+FIND_COLORS = {
+    "dark": {"find_match": "#5c5000", "find_current": "#a05a00"},
+    "light": {"find_match": "#fff59d", "find_current": "#ffb74d"},
 }
 
-color_var = ctk.StringVar(value="Серый")
+# Виджеты панели поиска (None, пока панель не открывали)
+find_panel = None
+find_entry = None
+replace_entry = None
+find_info_label = None
+find_results_box = None
+find_regex_var = None
+find_case_var = None
+find_all_tabs_var = None
+
+_find_job: dict = {}
+
+
+def compile_find_pattern(query: str, regex: bool, case: bool):
+    flags = re.MULTILINE if regex else 0
+    if not case:
+        flags |= re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+
+def find_matches(pattern, text: str):
+    """Совпадения в тексте: (строка, колонка, строка конца, колонка конца, текст строки)."""
+    line = 1
+    pos = 0
+    for m in pattern.finditer(text):
+        start, end = m.span()
+        if start == end:
+            continue
+        line += text.count("\n", pos, start)
+        pos = start
+        line_start = text.rfind("\n", 0, start) + 1
+        line_end = text.find("\n", start)
+        if line_end < 0:
+            line_end = len(text)
+        end_line = line + text.count("\n", start, end)
+        end_col = end - (text.rfind("\n", 0, end) + 1)
+        yield line, start - line_start, end_line, end_col, text[line_start:line_end]
+
+
+def _find_worker(pattern, sources, out, cancel):
+    """sources — [(имя вкладки, текст или None — тогда текст берётся из БД, id документа)]."""
+    conn = None
+    try:
+        for name, text, tab_id in sources:
+            if text is None:
+                if conn is None:
+                    conn = sqlite3.connect(DB_PATH)
+                row = conn.execute("SELECT content, codec FROM tabs WHERE id=?", (tab_id,)).fetchone()
+                if row is None:
+                    continue
+                text = decode_content(*row)
+            batch = []
+            for match in find_matches(pattern, text):
+                if cancel.is_set():
+                    return
+                batch.append(match)
+                if len(batch) >= FIND_BATCH:
+                    out.put((name, batch))
+                    batch = []
+            if batch:
+                out.put((name, batch))
+    except Exception as e:
+        out.put(("", e))
+    finally:
+        if conn is not None:
+            conn.close()
+        out.put(None)
+
+
+def _find_options():
+    return (
+        find_entry.get(),
+        bool(find_regex_var.get()),
+        bool(find_case_var.get()),
+        bool(find_all_tabs_var.get()),
+    )
+
+
+def _find_target_tabs(all_tabs: bool) -> list:
+    if all_tabs:
+        return list(tab_order)
+    current = frame_blocknot.tabs.get()
+    return [current] if current in current_tabs else []
+
+
+def _set_find_info(text: str):
+    try:
+        find_info_label.configure(text=text)
+    except Exception:
+        pass
+
+
+def _clear_find_results():
+    if _find_job.get("cancel") is not None:
+        _find_job["cancel"].set()
+    _find_job.clear()
+    for tab_data in current_tabs.values():
+        try:
+            tab_data["textbox"]._textbox.tag_remove("find_match", "1.0", "end")
+            tab_data["textbox"]._textbox.tag_remove("find_current", "1.0", "end")
+        except Exception:
+            pass
+    if find_results_box is not None:
+        find_results_box.configure(state="normal")
+        find_results_box.delete("1.0", "end")
+        find_results_box.configure(state="disabled")
+
+
+def start_find(_event=None):
+    """Запускает поиск заново (предыдущий, если ещё идёт, отменяется)."""
+    _clear_find_results()
+    query, regex, case, all_tabs = _find_options()
+    if not query:
+        _set_find_info("")
+        return
+    try:
+        pattern = compile_find_pattern(query, regex, case)
+    except re.error as e:
+        _set_find_info(f"❌ Ошибка в выражении: {e}")
+        return
+
+    # Снимок текстов — в потоке окна, сам поиск — в фоне
+    sources = []
+    for name in _find_target_tabs(all_tabs):
+        tab_data = current_tabs[name]
+        if tab_data.get("loading") or tab_data.get("unloaded"):
+            text = None
+        else:
+            text = tab_data["textbox"].get("1.0", "end-1c")
+        sources.append((name, text, tab_data.get("id")))
+
+    _find_job.update(
+        cancel=threading.Event(),
+        queue=queue.SimpleQueue(),
+        matches=[],  # (имя вкладки, строка, колонка, строка конца, колонка конца)
+        cursor=-1,
+        tag_backlog=[],
+        tag_after_id=None,
+    )
+    threading.Thread(
+        target=_find_worker,
+        args=(pattern, sources, _find_job["queue"], _find_job["cancel"]),
+        daemon=True,
+    ).start()
+    _set_find_info("🔍 Поиск...")
+    app.after(FIND_POLL_MS, _poll_find_results, _find_job["cancel"])
+
+
+def _poll_find_results(cancel):
+    if _find_job.get("cancel") is not cancel:
+        return  # поиск отменён или перезапущен
+    finished = False
+    while True:
+        try:
+            item = _find_job["queue"].get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            finished = True
+            break
+        name, batch = item
+        if isinstance(batch, Exception):
+            _set_find_info(f"❌ Поиск прерван: {batch}")
+            return
+        _add_find_batch(name, batch)
+
+    count = len(_find_job["matches"])
+    if finished:
+        _set_find_info(f"Найдено: {count}" if count else "Ничего не найдено")
+    else:
+        _set_find_info(f"🔍 Найдено: {count}...")
+        app.after(FIND_POLL_MS, _poll_find_results, cancel)
+
+
+def _add_find_batch(name: str, batch: list):
+    matches = _find_job["matches"]
+    first_row = len(matches)
+    rows = []
+    for line, col, end_line, end_col, text in batch:
+        matches.append((name, line, col, end_line, end_col))
+        if len(matches) <= FIND_MAX_ROWS:
+            rows.append(f"{name}:{line}: {text.strip()[:120]}\n")
+    if rows and find_results_box is not None:
+        find_results_box.configure(state="normal")
+        find_results_box.insert("end", "".join(rows))
+        find_results_box.configure(state="disabled")
+    _tag_find_matches(name, matches[first_row:])
+
+
+def _tag_find_matches(name: str, found: list):
+    """Подсветка совпадений: на экране — сразу, остальное — в простое."""
+    tab_data = current_tabs.get(name)
+    if tab_data is None:
+        return
+    text = tab_data["textbox"]._textbox
+    colors = FIND_COLORS.get(settings.get("theme"), FIND_COLORS["dark"])
+    try:
+        for tag, color in colors.items():
+            text.tag_configure(tag, background=color)
+        text.tag_raise("sel")
+    except Exception:
+        pass
+
+    top, bottom = 1, 0
+    if name == frame_blocknot.tabs.get():
+        try:
+            top = _line_of(text.index("@0,0"))
+            bottom = _line_of(text.index(f"@0,{text.winfo_height()}"))
+        except Exception:
+            pass
+    visible = []
+    for _name, line, col, end_line, end_col in found:
+        indexes = (f"{line}.{col}", f"{end_line}.{end_col}")
+        if top <= line <= bottom:
+            visible.extend(indexes)
+        else:
+            _find_job["tag_backlog"].append((text, indexes))
+    if visible:
+        text.tag_add("find_match", *visible)
+    if _find_job["tag_backlog"] and _find_job["tag_after_id"] is None:
+        _find_job["tag_after_id"] = app.after_idle(_drain_find_tags, _find_job["cancel"])
+
+
+def _drain_find_tags(cancel):
+    if _find_job.get("cancel") is not cancel:
+        return
+    _find_job["tag_after_id"] = None
+    backlog = _find_job["tag_backlog"]
+    chunk, _find_job["tag_backlog"] = backlog[:FIND_BATCH], backlog[FIND_BATCH:]
+    by_text: dict = {}
+    for text, indexes in chunk:
+        by_text.setdefault(text, []).extend(indexes)
+    for text, indexes in by_text.items():
+        try:
+            text.tag_add("find_match", *indexes)
+        except Exception:
+            pass
+    if _find_job["tag_backlog"]:
+        _find_job["tag_after_id"] = app.after_idle(_drain_find_tags, cancel)
+
+
+def show_find_match(index: int):
+    matches = _find_job.get("matches") or []
+    if not 0 <= index < len(matches):
+        return
+    _find_job["cursor"] = index
+    name, line, col, end_line, end_col = matches[index]
+    tab_data = current_tabs.get(name)
+    if tab_data is None:
+        return
+    frame_blocknot.tabs.set(name)
+    on_blocknot_tab_changed()
+    if tab_data.get("loading"):
+        app.after(BACKGROUND_POLL_MS, show_find_match, index)  # текст ещё распаковывается
+        return
+    textbox = tab_data["textbox"]
+    start, end = f"{line}.{col}", f"{end_line}.{end_col}"
+    try:
+        textbox._textbox.tag_remove("find_current", "1.0", "end")
+        textbox._textbox.tag_add("find_current", start, end)
+        textbox.mark_set("insert", end)
+        textbox.see(start)
+        textbox.focus_set()
+    except Exception:
+        pass
+    _set_find_info(f"Совпадение {index + 1} из {len(matches)}")
+
+
+def find_next(_event=None):
+    if not _find_job:
+        start_find()
+        return
+    matches = _find_job.get("matches") or []
+    if matches:
+        show_find_match((_find_job["cursor"] + 1) % len(matches))
+
+
+def _on_find_result_click(event):
+    try:
+        row = _line_of(find_results_box._textbox.index(f"@{event.x},{event.y}")) - 1
+    except Exception:
+        return
+    show_find_match(row)
+
+
+def _replace_text_as_one_edit(textbox, text: str):
+    """Заменяет весь текст так, что Ctrl+Z откатывает замену одним шагом."""
+    inner = textbox._textbox
+    insert_at = textbox.index("insert")
+    try:
+        inner.configure(autoseparators=False)
+        inner.edit_separator()
+    except Exception:
+        pass
+    textbox.delete("1.0", "end")
+    textbox.insert("1.0", text)
+    try:
+        inner.edit_separator()
+        inner.configure(autoseparators=True)
+        textbox.mark_set("insert", insert_at)
+        textbox.see(insert_at)
+    except Exception:
+        pass
+
+
+def find_replacement(text: str, regex: bool):
+    """Аргумент repl для pattern.subn: без регулярок замена буквальная,
+    "\\1" и "\\n" не разворачиваются."""
+    if regex:
+        return text
+    return lambda _match: text
+
+
+def replace_all_clicked():
+    query, regex, case, all_tabs = _find_options()
+    if not query:
+        return
+    try:
+        pattern = compile_find_pattern(query, regex, case)
+    except re.error as e:
+        _set_find_info(f"❌ Ошибка в выражении: {e}")
+        return
+    replacement = find_replacement(replace_entry.get(), regex)
+
+    _clear_find_results()
+    # Снимок текстов, как у поиска: выгруженные и ещё не распакованные
+    # вкладки (text=None) читаются из БД в фоне
+    snapshot = []
+    for name in _find_target_tabs(all_tabs):
+        tab_data = current_tabs[name]
+        if tab_data.get("loading") or tab_data.get("unloaded"):
+            text = None
+        else:
+            text = tab_data["textbox"].get("1.0", "end-1c")
+        snapshot.append((name, text, tab_data.get("id")))
+
+    def work():
+        results = []
+        with sqlite3.connect(DB_PATH, timeout=10) as conn:
+            for name, old, tab_id in snapshot:
+                row = None
+                if old is None:
+                    row = conn.execute(
+                        "SELECT content, codec, version, position FROM tabs WHERE id=?", (tab_id,)
+                    ).fetchone()
+                    if row is None:
+                        continue  # документ удалили в другом окне
+                    old = decode_content(row[0], row[1])
+                    row = row[2:]
+                results.append((name, tab_id, old, row) + pattern.subn(replacement, old))
+        return results
+
+    def done(results, error):
+        if error is not None:
+            _set_find_info(f"❌ Замена не выполнена: {error}")
+            return
+        total = changed_tabs = stale = 0
+        for name, tab_id, old, row, new, count in results:
+            if row is not None:
+                name = tab_names_by_id.get(tab_id)  # вкладку могли переименовать
+            tab_data = current_tabs.get(name)
+            if count == 0 or tab_data is None:
+                continue
+            if tab_data.get("loading") or tab_data.get("unloaded"):
+                if row is None:
+                    stale += 1  # вкладку выгрузили, пока считали
+                    continue
+                # Загружаем прочитанный из БД текст, замена — обычная правка:
+                # сохранится с проверкой версии строки, Ctrl+Z её отменит
+                fill_tab_text(name, old, *row)
+            textbox = tab_data["textbox"]
+            if textbox.get("1.0", "end-1c") != old:
+                stale += 1  # пока считали, текст поправили — не затираем
+                continue
+            _replace_text_as_one_edit(textbox, new)
+            attach_highlighter(name)
+            total += count
+            changed_tabs += 1
+        info = f"✓ Заменено: {total} (вкладок: {changed_tabs})"
+        if stale:
+            info += f", пропущено вкладок: {stale}"
+        _set_find_info(info)
+
+    _set_find_info("🔁 Замена...")
+    run_in_background(work, done)
+
+
+def build_find_panel(parent):
+    global find_panel, find_entry, replace_entry, find_info_label, find_results_box
+    global find_regex_var, find_case_var, find_all_tabs_var
+
+    find_panel = ctk.CTkFrame(parent)
+
+    row = ctk.CTkFrame(find_panel, fg_color="transparent")
+    row.pack(fill="x", padx=5, pady=(5, 0))
+
+    find_entry = ctk.CTkEntry(row, placeholder_text="Найти", width=260, font=get_notes_font())
+    find_entry.pack(side="left", padx=5)
+    find_entry.bind("<Return>", start_find)
+
+    replace_entry = ctk.CTkEntry(row, placeholder_text="Заменить на", width=200, font=get_notes_font())
+    replace_entry.pack(side="left", padx=5)
+
+    for text, command in (
+        ("🔍 Найти", start_find),
+        ("▶ Далее", find_next),
+        ("🔁 Заменить всё", replace_all_clicked),
+        ("✖", close_find_panel),
+    ):
+        ctk.CTkButton(row, text=text, width=40, font=emoji_font, command=command).pack(side="left", padx=5)
+
+    options = ctk.CTkFrame(find_panel, fg_color="transparent")
+    options.pack(fill="x", padx=5, pady=5)
+
+    find_regex_var = ctk.BooleanVar(value=False)
+    find_case_var = ctk.BooleanVar(value=False)
+    find_all_tabs_var = ctk.BooleanVar(value=False)
+    for text, variable in (
+        ("Регулярное выражение", find_regex_var),
+        ("Учитывать регистр", find_case_var),
+        ("Во всех вкладках", find_all_tabs_var),
+    ):
+        ctk.CTkCheckBox(options, text=text, variable=variable).pack(side="left", padx=5)
+
+    find_info_label = ctk.CTkLabel(options, text="", font=get_notes_font())
+    find_info_label.pack(side="right", padx=10)
+
+    find_results_box = ctk.CTkTextbox(find_panel, height=110, font=get_editor_font())
+    find_results_box.pack(fill="x", padx=10, pady=(0, 5))
+    find_results_box.configure(state="disabled")
+    find_results_box.bind("<Button-1>", _on_find_result_click)
+
+
+def open_find_panel(_event=None):
+    if current_screen != "blocknot":
+        return None
+    if find_panel is None:
+        build_find_panel(frame_blocknot)
+    find_panel.pack(fill="x", padx=5, pady=(5, 0), before=frame_blocknot.tabs)
+
+    # Выделенный текст сразу подставляем в строку поиска
+    textbox, _tab_name = get_current_textbox()
+    try:
+        selected = textbox.get("sel.first", "sel.last") if textbox is not None else ""
+    except Exception:
+        selected = ""
+    if selected and "\n" not in selected:
+        find_entry.delete(0, "end")
+        find_entry.insert(0, selected)
+    find_entry.focus_set()
+    return "break"
 
-ctk.CTkOptionMenu(
-    input_frame,
-    values=list(colors.keys()),
-    variable=color_var,
-).pack(anchor="w", padx=10, pady=(0, 10))
 
-notes_controls = ctk.CTkFrame(frame_notes)
-notes_controls.pack(fill="x", padx=20, pady=(0, 10))
+def close_find_panel():
+    _clear_find_results()
+    _set_find_info("")
+    if find_panel is not None:
+        find_panel.pack_forget()
 
 
-def add_note():
-    text = note_entry.get("1.0", "end-1c").strip()
-    if not text:
-        return
-    
-    # Ограничение до 20 символов
-    if len(text) > 20:
-        show_status("❌ Максимум 20 символов!", 2000)
-        return
+for _sequence in ("<Control-f>", "<Control-F>", "<Control-Cyrillic_a>", "<Control-Cyrillic_A>"):
+    app.bind(_sequence, open_find_panel)
 
-    date_str = (date_entry.get() or "").strip() or datetime.now().strftime("%d.%m.%Y")
-    time_start = (time_start_entry.get() or "").strip()
-    time_end = (time_end_entry.get() or "").strip()
 
-    tab_name = get_current_notes_tab()
-    notes_by_tab.setdefault(tab_name, [])
-    notes_by_tab[tab_name].append(
-        {
-            "text": text,
-            "done": False,
-            "pinned": False,
-            "date": date_str,
-            "color": colors[color_var.get()],
-            "time_start": time_start,
-            "time_end": time_end,
-        }
-    )
+# ---------- КНОПКИ TOOLBAR ДЛЯ БЛОКНОТА ----------
 
-    note_entry.delete("1.0", "end")
-    time_start_entry.delete(0, "end")
-    time_end_entry.delete(0, "end")
-    save_notes_to_db()
-    redraw_notes()
-    show_status("✓ Заметка сохранена")
+ctk.CTkButton(
+    toolbar,
+    text="✨ Новая вкладка",
+    font=emoji_font,
+    command=new_tab
+).pack(side="left", padx=5)
 
+ctk.CTkButton(
+    toolbar,
+    text="✏ Переименовать",
+    font=emoji_font,
+    command=lambda: rename_document_tab(frame_blocknot.tabs.get())
+).pack(side="left", padx=5)
 
-def move_tabview_tabs_to_bottom(tabview: ctk.CTkTabview):
-    """Пытается перенести кнопки вкладок вниз (если внутренности доступны)."""
-    try:
-        if hasattr(tabview, "_segmented_button") and hasattr(tabview, "_tab_frame"):
-            tabview.grid_rowconfigure(0, weight=1)
-            tabview.grid_rowconfigure(1, weight=0)
-            tabview._tab_frame.grid_forget()
-            tabview._segmented_button.grid_forget()
-            tabview._tab_frame.grid(row=0, column=0, sticky="nsew")
-            tabview._segmented_button.grid(row=1, column=0, sticky="ew", pady=(8, 0))
-    except Exception:
-        pass
+ctk.CTkButton(
+    toolbar,
+    text="💾 Сохранить",
+    font=emoji_font,
+    command=save_file
+).pack(side="left", padx=5)
+
+ctk.CTkButton(
+    toolbar,
+    text="💿 Сохранить как",
+    font=emoji_font,
+    command=save_file_as
+).pack(side="left", padx=5)
 
+ctk.CTkButton(
+    toolbar,
+    text="🔍 Найти",
+    font=emoji_font,
+    command=open_find_panel
+).pack(side="left", padx=5)
+
+ctk.CTkButton(
+    toolbar,
+    text="🗑️ Очистить",
+    font=emoji_font,
+    command=clear_textbox
+).pack(side="left", padx=5)
+
+ctk.CTkButton(
+    toolbar,
+    text="❌ Закрыть вкладку",
+    font=emoji_font,
+    command=close_tab
+).pack(side="left", padx=5)
+
+status_label = ctk.CTkLabel(
+    toolbar,
+    text="",
+    font=("Segoe UI", 16)
+)
+status_label.pack(side="right", padx=10)
+
+status_notifier = StatusNotifier(app, status_label)
 
-def get_current_notes_tab() -> str:
-    return notes_tabview.get()
 
+# ---------------- ИМПОРТ / ЭКСПОРТ ИЗ ОКНА ----------------
+# Файл пишется/читается в фоне; пока он идёт, окно не пишет в БД (данные
+# остаются в памяти и сохраняются сразу после завершения).
 
-def ensure_notes_tab(name: str, switch_to: bool = True):
-    if name in notes_by_tab:
-        if switch_to:
-            notes_tabview.set(name)
+bulk_io: dict = {"thread": None, "cancel": None, "finish": None}
+
+IO_FILETYPES = [
+    ("JSON Lines", "*.jsonl"),
+    ("Markdown", "*.md"),
+    ("CSV (заметки)", "*.csv"),
+]
+
+
+def bulk_io_busy() -> bool:
+    return bulk_io["thread"] is not None
+
+
+def _start_bulk_io(work, finish):
+    cancel = threading.Event()
+
+    def on_done(result, error):
+        if bulk_io["finish"] is None:
+            return  # уже завершено в on_app_close
+        bulk_io.update(thread=None, cancel=None, finish=None)
+        finish(result, error)
+
+    bulk_io["cancel"] = cancel
+    bulk_io["finish"] = on_done
+    bulk_io["thread"] = run_in_background(lambda: work(cancel), on_done)
+
+
+def finish_bulk_io_now():
+    """Останавливает фоновый импорт/экспорт и доводит его до конца сразу."""
+    thread = bulk_io["thread"]
+    if thread is None:
         return
+    bulk_io["cancel"].set()
+    thread.join()
+    on_done = bulk_io["finish"]
+    on_done(None, InterruptedError("Прервано при закрытии"))
 
-    notes_tabview.add(name)
-    tab_frame = notes_tabview.tab(name)
-    scroll = ctk.CTkScrollableFrame(tab_frame)
-    scroll.pack(fill="both", expand=True, padx=0, pady=0)
 
-    notes_by_tab[name] = []
-    notes_frames[name] = scroll
-    notes_tabs_order.append(name)
-    if switch_to:
-        notes_tabview.set(name)
+def _bulk_progress(verb: str):
+    return lambda count: show_status(f"⏳ {verb}: {count}", 3000, key="bulk_io")
 
 
-def new_notes_tab():
-    dialog = ctk.CTkInputDialog(title="Новая вкладка", text="Название вкладки заметок:")
-    name = (dialog.get_input() or "").strip()
-    if not name:
-        name = f"Заметки {len(notes_tabs_order) + 1}"
+def export_data_clicked():
+    if bulk_io_busy():
+        show_status("❌ Уже идёт импорт/экспорт", 2000)
+        return
 
-    if name in notes_by_tab:
-        base = name
-        suffix = 2
-        while f"{base} ({suffix})" in notes_by_tab:
-            suffix += 1
-        name = f"{base} ({suffix})"
+    path = filedialog.asksaveasfilename(defaultextension=".jsonl", filetypes=IO_FILETYPES)
+    if not path:
+        return
 
-    ensure_notes_tab(name, switch_to=True)
+    # Экспортируем то, что сейчас на экране
+    save_all_to_db()
     save_notes_to_db()
-    redraw_notes()
 
+    def finish(count, error):
+        if error is not None:
+            show_status(f"❌ Экспорт: {error}", 4000, key="bulk_io")
+        else:
+            show_status(f"✓ Экспортировано: {count}", 3000, key="bulk_io")
+        save_all_to_db()
+        save_notes_to_db()
 
-ctk.CTkButton(
-    notes_controls,
-    text="✨ Новая вкладка",
-    height=40,
-    font=emoji_font,
-    command=new_notes_tab,
-).pack(side="left")
+    _start_bulk_io(
+        lambda cancel: export_data(path, progress=_bulk_progress("Экспорт"), cancel=cancel),
+        finish,
+    )
 
 
-def delete_current_notes_tab():
-    tab_name = get_current_notes_tab()
+def _max_rowids() -> dict:
+    with sqlite3.connect(DB_PATH) as conn:
+        return {
+            table: conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+            for table in ("note_tabs", "notes", "tabs")
+        }
 
-    # Нельзя удалить последнюю вкладку — тогда просто очищаем
-    if len(notes_tabs_order) <= 1:
-        notes_by_tab[tab_name] = []
-        save_notes_to_db()
-        redraw_notes()
-        show_status("✓ Вкладка очищена")
+
+def merge_imported_rows(marks: dict):
+    """Добавляет в память строки, записанные импортом после отметок marks."""
+    with sqlite3.connect(DB_PATH) as conn:
+        for tab_id, name, position in conn.execute(
+            "SELECT id, name, position FROM note_tabs WHERE id > ? ORDER BY id", (marks["note_tabs"],)
+        ):
+            ensure_notes_tab(name, switch_to=False, position=position)
+            remember_note_tab(name, tab_id)
+
+        for row in conn.execute(
+            f"SELECT {NOTE_COLUMNS} FROM notes WHERE id > ? ORDER BY id", (marks["notes"],)
+        ):
+            add_note_row(row)
+
+        for tab_id, name, position, stored, codec, filepath, version in conn.execute(
+            "SELECT id, name, position, content, codec, filepath, version FROM tabs WHERE id > ? ORDER BY id",
+            (marks["tabs"],),
+        ):
+            add_tab_row(tab_id, name, decode_content(stored, codec), filepath, version, position)
+
+
+def import_data_clicked():
+    if bulk_io_busy():
+        show_status("❌ Уже идёт импорт/экспорт", 2000)
         return
 
-    # Выбираем вкладку, на которую переключимся после удаления
+    path = filedialog.askopenfilename(filetypes=[("Блокнот", "*.jsonl *.md *.csv")] + IO_FILETYPES)
+    if not path:
+        return
+
+    save_all_to_db()
+    save_notes_to_db()
+    marks = _max_rowids()
+
+    def finish(count, error):
+        # Даже при ошибке часть пачек уже записана — подхватываем их
+        merge_imported_rows(marks)
+        save_all_to_db()
+        save_notes_to_db()
+        emit("notes_reloaded", saved=True)
+        if error is not None:
+            show_status(f"❌ Импорт: {error}", 4000, key="bulk_io")
+        else:
+            show_status(f"✓ Импортировано: {count}", 3000, key="bulk_io")
+
+    _start_bulk_io(
+        lambda cancel: import_data(path, progress=_bulk_progress("Импорт"), cancel=cancel),
+        finish,
+    )
+
+
+# ---------------- СИНХРОНИЗАЦИЯ МЕЖДУ ОКНАМИ ----------------
+# Несколько копий программы могут работать с одной БД. Каждая пишет свои
+# правки в change_log, а остальные раз в CHANGE_FEED_POLL_MS проверяют
+# PRAGMA data_version и, если БД менялась, дочитывают только новые записи
+# журнала и только затронутые строки.
+
+CHANGE_FEED_POLL_MS = 1500
+
+_change_feed: dict = {"conn": None, "seq": 0, "data_version": None}
+
+
+def add_note_row(row, index: int | None = None) -> dict:
+    """Кладёт заметку из строки БД (SELECT NOTE_COLUMNS) в notes_by_tab."""
+    tab_name = note_tab_names.get(row[3], "Заметки")
+    ensure_notes_tab(tab_name, switch_to=False)
+    tab_notes = notes_by_tab[tab_name]
+    note = note_from_row(row)
+    if index is None or index >= len(tab_notes):
+        index = len(tab_notes)
+    tab_notes.insert(index, note)
+    _notes_saved[note["id"]] = (row[1], index, row_state(row))
+    return note
+
+
+def _release_tab_name(name: str):
+    """Имя из БД занято здесь ещё не сохранённой вкладкой — переименовываем её,
+    чтобы имена вкладок в окне совпадали с именами в БД."""
+    tab_data = current_tabs.get(name)
+    if tab_data is not None and tab_data.get("id") is None:
+        rename_tab_ui(name, document_allocator.allocate(name))
+
+
+def add_tab_row(tab_id: int, name: str, content: str, filepath, version: int, position: int) -> str:
+    """Создаёт вкладку документа из строки БД и запоминает её как сохранённую."""
+    content = content or ""
+    _release_tab_name(name)
+    name = create_tab(name, text=content, filepath=filepath, switch_to=False, tab_id=tab_id, position=position)
+    remember_tab_row(tab_id, version, position, content, filepath)
+    reset_undo_history(current_tabs[name], version)
+    return name
+
+
+def add_packed_tab_row(tab_id: int, name: str, stored, codec: str, filepath, version: int, position: int) -> tuple:
+    """Вкладка со сжатым текстом: пока пустая и недоступная для правки,
+    текст вставит unpack_tabs_in_background."""
+    _release_tab_name(name)
+    name = create_tab(name, text="", filepath=filepath, switch_to=False, tab_id=tab_id, position=position)
+    tab_data = current_tabs[name]
+    tab_data["loading"] = True
     try:
-        idx = notes_tabs_order.index(tab_name)
-    except ValueError:
-        idx = 0
+        tab_data["textbox"].configure(state="disabled")
+    except Exception:
+        pass
+    return tab_id, stored, codec, version, position
 
-    next_tab = None
-    if idx > 0:
-        next_tab = notes_tabs_order[idx - 1]
-    elif idx + 1 < len(notes_tabs_order):
-        next_tab = notes_tabs_order[idx + 1]
 
-    # Удаляем данные и UI
-    if tab_name in notes_by_tab:
-        del notes_by_tab[tab_name]
-    if tab_name in notes_frames:
-        del notes_frames[tab_name]
-    if tab_name in notes_tabs_order:
-        notes_tabs_order.remove(tab_name)
+def fill_tab_text(name: str, content: str, version: int, position: int):
+    """Вставляет текст строки БД в пустую (выгруженную или распаковываемую) вкладку."""
+    tab_data = current_tabs[name]
+    textbox = tab_data["textbox"]
+    try:
+        textbox.configure(state="normal")
+    except Exception:
+        pass
+    with untracked_edits(tab_data):  # загрузка — не правка для Ctrl+Z
+        textbox.insert("1.0", content)
+    reset_undo_history(tab_data, version)
+    tab_data.pop("loading", None)
+    tab_data.pop("unloaded", None)
+    remember_tab_row(tab_data.get("id"), version, position, content, tab_data.get("filepath"))
+    attach_highlighter(name)
+
+
+def unpack_tabs_in_background(pending):
+    """Распаковывает документы в фоновом потоке, чтобы не задерживать запуск окна."""
+    if not pending:
+        return
+
+    def work():
+        return [decode_content(stored, codec) for _tab_id, stored, codec, _version, _position in pending]
+
+    def done(contents, error):
+        if error is not None:
+            show_status(f"❌ Не удалось распаковать документы: {error}", ms=5000, priority=2)
+            return  # вкладки остаются "loading" — их содержимое в БД не тронем
+        for (tab_id, _stored, _codec, version, position), content in zip(pending, contents):
+            name = tab_names_by_id.get(tab_id)  # вкладку могли переименовать или закрыть
+            tab_data = current_tabs.get(name)
+            if tab_data is None or not tab_data.get("loading"):
+                continue  # закрыта или текст уже вставила «Заменить все»
+            fill_tab_text(name, content, version, position)
+            # пока распаковывали, документ могли поменять в другом окне
+            try:
+                _sync_tab(_change_feed["conn"], tab_id)
+            except sqlite3.Error:
+                pass
+
+    run_in_background(work, done)
+
 
+def start_change_feed():
+    conn = sqlite3.connect(DB_PATH, timeout=10, isolation_level=None)
+    _change_feed["conn"] = conn
+    _change_feed["seq"] = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    _change_feed["data_version"] = conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def poll_change_feed():
+    try:
+        apply_remote_changes()
+    except sqlite3.Error:
+        pass
+    app.after(CHANGE_FEED_POLL_MS, poll_change_feed)
+
+
+def apply_remote_changes() -> bool:
+    """Применяет к памяти изменения, сделанные другими окнами. True — если были."""
+    conn = _change_feed["conn"]
+    if conn is None or bulk_io_busy():
+        return False
+
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if data_version == _change_feed["data_version"]:
+        return False
+    _change_feed["data_version"] = data_version
+
+    last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    entries = conn.execute(
+        "SELECT entity, key, op FROM change_log WHERE seq > ? AND seq <= ? AND origin != ? ORDER BY seq",
+        (_change_feed["seq"], last_seq, INSTANCE_ID),
+    ).fetchall()
+    _change_feed["seq"] = last_seq
+    if not entries:
+        return False
+
+    note_ids: set[int] = set()
+    note_ranges: list[tuple[int, int]] = []
+    tab_ids: list[int] = []
+    note_tabs_changed = False
+    for entity, key, _op in entries:
+        if entity == "note":
+            if ":" in key:
+                first, last = key.split(":", 1)
+                note_ranges.append((int(first), int(last)))
+            else:
+                note_ids.add(int(key))
+        elif entity == "tab":
+            if key.isdigit() and int(key) not in tab_ids:
+                tab_ids.append(int(key))
+        elif entity == "note_tabs":
+            note_tabs_changed = True
+
+    notes_changed = False
+    # Сначала вкладки: заметки ссылаются на них по id
+    if note_tabs_changed:
+        notes_changed = _sync_note_tabs(conn)
+    if note_ids or note_ranges:
+        notes_changed = _sync_notes(conn, note_ids, note_ranges) or notes_changed
+
+    tabs_changed = False
+    for tab_id in tab_ids:
+        tabs_changed = _sync_tab(conn, tab_id) or tabs_changed
+
+    if notes_changed:
+        emit("notes_reloaded", saved=True)
+    if notes_changed or tabs_changed:
+        show_status("↻ Обновлено из другого окна")
+    return notes_changed or tabs_changed
+
+
+def _locally_modified_note(tab_name: str, note: dict) -> bool:
+    saved = _notes_saved.get(note.get("id"))
+    return saved is None or note_state(note_tab_ids.get(tab_name), note) != saved[2]
+
+
+def _sync_notes(conn, note_ids: set, note_ranges: list) -> bool:
+    index = {
+        note["id"]: (tab_name, note)
+        for tab_name, tab_notes in notes_by_tab.items()
+        for note in tab_notes
+        if note.get("id") is not None
+    }
+    changed = False
+
+    def apply(row):
+        nonlocal changed
+        note_id, version, position, remote_tab_id = row[0], row[1], row[2], row[3]
+        if remote_tab_id not in note_tab_names:
+            _sync_note_tabs(conn)  # вкладку создали в другом окне вместе с заметкой
+        remote_tab = note_tab_names.get(remote_tab_id)
+        if remote_tab is None:
+            return
+        entry = index.get(note_id)
+        if entry is None:
+            # Новая заметка — или удалённая здесь, но изменённая там (их правка побеждает)
+            index[note_id] = (remote_tab, add_note_row(row, position))
+            changed = True
+            return
+
+        tab_name, note = entry
+        saved = _notes_saved.get(note_id)
+        if saved is not None and saved[0] >= version:
+            return
+        if _locally_modified_note(tab_name, note):
+            return  # сольётся при нашем сохранении
+
+        notes_by_tab[tab_name].remove(note)
+        note.clear()
+        note.update(note_from_row(row))
+        ensure_notes_tab(remote_tab, switch_to=False)
+        target = notes_by_tab[remote_tab]
+        position = min(position, len(target))
+        target.insert(position, note)
+        _notes_saved[note_id] = (version, position, row_state(row))
+        index[note_id] = (remote_tab, note)
+        changed = True
+
+    found = set()
+    ids = sorted(note_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(f"SELECT {NOTE_COLUMNS} FROM notes WHERE id IN ({placeholders})", chunk):
+            found.add(row[0])
+            apply(row)
+
+    for first, last in note_ranges:
+        for row in conn.execute(
+            f"SELECT {NOTE_COLUMNS} FROM notes WHERE id BETWEEN ? AND ? ORDER BY id", (first, last)
+        ):
+            found.add(row[0])
+            apply(row)
+
+    # Удалённые в другом окне (если здесь их не меняли)
+    for note_id in note_ids - found:
+        entry = index.get(note_id)
+        if entry is None:
+            _notes_saved.pop(note_id, None)
+            continue
+        tab_name, note = entry
+        if not _locally_modified_note(tab_name, note):
+            notes_by_tab[tab_name].remove(note)
+            _notes_saved.pop(note_id, None)
+            changed = True
+
+    return changed
+
+
+def _sync_note_tabs(conn) -> bool:
+    rows = conn.execute("SELECT id, name, position FROM note_tabs ORDER BY position").fetchall()
+    remote_ids = {tab_id for tab_id, _name, _position in rows}
+    changed = False
+
+    for tab_id, name, position in rows:
+        local = note_tab_names.get(tab_id)
+        if local is not None and local != name:
+            # переименована в другом окне
+            if name in notes_by_tab:
+                forget_note_tab(local)  # имя уже занято здесь — наша вкладка сохранится отдельно
+            else:
+                rename_notes_tab_ui(local, name)
+            changed = True
+        if name not in notes_by_tab:
+            ensure_notes_tab(name, switch_to=False, position=position)
+            changed = True
+        elif notes_tab_keys[name] != position and notes_tab_keys[name] == _note_tabs_saved.get(name):
+            # перенесена в другом окне, а здесь — нет
+            _set_notes_tab_key(name, position)
+            changed = True
+        remember_note_tab(name, tab_id)
+
+    # Удалена в другом окне: убираем, если здесь в ней ничего не осталось
+    for name in list(notes_tabs_order):
+        tab_id = note_tab_ids.get(name)
+        if tab_id is None or tab_id in remote_ids:
+            continue
+        if not notes_by_tab.get(name):
+            remove_notes_tab(name)
+            changed = True
+        forget_note_tab(name)  # непустая вкладка сохранится заново с новым id
+
+    _note_tabs_saved.clear()
+    _note_tabs_saved.update((name, position) for _tab_id, name, position in rows)
+    return changed
+
+
+def _follow_remote_tab(tab_id: int, name: str, remote_name: str, position: int) -> tuple:
+    """Имя и место документа из другого окна. Возвращает (имя здесь, изменилось ли)."""
+    changed = False
+    if remote_name != name:
+        _release_tab_name(remote_name)
+        if remote_name not in current_tabs:
+            rename_tab_ui(name, remote_name)
+            name = remote_name
+            changed = True
+    saved = _tabs_saved.get(tab_id)
+    if saved is not None and saved[1] != position:
+        if tab_order_keys.get(name) == saved[1]:
+            _set_tab_order_key(name, position)
+            changed = True
+        # если вкладку перенесли и здесь, наш порядок запишется при сохранении
+        _tabs_saved[tab_id] = (saved[0], position) + saved[2:]
+    return name, changed
+
+
+def _sync_tab(conn, tab_id: int) -> bool:
+    row = conn.execute(
+        "SELECT name, position, content, codec, filepath, version FROM tabs WHERE id=?", (tab_id,)
+    ).fetchone()
+    name = tab_names_by_id.get(tab_id)
+    tab_data = current_tabs.get(name)
+    moved = False
+    if tab_data is not None and row is not None:
+        name, moved = _follow_remote_tab(tab_id, name, row[0], row[1])
+    saved = _tabs_saved.get(tab_id)
+    if tab_data is not None and tab_data.get("loading"):
+        return moved  # текст сверится после распаковки
+    if tab_data is not None and tab_data.get("unloaded"):
+        if row is None:
+            _tabs_saved.pop(tab_id, None)
+            remove_tab(name)
+            return True
+        return moved  # свежий текст прочитается из БД при открытии
+
+    local_clean = False
+    if tab_data is not None and saved is not None:
+        current = tab_data["textbox"].get("1.0", "end-1c")
+        local_clean = _content_state(current, tab_data.get("filepath")) == saved[2:]
+
+    if row is None:
+        if tab_data is None:
+            _tabs_saved.pop(tab_id, None)
+        elif local_clean:
+            _tabs_saved.pop(tab_id, None)
+            remove_tab(name)
+            return True
+        return False
+
+    remote_name, position, stored, codec, filepath, version = row
+    if saved is not None and saved[0] >= version:
+        return moved
+    content = decode_content(stored, codec)
+
+    if tab_data is None:
+        add_tab_row(tab_id, remote_name, content, filepath, version, position)
+        return True
+    if not local_clean:
+        return moved  # правили и здесь — при сохранении их версия уйдёт в копию
+
+    textbox = tab_data["textbox"]
+    insert_at = textbox.index("insert")
+    with untracked_edits(tab_data):
+        textbox.delete("1.0", "end")
+        textbox.insert("1.0", content)
+    reset_undo_history(tab_data, version)  # история в БД — уже от другого окна
     try:
-        notes_tabview.delete(tab_name)
+        textbox.mark_set("insert", insert_at)
     except Exception:
         pass
+    tab_data["filepath"] = filepath
+    attach_highlighter(name)
+    remember_tab_row(tab_id, version, saved[1], content, filepath)
+    return True
 
-    if not notes_tabs_order:
-        ensure_notes_tab("Заметки", switch_to=True)
-    else:
-        notes_tabview.set(next_tab or notes_tabs_order[0])
 
-    save_notes_to_db()
-    redraw_notes()
-    show_status("✓ Вкладка удалена")
+# ---------------- ПАМЯТЬ ВКЛАДОК ----------------
+# Размер вкладки оценивается по числу символов и строк в Text, без копии
+# текста. Если сумма больше бюджета, давно не открывавшиеся вкладки
+# выгружаются: их текст уже в БД, поэтому в окне освобождаются текст,
+# история Ctrl+Z и подсветка. При выборе вкладки текст читается из БД заново.
 
+MEMORY_CHECK_MS = 30 * 1000
+MEMORY_BUDGET_CHOICES = {"16 МБ": 16, "64 МБ": 64, "256 МБ": 256, "Без ограничения": 0}
+TAB_BYTES_PER_CHAR = 2   # символы в сегментах B-дерева Tk
+TAB_BYTES_PER_LINE = 80  # узел строки в B-дереве Tk и состояние подсветки
 
-ctk.CTkButton(
-    notes_controls,
-    text="🗑 Удалить вкладку",
-    height=40,
-    font=emoji_font,
-    command=delete_current_notes_tab,
-).pack(side="left", padx=10)
 
-ctk.CTkButton(
-    notes_controls,
-    text="💾 Сохранить заметку",
-    height=40,
-    font=emoji_font,
-    command=add_note,
-).pack(side="left", padx=10)
+def estimate_tab_bytes(tab_data: dict) -> int:
+    if tab_data.get("unloaded") or tab_data.get("loading"):
+        return 0
+    textbox = tab_data["textbox"]
+    try:
+        chars = textbox._textbox.count("1.0", "end", "chars")
+        chars = int(chars[0] if isinstance(chars, tuple) else chars)
+    except Exception:
+        chars = len(textbox.get("1.0", "end-1c"))
+    return chars * TAB_BYTES_PER_CHAR + _line_of(textbox.index("end-1c")) * TAB_BYTES_PER_LINE
+
+
+def tab_memory_usage() -> list:
+    """(имя, оценка байт, выгружена ли) по всем вкладкам в порядке вкладок."""
+    usage = []
+    for name in tab_order:
+        tab_data = current_tabs.get(name)
+        if tab_data is not None:
+            usage.append((name, estimate_tab_bytes(tab_data), bool(tab_data.get("unloaded"))))
+    return usage
+
+
+def unload_tab(name: str) -> bool:
+    """Выгружает текст вкладки. Только если он совпадает с сохранённым в БД."""
+    tab_data = current_tabs.get(name)
+    if tab_data is None or tab_data.get("unloaded") or tab_data.get("loading"):
+        return False
+    textbox = tab_data["textbox"]
+    saved = _tabs_saved.get(tab_data.get("id"))
+    content = textbox.get("1.0", "end-1c")
+    if saved is None or saved[2:] != _content_state(content, tab_data.get("filepath")):
+        return False
+    journal = tab_data.get("journal")
+    if journal is not None and journal.dirty:
+        return False  # история ещё не записана в БД
+
+    if tab_data.get("highlighter") is not None:
+        tab_data["highlighter"].close()
+        tab_data["highlighter"] = None
+    with untracked_edits(tab_data):
+        textbox.delete("1.0", "end")
+    reset_undo_history(tab_data, saved[0])  # история остаётся в БД
+    try:
+        textbox.configure(state="disabled")
+    except Exception:
+        pass
+    tab_data["unloaded"] = True
+    return True
 
 
-notes_tabview = ctk.CTkTabview(frame_notes)
-notes_tabview.pack(fill="both", expand=True, padx=20, pady=(0, 20))
-move_tabview_tabs_to_bottom(notes_tabview)
+def reload_tab(name: str):
+    """Возвращает выгруженной вкладке текст из БД (сжатый — распаковывается в фоне)."""
+    tab_data = current_tabs.get(name)
+    if tab_data is None or not tab_data.get("unloaded"):
+        return
+    tab_id = tab_data.get("id")
+    with sqlite3.connect(DB_PATH, timeout=10) as conn:
+        row = conn.execute(
+            "SELECT content, codec, filepath, version, position FROM tabs WHERE id=?", (tab_id,)
+        ).fetchone()
+    tab_data.pop("unloaded", None)
+    if row is None:
+        remove_tab(name)  # документ удалили в другом окне
+        return
 
+    stored, codec, filepath, version, position = row
+    tab_data["filepath"] = filepath
+    if codec:
+        tab_data["loading"] = True
+        unpack_tabs_in_background([(tab_id, stored, codec, version, position)])
+        return
 
-def on_notes_tab_changed(_value=None):
-    redraw_notes()
+    fill_tab_text(name, stored or "", version, position)
 
 
-notes_tabview.configure(command=on_notes_tab_changed)
+def on_blocknot_tab_changed():
+    name = frame_blocknot.tabs.get()
+    tab_data = current_tabs.get(name)
+    if tab_data is None:
+        return
+    tab_data["last_used"] = time.monotonic()
+    if tab_data.get("unloaded"):
+        reload_tab(name)
+
+
+def enforce_memory_budget() -> int:
+    """Выгружает самые давно открытые вкладки, пока сумма больше бюджета."""
+    budget = settings.get("memory_budget_mb", 0) * 1024 * 1024
+    if not budget:
+        return 0
+    sizes = {name: size for name, size, unloaded in tab_memory_usage() if not unloaded}
+    total = sum(sizes.values())
+    if total <= budget:
+        return 0
+
+    current = frame_blocknot.tabs.get()
+    candidates = sorted(
+        (name for name, size in sizes.items() if size and name != current),
+        key=lambda name: current_tabs[name].get("last_used", 0.0),
+    )
+    if not candidates:
+        return 0
+    save_all_to_db()  # выгружаем только то, что уже лежит в БД
+
+    unloaded = 0
+    for name in candidates:
+        if total <= budget:
+            break
+        if unload_tab(name):
+            total -= sizes[name]
+            unloaded += 1
+    return unloaded
+
+
+def memory_usage_text() -> str:
+    usage = tab_memory_usage()
+    total = sum(size for _name, size, _unloaded in usage)
+    budget = settings.get("memory_budget_mb", 0)
+    unloaded = sum(1 for _name, _size, is_unloaded in usage if is_unloaded)
+    text = f"Вкладки в памяти: ~{total / 1024 / 1024:.1f} МБ"
+    text += f" из {budget} МБ" if budget else ""
+    text += f" · выгружено {unloaded} из {len(usage)}"
+    text += f"\nИстория правок: ~{undo_memory_total() / 1024:.0f} КБ из {settings.get('undo_memory_mb', 0)} МБ"
+    largest = sorted((u for u in usage if u[1]), key=lambda u: u[1], reverse=True)[:3]
+    if largest:
+        text += "\n" + ", ".join(f"{name}: {size / 1024:.0f} КБ" for name, size, _unloaded in largest)
+    return text
+
+
+def update_memory_usage_label():
+    if memory_usage_label is None:
+        return
+    try:
+        memory_usage_label.configure(text=memory_usage_text())
+    except Exception:
+        pass
 
 
-def redraw_notes():
-    tab_name = get_current_notes_tab()
-    frame = notes_frames.get(tab_name)
-    if not frame:
+def schedule_memory_check():
+    app.after(MEMORY_CHECK_MS, schedule_memory_check)
+    if bulk_io_busy():
         return
+    if enforce_memory_budget():
+        show_status("✓ Освобождена память неактивных вкладок", key="memory")
+    update_memory_usage_label()
 
-    for widget in frame.winfo_children():
-        widget.destroy()
 
-    tab_notes = notes_by_tab.get(tab_name, [])
-    sorted_notes = sorted(tab_notes, key=lambda n: not n.get("pinned", False))
+# ---------------- СЛЕЖЕНИЕ ЗА ФАЙЛАМИ НА ДИСКЕ ----------------
+# Файлы вкладок с filepath проверяет один фоновый поток: на Linux он ждёт
+# событий inotify по папкам файлов, в остальных системах раз в
+# FILE_WATCH_POLL_MS сравнивает os.stat (размер, mtime, inode) всех файлов.
+# Изменения уходят в очередь, окно разбирает её таймером:
+#   - файл только дописан (тот же inode, старый хвост на месте) — читаются
+#     лишь новые байты и добавляются в конец вкладки (хвост логов);
+#   - иначе вкладка без своих правок перечитывается одним шагом Ctrl+Z;
+#   - если правки есть — пользователь выбирает: с диска, своё или рядом.
+# Своя запись в файл (Сохранить как) сразу становится новой точкой отсчёта.
 
-    number = 1
-    for note in sorted_notes:
-        if notes_search_text and notes_search_text not in note.get("text", "").lower():
-            continue
-        create_note_widget(number, note)
-        number += 1
+FILE_WATCH_POLL_MS = 2000
+FILE_WATCH_UI_MS = 500
+FILE_TAIL_CHECK = 64  # байт перед старым концом файла, сверяемых при дописывании
 
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x4, 0x8, 0x80, 0x100, 0x200
+IN_Q_OVERFLOW = 0x4000
+_INOTIFY_EVENT = struct.Struct("iIII")
 
-def update_search(event=None):
-    global notes_search_text
-    notes_search_text = search_entry.get().lower()
-    redraw_notes()
+# path -> {"key": (size, mtime_ns, ino) | None, "tail": bytes}: то, что окно считает содержимым файла
+_file_known: dict = {}
+_file_watch: dict = {"commands": queue.SimpleQueue(), "changes": queue.SimpleQueue(), "thread": None,
+                     "asking": False, "pending": set()}
 
 
-search_entry.bind("<KeyRelease>", update_search)
+def file_stat_key(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
 
 
-def create_note_widget(number, note):
-    tab_name = get_current_notes_tab()
-    parent = notes_frames.get(tab_name)
-    if not parent:
-        return
+def _read_tail(path: str, size: int) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, size - FILE_TAIL_CHECK))
+            return f.read(min(size, FILE_TAIL_CHECK))
+    except OSError:
+        return b""
 
-    frame = ctk.CTkFrame(parent, fg_color=note.get("color", "#2b2b2b"))
-    frame.pack(fill="x", pady=5)
 
-    date_str = note.get("date", "")
-    time_start = (note.get("time_start") or "").strip()
-    time_end = (note.get("time_end") or "").strip()
+def remember_file(path: str, key=None):
+    """Текущее состояние файла — точка отсчёта (после своей записи или чтения)."""
+    key = key if key is not None else file_stat_key(path)
+    _file_known[path] = {"key": key, "tail": _read_tail(path, key[0]) if key else b""}
+    _file_watch["commands"].put(("watch", path, key))
 
-    time_part = ""
-    if time_start or time_end:
-        if time_start and time_end:
-            time_part = f" {time_start}-{time_end}"
-        elif time_start:
-            time_part = f" {time_start}"
-        else:
-            time_part = f" {time_end}"
 
-    meta = f"{date_str}{time_part}".strip()
-    if meta:
-        text = f"{number}. {note.get('text', '')}  ({meta})"
-    else:
-        text = f"{number}. {note.get('text', '')}"
-    label = ctk.CTkLabel(frame, text=text, font=get_notes_font(), anchor="w")
-    label.pack(side="left", padx=10, fill="x", expand=True)
+def _open_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except Exception:
+        return None
+    return (libc, fd) if fd >= 0 else None
+
 
-    # Если закреплено — оранжевый текст, если выполнено — зелёный, иначе обычный цвет
-    default_label_text_color = ctk.ThemeManager.theme.get("CTkLabel", {}).get("text_color")
-    if note.get("pinned"):
-        label.configure(text_color="#ff8c1a")
-    elif note.get("done"):
-        label.configure(text_color="#00ff7f")
-    else:
-        if default_label_text_color is not None:
-            label.configure(text_color=default_label_text_color)
+def _watch_folder(path: str) -> str:
+    return os.path.dirname(path) or "."
 
-    def toggle_done():
-        note["done"] = not note.get("done", False)
-        save_notes_to_db()
-        redraw_notes()
 
-    def toggle_pin():
-        note["pinned"] = not note.get("pinned", False)
-        save_notes_to_db()
-        redraw_notes()
+def _file_watch_loop():
+    """Фоновый поток: свои точки отсчёта, в очередь changes — (путь, новый ключ)."""
+    commands, changes = _file_watch["commands"], _file_watch["changes"]
+    watched: dict = {}  # path -> ключ stat
+    inotify = _open_inotify()
+    dir_watches: dict = {}  # папка -> wd
+    dirs_by_wd: dict = {}
+    mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
 
-    def move_up():
-        idx = notes_by_tab[tab_name].index(note)
-        if idx > 0:
-            notes_by_tab[tab_name][idx], notes_by_tab[tab_name][idx - 1] = (
-                notes_by_tab[tab_name][idx - 1],
-                notes_by_tab[tab_name][idx],
-            )
-            save_notes_to_db()
-            redraw_notes()
-
-    def move_down():
-        idx = notes_by_tab[tab_name].index(note)
-        if idx < len(notes_by_tab[tab_name]) - 1:
-            notes_by_tab[tab_name][idx], notes_by_tab[tab_name][idx + 1] = (
-                notes_by_tab[tab_name][idx + 1],
-                notes_by_tab[tab_name][idx],
-            )
-            save_notes_to_db()
-            redraw_notes()
+    while True:
+        # Команды окна; без inotify ожидание команды и есть интервал опроса
+        try:
+            timeout = None if inotify is not None else FILE_WATCH_POLL_MS / 1000
+            command = commands.get(block=inotify is None, timeout=timeout)
+        except queue.Empty:
+            command = None
+        fresh = set()  # новые пути проверяем сразу: событие могло прийти до add_watch
+        while command is not None:
+            op, path, key = command
+            if op == "watch":
+                watched[path] = key
+                fresh.add(path)
+            else:
+                watched.pop(path, None)
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                command = None
+
+        candidates = list(watched)
+        if inotify is not None:
+            libc, fd = inotify
+            wanted = {_watch_folder(path) for path in watched}
+            for folder in wanted - set(dir_watches):
+                wd = libc.inotify_add_watch(fd, os.fsencode(folder), mask)
+                if wd >= 0:
+                    dir_watches[folder] = wd
+                    dirs_by_wd[wd] = folder
+            for folder in set(dir_watches) - wanted:
+                wd = dir_watches.pop(folder)
+                dirs_by_wd.pop(wd, None)
+                libc.inotify_rm_watch(fd, wd)
+            ready, _w, _x = select.select([fd], [], [], 1.0)
+            touched, overflow = set(), False
+            if ready:
+                try:
+                    data = os.read(fd, 65536)
+                except OSError:
+                    data = b""
+                offset = 0
+                while offset + _INOTIFY_EVENT.size <= len(data):
+                    wd, event_mask, _cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                    offset += _INOTIFY_EVENT.size
+                    name = data[offset:offset + length].rstrip(b"\0")
+                    offset += length
+                    overflow |= bool(event_mask & IN_Q_OVERFLOW)
+                    touched.add((dirs_by_wd.get(wd), os.fsdecode(name)))
+            # Без событий stat не трогаем; папки, которые не удалось отслеживать, — опросом
+            if not overflow:
+                candidates = [path for path in watched
+                              if path in fresh or (_watch_folder(path), os.path.basename(path)) in touched
+                              or _watch_folder(path) not in dir_watches]
+
+        for path in candidates:
+            key = file_stat_key(path)
+            if key != watched.get(path, key):
+                watched[path] = key
+                changes.put((path, key))
+
+
+def start_file_watcher():
+    if _file_watch["thread"] is None:
+        _file_watch["thread"] = threading.Thread(target=_file_watch_loop, name="file-watch", daemon=True)
+        _file_watch["thread"].start()
+    # Точка отсчёта — файлы на момент запуска; вкладка, текст которой уже
+    # расходится с файлом (правки хранятся в БД), считается изменённой
+    for tab_data in current_tabs.values():
+        path = tab_data.get("filepath")
+        if not path:
+            continue
+        if path not in _file_known:
+            remember_file(path)
+        if not tab_data.get("unloaded") and not tab_data.get("loading"):
+            same = _read_file_text(path) == tab_data["textbox"].get("1.0", "end-1c")
+            tab_data["file_synced"] = tab_edit_mark(tab_data) if same else None
+    app.after(FILE_WATCH_UI_MS, poll_file_changes)
+
+
+def tab_edit_mark(tab_data: dict):
+    """Метка правок вкладки: счётчик журнала правок (или crc текста без журнала)."""
+    journal = tab_data.get("journal")
+    if journal is not None and journal.active:
+        return journal.edits
+    return zlib.crc32(tab_data["textbox"].get("1.0", "end-1c").encode("utf-8"))
+
+
+def mark_file_synced(tab_data: dict):
+    if not tab_data.get("unloaded") and not tab_data.get("loading"):
+        tab_data["file_synced"] = tab_edit_mark(tab_data)
+
+
+def file_changed_on_disk(path: str) -> bool:
+    known = _file_known.get(path)
+    return known is not None and file_stat_key(path) != known["key"]
+
+
+def _sync_watched_paths():
+    """Начать/прекратить слежение по текущим filepath вкладок."""
+    paths = {tab_data.get("filepath") for tab_data in current_tabs.values()} - {None, ""}
+    for path in paths - set(_file_known):
+        remember_file(path)
+        for tab_data in current_tabs.values():
+            if tab_data.get("filepath") == path:
+                mark_file_synced(tab_data)
+    for path in set(_file_known) - paths:
+        del _file_known[path]
+        _file_watch["commands"].put(("unwatch", path, None))
+
+
+def poll_file_changes():
+    app.after(FILE_WATCH_UI_MS, poll_file_changes)
+    if _file_watch["asking"]:
+        return  # открыт вопрос о слиянии — разберём после ответа
+    _sync_watched_paths()
+    pending = _file_watch["pending"]
+    while True:
+        try:
+            path, _key = _file_watch["changes"].get_nowait()
+        except queue.Empty:
+            break
+        pending.add(path)
+    for path in list(pending):
+        if path not in _file_known:
+            pending.discard(path)
+            continue
+        tabs = [(name, tab_data) for name, tab_data in current_tabs.items() if tab_data.get("filepath") == path]
+        if any(tab_data.get("unloaded") or tab_data.get("loading") for _name, tab_data in tabs):
+            continue  # разберём, когда текст вкладки вернётся в память
+        pending.discard(path)
+        apply_file_change(path, tabs)
+
+
+def _complete_utf8(data: bytes) -> int:
+    """Длина data без оборванного в конце символа UTF-8 (и без \\r перед возможным \\n)."""
+    end = len(data)
+    for back in range(1, min(4, end) + 1):
+        byte = data[end - back]
+        if byte & 0xC0 == 0x80:
+            continue  # байт продолжения — ищем начало символа
+        need = 4 if byte >= 0xF0 else 3 if byte >= 0xE0 else 2 if byte >= 0xC0 else 1
+        if need > back:
+            end -= back
+        break
+    if end and data[end - 1:end] == b"\r":
+        end -= 1
+    return end
+
+
+def _read_appended(path: str, known: dict, key) -> tuple | None:
+    """(текст, новый ключ), если файл только дописан, иначе None."""
+    old = known["key"]
+    if old is None or key is None or key[2] != old[2] or key[0] <= old[0]:
+        return None
+    try:
+        with open(path, "rb") as f:
+            f.seek(max(0, old[0] - FILE_TAIL_CHECK))
+            head = f.read(min(old[0], FILE_TAIL_CHECK))
+            if head != known["tail"]:
+                return None  # начало файла переписали
+            data = f.read(key[0] - old[0])
+    except OSError:
+        return None
+    used = _complete_utf8(data)
+    text = data[:used].decode("utf-8", errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    return text, (old[0] + used, key[1], key[2])
 
-    def delete_note():
-        notes_by_tab[tab_name].remove(note)
-        save_notes_to_db()
-        redraw_notes()
 
-    for txt, cmd in [
-        ("⬆️", move_up),
-        ("⬇️", move_down),
-        ("📌", toggle_pin),
-        ("✔️", toggle_done),
-        ("🗑", delete_note),
-    ]:
-        ctk.CTkButton(frame, text=txt, width=40, height=32, command=cmd).pack(side="right", padx=3)
+def _read_file_text(path: str) -> str | None:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
 
 
-# ----------------ФУНКЦИИ БЛОКНОТА ----------------
+def apply_file_change(path: str, tabs: list):
+    known = _file_known[path]
+    key = file_stat_key(path)
+    if key == known["key"]:
+        return  # это была наша запись
+    base = os.path.basename(path)
+    if key is None:
+        known["key"] = None
+        show_status(f"⚠ Файл удалён с диска: {base}", 4000, priority=1)
+        return
 
+    dirty = []
+    for name, tab_data in tabs:
+        mark = tab_edit_mark(tab_data)
+        if mark != tab_data.setdefault("file_synced", mark):  # вкладка, выгруженная с запуска
+            dirty.append(name)
+    appended = None if dirty else _read_appended(path, known, key)
+    if appended is not None:
+        text, key = appended
+        for _name, tab_data in tabs:
+            with untracked_edits(tab_data):  # дописанное не сдвигает индексы истории правок
+                tab_data["textbox"].insert("end", text)
+            mark_file_synced(tab_data)
+        known["key"], known["tail"] = key, _read_tail(path, key[0])
+        return
 
-def create_tab(tab_name: str, text: str = "", filepath: str | None = None, switch_to: bool = True):
-    """Создаёт вкладку в UI и регистрирует её в current_tabs/tab_order."""
-    if tab_name in current_tabs:
-        base_name = tab_name
-        suffix = 2
-        while f"{base_name} ({suffix})" in current_tabs:
-            suffix += 1
-        tab_name = f"{base_name} ({suffix})"
+    content = _read_file_text(path)
+    if content is None:
+        return
+    if dirty:
+        _file_watch["asking"] = True
+        try:
+            answer = messagebox.askyesnocancel(
+                "Файл изменён",
+                f"«{base}» изменён другой программой, а во вкладке «{dirty[0]}» есть свои правки.\n\n"
+                "Да — загрузить версию с диска (откат — Ctrl+Z)\n"
+                "Нет — оставить текст вкладки\n"
+                "Отмена — открыть версию с диска в новой вкладке рядом",
+            )
+        finally:
+            _file_watch["asking"] = False
+        if answer is None:
+            create_tab(f"{base} (на диске)", text=content, filepath=None, switch_to=True)
+        if not answer:
+            remember_file(path, key)
+            return
 
-    frame_blocknot.tabs.add(tab_name)
-    tab_frame = frame_blocknot.tabs.tab(tab_name)
+    for _name, tab_data in tabs:
+        _replace_text_as_one_edit(tab_data["textbox"], content)
+        mark_file_synced(tab_data)
+    remember_file(path, key)
+    show_status(f"↻ Перечитан с диска: {base}", 3000)
 
-    textbox = ctk.CTkTextbox(tab_frame, font=get_editor_font())
-    textbox.pack(fill="both", expand=True, padx=10, pady=10)
 
-    # Включим undo/redo для Ctrl+Z / Ctrl+Y (если доступно во внутреннем Text)
-    try:
-        textbox._textbox.configure(undo=True, autoseparators=True, maxundo=-1)
-    except Exception:
-        pass
+# ---------------- ОБСЛУЖИВАНИЕ БД В ФОНЕ ----------------
+_maintenance: dict = {"running": False, "checked": False}
 
-    if text:
-        textbox.insert("1.0", text)
 
-    current_tabs[tab_name] = {"textbox": textbox, "filepath": filepath}
-    tab_order.append(tab_name)
-    if switch_to:
-        frame_blocknot.tabs.set(tab_name)
-    return tab_name
+def schedule_db_maintenance():
+    app.after(MAINTENANCE_INTERVAL_MS, schedule_db_maintenance)
+    if _maintenance["running"] or bulk_io_busy():
+        return
 
-def new_tab():
-    global tab_counter
+    # Полная quick_check — раз за сессию, дальше только лёгкие шаги
+    integrity = not _maintenance["checked"]
+    _maintenance["running"] = True
 
-    # Спрашиваем имя для новой вкладки
-    dialog = ctk.CTkInputDialog(title="Новая вкладка", text="Название вкладки:")
-    user_title = dialog.get_input()
-    user_title = (user_title or "").strip()
+    def done(report, error):
+        _maintenance["running"] = False
+        if error is not None:
+            show_status(f"❌ Обслуживание БД: {error}", 4000)
+            return
+        if integrity:
+            _maintenance["checked"] = True
+            if report["integrity"] != "ok":
+                show_status(f"❌ БД повреждена: {report['integrity']}", 8000, priority=2)
+        if report["vacuumed_pages"] or report["full_vacuum"]:
+            show_status("✓ База данных сжата")
 
-    # Если пользователь отменил/ничего не ввёл — даём стандартное имя
-    if not user_title:
-        tab_name = f"Документ {tab_counter}"
-        tab_counter += 1
-    else:
-        tab_name = user_title
+    run_in_background(lambda: run_db_maintenance(integrity=integrity), done)
 
-    # Гарантируем уникальность имени вкладки
-    if tab_name in current_tabs:
-        base_name = tab_name
-        suffix = 2
-        while f"{base_name} ({suffix})" in current_tabs:
-            suffix += 1
-        tab_name = f"{base_name} ({suffix})"
 
-    create_tab(tab_name, text="", filepath=None, switch_to=True)
+# ---------------- РЕЗЕРВНЫЕ КОПИИ В ФОНЕ ----------------
+BACKUP_CHECK_MS = 60 * 1000
+BACKUP_INTERVAL_CHOICES = {"Выкл.": 0, "15 минут": 15, "1 час": 60, "4 часа": 240}
 
-def get_current_textbox():
-    tab_name = frame_blocknot.tabs.get()
-    if tab_name in current_tabs:
-        return current_tabs[tab_name]["textbox"], tab_name
-    return None, None
+_backup: dict = {"running": False, "last": None}
 
-def save_file():
-    # "Сохранить" сохраняет ВСЁ в SQLite
-    save_all_to_db()
-    save_notes_to_db()
-    show_status("✓ Сохранено")
 
-def save_file_as():
-    textbox, tab_name = get_current_textbox()
-    if textbox is None:
+def _db_changed_since(stamp: float) -> bool:
+    for path in (DB_PATH, DB_PATH + "-wal"):
+        try:
+            if os.path.getmtime(path) > stamp:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def schedule_db_backup():
+    app.after(BACKUP_CHECK_MS, schedule_db_backup)
+    interval = settings.get("backup_interval_min", 0)
+    if not interval or _backup["running"] or bulk_io_busy():
         return
-    
-    path = filedialog.asksaveasfilename(
-        defaultextension=".txt",
-        filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
-    )
-    
-    if not path:
+    if _backup["last"] is None:
+        existing = list_backups()
+        _backup["last"] = existing[0][1] if existing else 0.0
+    now = time.time()
+    if now - _backup["last"] < interval * 60 or not _db_changed_since(_backup["last"]):
         return
-    
-    current_tabs[tab_name]["filepath"] = path
-    with open(path, "w", encoding="utf-8") as file:
-        file.write(textbox.get("1.0", "end-1c"))
-
-    # Дополнительно фиксируем состояние в SQLite
-    save_all_to_db()
-    save_notes_to_db()
-    show_status("✓ Сохранено")
+    run_db_backup()
 
-def clear_textbox():
-    textbox, tab_name = get_current_textbox()
-    if textbox:
-        textbox.delete("1.0", "end")
 
-def close_tab():
-    tab_name = frame_blocknot.tabs.get()
-    if tab_name in current_tabs:
-        if tab_name in tab_order:
-            tab_order.remove(tab_name)
-        del current_tabs[tab_name]
-        frame_blocknot.tabs.delete(tab_name)
-        if not current_tabs:
-            create_tab("Документ 1", text="", filepath=None, switch_to=True)
+def run_db_backup(label: str = "", on_done=None):
+    """Копия в фоновом потоке, затем ротация старых копий."""
+    _backup["running"] = True
+    compress = bool(settings.get("backup_compress", False))
 
+    def work():
+        path = backup_db(compress=compress, label=label)
+        rotate_backups()
+        return path
 
-def on_app_close():
-    save_all_to_db()
-    save_notes_to_db()
-    save_settings_to_db()
-    app.destroy()
+    def done(path, error):
+        _backup["running"] = False
+        if error is not None:
+            show_status(f"❌ Резервная копия: {error}", 4000, priority=2)
+        else:
+            _backup["last"] = time.time()
+            show_status("✓ Резервная копия создана", key="backup")
+        if on_done is not None:
+            on_done(path, error)
 
+    run_in_background(work, done)
 
-def apply_settings():
-    """Применяет настройки к уже созданным элементам UI."""
-    try:
-        ctk.set_appearance_mode(settings["theme"])
-    except Exception:
-        pass
 
+def restart_app():
+    """Перезапуск процесса без сохранения памяти окна поверх базы."""
     try:
-        app.attributes("-topmost", bool(settings.get("always_on_top", False)))
+        app.destroy()
     except Exception:
         pass
+    if getattr(sys, "frozen", False):
+        os.execv(sys.executable, [sys.executable] + sys.argv[1:])
+    os.execv(sys.executable, [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:])
 
-    try:
-        note_entry.configure(font=get_notes_font())
-    except Exception:
-        pass
 
-    for tab_data in current_tabs.values():
-        try:
-            tab_data["textbox"].configure(font=get_editor_font())
-        except Exception:
-            pass
+def restore_backup(path: str):
+    if not messagebox.askyesno(
+        "Восстановление",
+        f"Заменить текущие данные копией\n{os.path.basename(path)}?\n\n"
+        "Перед этим будет снята копия текущего состояния, приложение перезапустится.",
+    ):
+        return
+    finish_bulk_io_now()
+    save_all_to_db()
+    save_notes_to_db()
+    save_settings_to_db()
 
-    redraw_notes()
+    def after_safety_copy(_safety_path, error):
+        if error is not None:
+            return  # без страховочной копии не восстанавливаем
 
-# ---------- КНОПКИ TOOLBAR ДЛЯ БЛОКНОТА ----------
+        def done(_result, restore_error):
+            if restore_error is not None:
+                show_status(f"❌ Не удалось восстановить: {restore_error}", 6000, priority=2)
+                return
+            restart_app()
 
-ctk.CTkButton(
-    toolbar,
-    text="✨ Новая вкладка",
-    font=emoji_font,
-    command=new_tab
-).pack(side="left", padx=5)
+        show_status("♻ Восстановление...", key="backup")
+        run_in_background(lambda: restore_db(path), done)
 
-ctk.CTkButton(
-    toolbar,
-    text="💾 Сохранить",
-    font=emoji_font,
-    command=save_file
-).pack(side="left", padx=5)
+    show_status("♻ Копия текущего состояния...", key="backup")
+    run_db_backup(label="-before-restore", on_done=after_safety_copy)
 
-ctk.CTkButton(
-    toolbar,
-    text="💿 Сохранить как",
-    font=emoji_font,
-    command=save_file_as
-).pack(side="left", padx=5)
 
-ctk.CTkButton(
-    toolbar,
-    text="🗑️ Очистить",
-    font=emoji_font,
-    command=clear_textbox
-).pack(side="left", padx=5)
+def open_restore_picker():
+    window = ctk.CTkToplevel(app)
+    window.title("Восстановление из копии")
+    window.geometry("560x420")
+    try:
+        window.transient(app)
+    except Exception:
+        pass
 
-ctk.CTkButton(
-    toolbar,
-    text="❌ Закрыть вкладку",
-    font=emoji_font,
-    command=close_tab
-).pack(side="left", padx=5)
+    ctk.CTkLabel(window, text="Резервные копии", font=title_font).pack(pady=(15, 10))
+    listing = ctk.CTkScrollableFrame(window)
+    listing.pack(fill="both", expand=True, padx=15, pady=(0, 10))
+
+    backups = list_backups()
+    if not backups:
+        ctk.CTkLabel(listing, text="Копий пока нет", font=get_notes_font()).pack(pady=20)
+    for path, mtime, size in backups:
+        row = ctk.CTkFrame(listing)
+        row.pack(fill="x", pady=3)
+        stamp = datetime.fromtimestamp(mtime).strftime("%d.%m.%Y %H:%M:%S")
+        extra = " · до восстановления" if "-before-restore" in os.path.basename(path) else ""
+        ctk.CTkLabel(
+            row,
+            text=f"{stamp}   {size / 1024:.0f} КБ{extra}",
+            font=get_notes_font(),
+        ).pack(side="left", padx=10)
+        ctk.CTkButton(
+            row,
+            text="♻ Восстановить",
+            width=130,
+            font=emoji_font,
+            command=lambda p=path: (window.destroy(), restore_backup(p)),
+        ).pack(side="right", padx=5, pady=3)
+
+    def browse():
+        path = filedialog.askopenfilename(
+            filetypes=[("Копии блокнота", "*.sqlite3 *.gz"), ("All files", "*.*")],
+            initialdir=backup_dir(),
+        )
+        if path:
+            window.destroy()
+            restore_backup(path)
 
-status_label = ctk.CTkLabel(
-    toolbar,
-    text="",
-    font=("Segoe UI", 16)
-)
-status_label.pack(side="right", padx=10)
+    controls = ctk.CTkFrame(window, fg_color="transparent")
+    controls.pack(pady=(0, 15))
+    ctk.CTkButton(controls, text="📂 Другой файл...", font=emoji_font, command=browse).pack(side="left", padx=5)
+    ctk.CTkButton(
+        controls,
+        text="💾 Копия сейчас",
+        font=emoji_font,
+        command=lambda: (window.destroy(), run_db_backup()),
+    ).pack(side="left", padx=5)
 
 
 # =====================
 # ЭКРАН "НАСТРОЙКИ"
 # =====================
 
-ctk.CTkLabel(frame_settings, text="⚙️ Настройки", font=title_font).pack(pady=20)
-
-settings_controls = ctk.CTkFrame(frame_settings)
-settings_controls.pack(pady=(0, 20))
+# Переменные контролов настроек (создаются вместе с экраном)
+theme_var = None
+font_var = None
+notes_size_var = None
+editor_size_var = None
+on_top_var = None
+save_status_var = None
+compression_var = None
+backup_interval_var = None
+backup_compress_var = None
+memory_budget_var = None
+undo_memory_var = None
+notes_renderer_var = None
+memory_usage_label = None
 
 
 def save_settings_clicked():
@@ -971,108 +6821,449 @@ def save_settings_clicked():
     show_status("✓ Настройки сохранены")
 
 
-ctk.CTkButton(
-    settings_controls,
-    text="💾 Сохранить настройки",
-    height=45,
-    font=emoji_font,
-    command=save_settings_clicked,
-).pack()
-
-
 def change_theme(value: str):
     settings["theme"] = value
-    apply_settings()
-
-
-theme_var = ctk.StringVar(value=settings["theme"])
-ctk.CTkLabel(frame_settings, text="Тема", font=get_notes_font()).pack(pady=(0, 5))
-ctk.CTkOptionMenu(
-    frame_settings,
-    values=["dark", "light"],
-    command=change_theme,
-    variable=theme_var,
-    height=40,
-    font=emoji_font,
-).pack(pady=(0, 15))
+    request_apply_settings()
 
 
 def change_font_family(value: str):
     settings["font_family"] = value
-    apply_settings()
-
-
-font_var = ctk.StringVar(value=settings["font_family"])
-ctk.CTkLabel(frame_settings, text="Шрифт", font=get_notes_font()).pack(pady=(0, 5))
-ctk.CTkOptionMenu(
-    frame_settings,
-    values=["Segoe UI", "Arial", "Consolas", "Times New Roman"],
-    command=change_font_family,
-    variable=font_var,
-    height=40,
-    font=emoji_font,
-).pack(pady=(0, 15))
+    request_apply_settings()
 
 
 def change_notes_font_size(value: str):
     settings["notes_font_size"] = int(value)
-    apply_settings()
-
-
-notes_size_var = ctk.StringVar(value=str(settings["notes_font_size"]))
-ctk.CTkLabel(frame_settings, text="Размер текста (заметки)", font=get_notes_font()).pack(pady=(0, 5))
-ctk.CTkOptionMenu(
-    frame_settings,
-    values=["12", "14", "16", "18", "20"],
-    command=change_notes_font_size,
-    variable=notes_size_var,
-    height=40,
-    font=emoji_font,
-).pack(pady=(0, 15))
+    request_apply_settings()
 
 
 def change_editor_font_size(value: str):
     settings["editor_font_size"] = int(value)
-    apply_settings()
-
-
-editor_size_var = ctk.StringVar(value=str(settings["editor_font_size"]))
-ctk.CTkLabel(frame_settings, text="Размер текста (блокнот)", font=get_notes_font()).pack(pady=(0, 5))
-ctk.CTkOptionMenu(
-    frame_settings,
-    values=["12", "14", "16", "18", "20"],
-    command=change_editor_font_size,
-    variable=editor_size_var,
-    height=40,
-    font=emoji_font,
-).pack(pady=(0, 15))
+    request_apply_settings()
 
 
 def toggle_on_top():
     settings["always_on_top"] = bool(on_top_var.get())
-    apply_settings()
+    request_apply_settings()
 
 
 def toggle_save_status():
     settings["show_save_status"] = bool(save_status_var.get())
 
 
-on_top_var = ctk.BooleanVar(value=settings.get("always_on_top", False))
-save_status_var = ctk.BooleanVar(value=settings.get("show_save_status", True))
+def change_backup_interval(value: str):
+    settings["backup_interval_min"] = BACKUP_INTERVAL_CHOICES.get(value, 0)
+
+
+def change_memory_budget(value: str):
+    settings["memory_budget_mb"] = MEMORY_BUDGET_CHOICES.get(value, 0)
+    enforce_memory_budget()
+    update_memory_usage_label()
+
+
+def change_notes_renderer(value: str):
+    settings["notes_renderer"] = NOTES_RENDERERS.get(value, "canvas")
+    destroy_screen("notes")  # построится заново с выбранной отрисовкой
+
+
+def change_undo_memory(value: str):
+    settings["undo_memory_mb"] = UNDO_MEMORY_CHOICES.get(value, 4)
+    if undo_memory_total() > settings["undo_memory_mb"] * 1024 * 1024:
+        schedule_undo_spill()
+    update_memory_usage_label()
+
+
+def toggle_backup_compress():
+    settings["backup_compress"] = bool(backup_compress_var.get())
+
+
+def change_doc_compression(value: str):
+    # Уже сохранённые документы пережмутся при следующем изменении
+    settings["doc_compression"] = value
+
+
+def build_settings_screen(frame):
+    global theme_var, font_var, notes_size_var, editor_size_var, on_top_var, save_status_var, compression_var
+    global backup_interval_var, backup_compress_var, memory_budget_var, memory_usage_label, undo_memory_var
+    global notes_renderer_var
+
+    ctk.CTkLabel(frame, text="⚙️ Настройки", font=title_font).pack(pady=20)
+
+    settings_controls = ctk.CTkFrame(frame)
+    settings_controls.pack(pady=(0, 20))
+
+    ctk.CTkButton(
+        settings_controls,
+        text="💾 Сохранить настройки",
+        height=45,
+        font=emoji_font,
+        command=save_settings_clicked,
+    ).pack()
+
+    io_controls = ctk.CTkFrame(frame)
+    io_controls.pack(pady=(0, 20))
+
+    ctk.CTkButton(
+        io_controls,
+        text="📤 Экспорт",
+        height=40,
+        font=emoji_font,
+        command=export_data_clicked,
+    ).pack(side="left", padx=5)
+
+    ctk.CTkButton(
+        io_controls,
+        text="📥 Импорт",
+        height=40,
+        font=emoji_font,
+        command=import_data_clicked,
+    ).pack(side="left", padx=5)
+
+    ctk.CTkButton(
+        io_controls,
+        text="♻ Резервные копии",
+        height=40,
+        font=emoji_font,
+        command=open_restore_picker,
+    ).pack(side="left", padx=5)
+
+    # Экран строится уже после загрузки настроек — берём актуальные значения
+    theme_var = ctk.StringVar(value=settings["theme"])
+    ctk.CTkLabel(frame, text="Тема", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=["dark", "light"],
+        command=change_theme,
+        variable=theme_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    font_var = ctk.StringVar(value=settings["font_family"])
+    ctk.CTkLabel(frame, text="Шрифт", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=["Segoe UI", "Arial", "Consolas", "Times New Roman"],
+        command=change_font_family,
+        variable=font_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    notes_size_var = ctk.StringVar(value=str(settings["notes_font_size"]))
+    ctk.CTkLabel(frame, text="Размер текста (заметки)", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=["12", "14", "16", "18", "20"],
+        command=change_notes_font_size,
+        variable=notes_size_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    renderer_label = next(
+        (label for label, mode in NOTES_RENDERERS.items() if mode == settings.get("notes_renderer")),
+        "Холст",
+    )
+    notes_renderer_var = ctk.StringVar(value=renderer_label)
+    ctk.CTkLabel(frame, text="Отрисовка списка заметок", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=list(NOTES_RENDERERS),
+        command=change_notes_renderer,
+        variable=notes_renderer_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    editor_size_var = ctk.StringVar(value=str(settings["editor_font_size"]))
+    ctk.CTkLabel(frame, text="Размер текста (блокнот)", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=["12", "14", "16", "18", "20"],
+        command=change_editor_font_size,
+        variable=editor_size_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    compression_var = ctk.StringVar(value=settings.get("doc_compression", "zlib"))
+    ctk.CTkLabel(frame, text="Сжатие больших документов", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=["zlib", "lzma", "off"],
+        command=change_doc_compression,
+        variable=compression_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    interval_label = next(
+        (label for label, minutes in BACKUP_INTERVAL_CHOICES.items()
+         if minutes == settings.get("backup_interval_min")),
+        "Выкл.",
+    )
+    backup_interval_var = ctk.StringVar(value=interval_label)
+    ctk.CTkLabel(frame, text="Резервная копия базы", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=list(BACKUP_INTERVAL_CHOICES),
+        command=change_backup_interval,
+        variable=backup_interval_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 15))
+
+    budget_label = next(
+        (label for label, mb in MEMORY_BUDGET_CHOICES.items() if mb == settings.get("memory_budget_mb")),
+        "Без ограничения",
+    )
+    memory_budget_var = ctk.StringVar(value=budget_label)
+    ctk.CTkLabel(frame, text="Память для вкладок блокнота", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=list(MEMORY_BUDGET_CHOICES),
+        command=change_memory_budget,
+        variable=memory_budget_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 5))
+    undo_label = next(
+        (label for label, mb in UNDO_MEMORY_CHOICES.items() if mb == settings.get("undo_memory_mb")),
+        "4 МБ",
+    )
+    undo_memory_var = ctk.StringVar(value=undo_label)
+    ctk.CTkLabel(frame, text="Память для истории правок (Ctrl+Z)", font=get_notes_font()).pack(pady=(0, 5))
+    ctk.CTkOptionMenu(
+        frame,
+        values=list(UNDO_MEMORY_CHOICES),
+        command=change_undo_memory,
+        variable=undo_memory_var,
+        height=40,
+        font=emoji_font,
+    ).pack(pady=(0, 5))
+    memory_usage_label = ctk.CTkLabel(frame, text=memory_usage_text(), font=get_notes_font())
+    memory_usage_label.pack(pady=(0, 15))
+
+    on_top_var = ctk.BooleanVar(value=settings.get("always_on_top", False))
+    save_status_var = ctk.BooleanVar(value=settings.get("show_save_status", True))
+
+    ctk.CTkCheckBox(
+        frame,
+        text="Окно поверх всех",
+        variable=on_top_var,
+        command=toggle_on_top,
+    ).pack(pady=(10, 0))
+
+    ctk.CTkCheckBox(
+        frame,
+        text="Показывать статус сохранения",
+        variable=save_status_var,
+        command=toggle_save_status,
+    ).pack(pady=(10, 0))
+
+    backup_compress_var = ctk.BooleanVar(value=settings.get("backup_compress", False))
+    ctk.CTkCheckBox(
+        frame,
+        text="Сжимать резервные копии (gzip)",
+        variable=backup_compress_var,
+        command=toggle_backup_compress,
+    ).pack(pady=(10, 0))
+
+
+register_screen("settings", build_settings_screen)
+
+# ---------------- ЗАПИСЬ И ВОСПРОИЗВЕДЕНИЕ ДЕЙСТВИЙ ----------------
+# --record СЦЕНАРИЙ.jsonl: действия пользователя (заметки, поиск, фильтр,
+# вкладки, экраны, сохранение) дописываются в сценарий по строке.
+# --replay СЦЕНАРИЙ.jsonl: окно поднимается на временной БД (копия --db или
+# синтетическая под заголовок сценария), действия проигрываются через те же
+# функции, что вызывают кнопки, и для каждого меряется время вместе с
+# app.update() — обработкой событий и after_idle (пачка событий хранилища,
+# запись в БД, перерисовка). Итог — таблица p50/p95/p99 по видам действий,
+# --report сохраняет её в .json, --compare сравнивает с прошлым отчётом.
+
+REPLAY_PROGRESS_EVERY = 1000
+
+_trace: dict = {"out": None, "started": 0.0}
+
+
+def start_trace_recording(path: str):
+    try:
+        out = open(path, "a", encoding="utf-8", buffering=1)
+    except OSError as e:
+        show_status(f"❌ Запись сценария: {e}", 4000)
+        return
+    if out.tell() == 0:
+        header = {
+            "type": "trace",
+            "version": TRACE_VERSION,
+            "notes": sum(len(tab_notes) for tab_notes in notes_by_tab.values()),
+            "tabs": len(notes_tabs_order),
+            "recorded": datetime.now().isoformat(timespec="seconds"),
+        }
+        out.write(json.dumps(header, ensure_ascii=False) + "\n")
+    _trace.update(out=out, started=time.monotonic())
+    show_status(f"⏺ Запись действий: {os.path.basename(path)}", 3000)
+
+
+def record_action(action: str, **args):
+    out = _trace["out"]
+    if out is None:
+        return
+    step = {"action": action, "t": round(time.monotonic() - _trace["started"], 3), **args}
+    try:
+        out.write(json.dumps(step, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
+
+
+def on_blocknot_tab_clicked():
+    record_action("select_tab", name=frame_blocknot.tabs.get())
+    on_blocknot_tab_changed()
+
+
+def _replay_screen(name: str):
+    if current_screen != name:
+        show_frame(name)
+
+
+def _replay_notes_tab(name) -> str:
+    _replay_screen("notes")
+    if name in notes_by_tab and name != get_current_notes_tab():
+        set_current_notes_tab(name)
+        on_notes_tab_changed()
+    return get_current_notes_tab()
+
+
+def _replay_entry(entry, text: str):
+    entry.delete(0, "end")
+    if text:
+        entry.insert(0, text)
+
+
+def _replay_add_note(step: dict):
+    _replay_notes_tab(step.get("tab"))
+    note_entry.delete("1.0", "end")
+    note_entry.insert("1.0", step.get("text", ""))
+    _replay_entry(date_entry, step.get("date") or datetime.now().strftime("%d.%m.%Y"))
+    _replay_entry(time_start_entry, step.get("time_start"))
+    _replay_entry(time_end_entry, step.get("time_end"))
+    _replay_entry(tags_entry, step.get("tags"))
+    if step.get("color") in colors:
+        color_var.set(step["color"])
+    add_note()
+
+
+def _replay_note_action(step: dict):
+    tab_name = _replay_notes_tab(step.get("tab"))
+    tab_notes = notes_by_tab.get(tab_name)
+    if not tab_notes:
+        return False
+    # Номер по модулю: сценарий мог писаться на другой БД
+    note = tab_notes[step.get("index", 0) % len(tab_notes)]
+    if step.get("button") == "tags":
+        store_update_note(tab_name, note, tags=normalize_tags(step.get("tags")))
+    else:
+        note_action(tab_name, note, step.get("button"))
+
+
+def _replay_search(step: dict):
+    _replay_screen("notes")
+    _replay_entry(search_entry, step.get("text"))
+    update_search()
+
+
+def _replay_filter(step: dict):
+    _replay_screen("notes")
+    store_set_filter(
+        tags=normalize_tags(step.get("tags")),
+        color=step.get("color"),
+        state=step.get("state"),
+        date_from=step.get("date_from"),
+        date_to=step.get("date_to"),
+    )
+
 
-ctk.CTkCheckBox(
-    frame_settings,
-    text="Окно поверх всех",
-    variable=on_top_var,
-    command=toggle_on_top,
-).pack(pady=(10, 0))
+def _replay_new_notes_tab(step: dict):
+    _replay_screen("notes")
+    new_notes_tab(step.get("name") or "")
+
+
+def _replay_new_tab(step: dict):
+    _replay_screen("blocknot")
+    new_tab(step.get("name") or "")
+
+
+def _replay_select_tab(step: dict):
+    _replay_screen("blocknot")
+    if step.get("name") not in current_tabs:
+        return False
+    frame_blocknot.tabs.set(step["name"])
+    on_blocknot_tab_changed()
+
+
+REPLAY_HANDLERS = {
+    "add_note": _replay_add_note,
+    "note_action": _replay_note_action,
+    "search": _replay_search,
+    "filter": _replay_filter,
+    "select_notes_tab": lambda step: _replay_notes_tab(step.get("name")),
+    "new_notes_tab": _replay_new_notes_tab,
+    "show_screen": lambda step: _replay_screen(step.get("screen") or "blocknot"),
+    "select_tab": _replay_select_tab,
+    "new_tab": _replay_new_tab,
+    "save": lambda step: save_file(),
+}
+
+
+def run_replay(args) -> int:
+    """Проигрывает сценарий args.replay и печатает задержки действий."""
+    header, steps = read_trace(args.replay)
+    if not args.show:
+        app.withdraw()
+    app.update()
+
+    samples: dict[str, list[float]] = {}
+    skipped = 0
+    started = time.perf_counter()
+    for number, step in enumerate(steps, 1):
+        handler = REPLAY_HANDLERS.get(step["action"])
+        if handler is None:
+            skipped += 1
+            continue
+        action_started = time.perf_counter()
+        try:
+            result = handler(step)
+            app.update()  # события и after_idle: сохранение, индексы, перерисовка
+        except Exception as e:
+            print(f"  ⚠ {number}: {step['action']}: {e}", file=sys.stderr)
+            skipped += 1
+            continue
+        elapsed = time.perf_counter() - action_started
+        if result is False:
+            skipped += 1
+        else:
+            samples.setdefault(step["action"], []).append(elapsed)
+        if number % REPLAY_PROGRESS_EVERY == 0:
+            print(f"  ... {number}/{len(steps)}", file=sys.stderr)
+    total = time.perf_counter() - started
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("actions")
+    report = latency_report(samples)
+    print(f"Сценарий: {args.replay}, действий: {len(steps)}, пропущено: {skipped}, всего: {total:.1f} с")
+    print_latency_report(report, previous)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(
+                {"trace": os.path.basename(args.replay), "header": header, "total_s": total,
+                 "skipped": skipped, "actions": report},
+                f, ensure_ascii=False, indent=2,
+            )
+    return 0
 
-ctk.CTkCheckBox(
-    frame_settings,
-    text="Показывать статус сохранения",
-    variable=save_status_var,
-    command=toggle_save_status,
-).pack(pady=(10, 0))
 
 # ---------------- КНОПКИ МЕНЮ ----------------
 ctk.CTkButton(
@@ -1081,7 +7272,7 @@ ctk.CTkButton(
     width=250,
     height=40,
     font=emoji_font,
-    command=lambda: show_frame(frame_blocknot)
+    command=lambda: show_frame("blocknot")
 ).grid(row=0, column=0, padx=20, pady=20)
 
 ctk.CTkButton(
@@ -1090,7 +7281,7 @@ ctk.CTkButton(
     width=250,
     height=40,
     font=emoji_font,
-    command=lambda: show_frame(frame_notes)
+    command=lambda: show_frame("notes")
 ).grid(row=0, column=1, padx=10, pady=20)
 
 ctk.CTkButton(
@@ -1099,7 +7290,7 @@ ctk.CTkButton(
     width=250,
     height=40,
     font=emoji_font,
-    command=lambda: show_frame(frame_dev)
+    command=lambda: show_frame("dev")
 ).grid(row=0, column=2, padx=10, pady=20)
 
 ctk.CTkButton(
@@ -1108,7 +7299,7 @@ ctk.CTkButton(
     width=250,
     height=40,
     font=emoji_font,
-    command=lambda: show_frame(frame_settings)
+    command=lambda: show_frame("settings")
 ).grid(row=0, column=3, padx=10, pady=20)
 
 # Скрыть toolbar изначально
@@ -1121,16 +7312,24 @@ load_settings_from_db()
 # Горячие клавиши редактирования (Ctrl+C/V/X/A/Z/Y)
 _bind_edit_hotkeys_to_app()
 
-saved_tabs = load_from_db()
+# Чужие изменения читаем с этой точки: всё, что было раньше, уже в загрузке
+start_change_feed()
+
+saved_tabs = load_from_db(raw=True)
 if saved_tabs:
-    for _position, name, content, filepath in saved_tabs:
-        create_tab(name, text=content or "", filepath=filepath, switch_to=False)
+    packed = []
+    for position, name, stored, filepath, version, codec, tab_id in saved_tabs:
+        if codec:
+            packed.append(add_packed_tab_row(tab_id, name, stored, codec, filepath, version, position))
+        else:
+            add_tab_row(tab_id, name, stored, filepath, version, position)
+    unpack_tabs_in_background(packed)
     frame_blocknot.tabs.set(tab_order[0])
 else:
     create_tab("Документ 1", text="", filepath=None, switch_to=True)
     tab_counter = 2
 
-# Восстановление заметок
+# Восстановление заметок (только данные — UI построится при открытии экрана)
 notes_tabs_order.clear()
 notes_by_tab.clear()
 notes_frames.clear()
@@ -1138,52 +7337,60 @@ notes_frames.clear()
 tab_rows, note_rows = load_notes_from_db()
 
 if tab_rows:
-    for _pos, name in tab_rows:
-        ensure_notes_tab(name, switch_to=False)
+    for position, name, tab_id in tab_rows:
+        ensure_notes_tab(name, switch_to=False, position=position)
+        remember_note_tab(name, tab_id)
+    _note_tabs_saved.update((name, position) for position, name, _tab_id in tab_rows)
 else:
     ensure_notes_tab("Заметки", switch_to=False)
 
-for _position, tab_name, text, done, pinned, date, color, time_start, time_end in note_rows:
-    notes_by_tab.setdefault(tab_name, [])
-    notes_by_tab[tab_name].append(
-        {
-            "text": text,
-            "done": bool(done),
-            "pinned": bool(pinned),
-            "date": date,
-            "color": color,
-            "time_start": time_start or "",
-            "time_end": time_end or "",
-        }
-    )
+for row in note_rows:
+    add_note_row(row)
 
-# Убедимся, что вкладки существуют в UI и в порядке
+# Убедимся, что вкладки существуют и в порядке
 for tab_name in list(notes_by_tab.keys()):
     if tab_name not in notes_tabs_order:
         ensure_notes_tab(tab_name, switch_to=False)
 
-notes_tabview.set(notes_tabs_order[0])
-redraw_notes()
+set_current_notes_tab(notes_tabs_order[0])
 
-apply_settings()
+# Напоминания: куча сроков и один таймер на ближайший
+rebuild_reminders()
+arm_reminders()
 
-# Обновим значения контролов настроек после загрузки
-try:
-    theme_var.set(settings["theme"])
-    font_var.set(settings["font_family"])
-    notes_size_var.set(str(settings["notes_font_size"]))
-    editor_size_var.set(str(settings["editor_font_size"]))
-    on_top_var.set(bool(settings.get("always_on_top", False)))
-    save_status_var.set(bool(settings.get("show_save_status", True)))
-except Exception:
-    pass
+apply_settings()
 
 # Автосохранение при закрытии окна
 app.protocol("WM_DELETE_WINDOW", on_app_close)
 
+# Опрос изменений из других окон/процессов
+app.after(CHANGE_FEED_POLL_MS, poll_change_feed)
+
+# Фоновое обслуживание БД (первый раз — вскоре после запуска);
+# при воспроизведении сценария не мешает замерам
+if not app_args.replay:
+    app.after(MAINTENANCE_FIRST_MS, schedule_db_maintenance)
+    app.after(BACKUP_CHECK_MS, schedule_db_backup)
+app.after(MEMORY_CHECK_MS, schedule_memory_check)
+
+# Слежение за файлами вкладок на диске
+start_file_watcher()
+
 # ---------------- ПОКАЗ ПЕРВОГО ЭКРАНА ----------------
-show_frame(frame_blocknot)
+show_frame("blocknot")
 
 # ---------------- ЗАПУСК ----------------
+if app_args.replay:
+    exit_code = run_replay(app_args)
+    try:
+        app.destroy()
+    except Exception:
+        pass
+    shutil.rmtree(os.path.dirname(DB_PATH), ignore_errors=True)
+    sys.exit(exit_code)
+
+if app_args.record:
+    start_trace_recording(app_args.record)
+
 app.mainloop()
  
\ No newline at end of file